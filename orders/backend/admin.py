@@ -3,7 +3,7 @@ from django.contrib.auth.admin import UserAdmin
 
 
 from backend.models import User, Shop, Category, Product, ProductInfo, Parameter, ProductParameter, \
-    Order, OrderItem, Contact
+    Order, OrderItem, Contact, ImportJob, CatalogueItem
 
 
 @admin.register(User)
@@ -77,3 +77,15 @@ class CategoryAdmin(admin.ModelAdmin):
 @admin.register(ProductParameter)
 class CategoryAdmin(admin.ModelAdmin):
     pass
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'shop', 'state', 'rows_processed', 'created_at', 'finished_at')
+    list_filter = ('state',)
+
+
+@admin.register(CatalogueItem)
+class CatalogueItemAdmin(admin.ModelAdmin):
+    list_display = ('product_info', 'shop_name', 'product_name', 'category_name', 'price', 'quantity')
+    list_filter = ('shop',)
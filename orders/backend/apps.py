@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class AppConfig(AppConfig):
     name = 'backend'
+
+    def ready(self):
+        import backend.signals  # noqa: F401
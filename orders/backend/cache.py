@@ -0,0 +1,138 @@
+import hashlib
+import json
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+CATALOGUE_STATE_KEY = 'catalogue:state'
+
+HITS_KEY = 'catalogue:cache:hits'
+
+MISSES_KEY = 'catalogue:cache:misses'
+
+local_counts = Counter()
+
+counts_lock = threading.Lock()
+
+
+def shared_cache():
+    # общее для всех процессов хранилище (веб-процессы и import_worker): только версия каталога и блокировки.
+    # Ответы, счётчики и троттлинг остаются в быстром кеше процесса default - версия входит в их ключи
+    return caches[settings.CATALOGUE_CACHE]
+
+
+def catalogue_state():
+    # (версия, время изменения каталога в секундах) одним обращением к общему хранилищу
+    store = shared_cache()
+    state = store.get(CATALOGUE_STATE_KEY)
+    if state is None:
+        # после вытеснения ключа версия начинается с текущего времени и не повторяет прежние номера
+        now = time.time()
+        store.add(CATALOGUE_STATE_KEY, (int(now * 1000), int(now)), None)
+        state = store.get(CATALOGUE_STATE_KEY)
+    return state
+
+
+def catalogue_version():
+    # номер версии каталога входит в ключи кешей, поэтому смена версии сбрасывает их все одной операцией
+    return catalogue_state()[0]
+
+
+def catalogue_modified():
+    # время последнего изменения каталога, секунды; для Last-Modified
+    return catalogue_state()[1]
+
+
+def bump_catalogue_version():
+    now = time.time()
+    version = max(catalogue_version() + 1, int(now * 1000))
+    shared_cache().set(CATALOGUE_STATE_KEY, (version, int(now)), None)
+    return version
+
+
+def params_signature(params):
+    # набор параметров запроса без учёта их порядка
+    signature = json.dumps(sorted((name, sorted(values)) for name, values in params.lists()), ensure_ascii=False)
+    return hashlib.md5(signature.encode('utf-8')).hexdigest()
+
+
+def cache_key(prefix, params):
+    return f'{prefix}:{catalogue_version()}:{params_signature(params)}'
+
+
+def count(key):
+    # счётчики процесса сбрасываются в общее хранилище раз в CACHE_STATS_FLUSH_EVERY запросов:
+    # запись на каждый запрос свела бы выигрыш от кеша на нет
+    with counts_lock:
+        local_counts[key] += 1
+        if sum(local_counts.values()) < settings.CACHE_STATS_FLUSH_EVERY:
+            return
+        pending = dict(local_counts)
+        local_counts.clear()
+
+    store = shared_cache()
+    for name, value in pending.items():
+        try:
+            store.incr(name, value)
+        except ValueError:
+            if not store.add(name, value, None):
+                store.incr(name, value)
+
+
+def cache_stats():
+    # сумма по всем процессам без ещё не сброшенных счётчиков
+    stats = shared_cache().get_many([HITS_KEY, MISSES_KEY])
+    hits, misses = stats.get(HITS_KEY, 0), stats.get(MISSES_KEY, 0)
+    return {'hits': hits, 'misses': misses, 'ratio': hits / (hits + misses) if hits + misses else None}
+
+
+class CachedResponseMixin:
+    # ответы list/retrieve кешируются по хосту, пути, параметрам запроса и версии каталога; в кеше лежат
+    # данные до рендеринга, поэтому повторный запрос не обращается к БД и не сериализует модели.
+    # ETag и Last-Modified тоже выводятся из версии каталога: If-None-Match/If-Modified-Since
+    # получают 304 до чтения кеша
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        version, last_modified = catalogue_state()
+        signature = params_signature(request.query_params)
+        # ETag свой у каждого адреса и формата ответа: ETag списка не подходит карточке или другому формату
+        resource = hashlib.md5(f'{request.path}?{signature}'.encode('utf-8')).hexdigest()
+        etag = quote_etag(f'{version}-{resource[:12]}-{request.accepted_renderer.format}')
+        headers = {'ETag': etag, 'Last-Modified': http_date(last_modified)}
+
+        # 304 только для адресов, которые отвечают 200: кешированный ответ есть или обработчик его вернул,
+        # иначе несуществующая карточка отвечала бы 304 вместо 404
+        key = f'response:{request.get_host()}{request.path}:{version}:{signature}'
+        data = cache.get(key)
+        if data is not None:
+            not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if not_modified is None:
+                count(HITS_KEY)
+                return Response(data, headers={**headers, 'X-Cache': 'HIT'})
+            for name, value in headers.items():
+                not_modified[name] = value
+            return not_modified
+
+        count(MISSES_KEY)
+        response = handler(request, *args, **kwargs)
+        if response.status_code != 200:
+            response['X-Cache'] = 'MISS'
+            return response
+
+        cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified, response=response)
+        for name, value in headers.items():
+            response[name] = value
+        response['X-Cache'] = 'MISS'
+        return response
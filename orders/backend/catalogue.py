@@ -0,0 +1,94 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Max, Min
+
+from backend.cache import bump_catalogue_version
+from backend.importer import chunks, render_parameters, BATCH_SIZE
+from backend.models import CatalogueItem, ProductInfo, ProductParameter
+from backend.snapshots import schedule_snapshot
+
+CATALOGUE_FIELDS = ('id', 'shop_id', 'shop__name', 'product_id', 'product__name', 'product__category_id',
+                    'product__category__name', 'external_id', 'model', 'quantity', 'price', 'price_rrc')
+
+
+def build_catalogue(queryset, batch_size=BATCH_SIZE):
+    # строки каталога по предложениям из БД пачками: один запрос параметров и одна вставка на пачку
+    created = 0
+    offers = queryset.order_by('id').values_list(*CATALOGUE_FIELDS).iterator(chunk_size=batch_size)
+    for batch in chunks(offers, batch_size):
+        parameters = defaultdict(list)
+        for product_info_id, name, value in ProductParameter.objects.filter(
+                product_info_id__in=[row[0] for row in batch]).order_by('id').values_list(
+                'product_info_id', 'parameter__name', 'value'):
+            parameters[product_info_id].append((name, value))
+
+        CatalogueItem.objects.bulk_create([
+            CatalogueItem(product_info_id=product_info_id, shop_id=shop_id, shop_name=shop_name, product_id=product_id,
+                          product_name=product_name, category_id=category_id, category_name=category_name,
+                          external_id=external_id, model=model, quantity=quantity, price=price, price_rrc=price_rrc,
+                          parameters=render_parameters(parameters[product_info_id]))
+            for product_info_id, shop_id, shop_name, product_id, product_name, category_id, category_name,
+            external_id, model, quantity, price, price_rrc in batch], batch_size=batch_size)
+        created += len(batch)
+    return created
+
+
+def sync_shop_catalogue(shop):
+    # после изменения магазина: отключённый убирается из каталога, включённому добавляются недостающие строки
+    with transaction.atomic():
+        if not shop.state:
+            CatalogueItem.objects.filter(shop_id=shop.id).delete()
+            return
+
+        CatalogueItem.objects.filter(shop_id=shop.id).exclude(shop_name=shop.name).update(shop_name=shop.name)
+        build_catalogue(ProductInfo.objects.filter(shop_id=shop.id, catalogue_item__isnull=True))
+
+
+def sync_offer_catalogue(product_info_id):
+    # строка каталога одного предложения после правки вне импорта (например, в админке) собирается заново
+    with transaction.atomic():
+        CatalogueItem.objects.filter(product_info_id=product_info_id).delete()
+        build_catalogue(ProductInfo.objects.filter(id=product_info_id, shop__state=True))
+
+
+def refresh_offer_parameters(product_info_id):
+    # только обновление: при каскадном удалении предложения строка каталога могла уже исчезнуть
+    parameters = ProductParameter.objects.filter(product_info_id=product_info_id).order_by('id').values_list(
+        'parameter__name', 'value')
+    CatalogueItem.objects.filter(product_info_id=product_info_id).update(parameters=render_parameters(parameters))
+
+
+def rebuild_catalogue(batch_size=BATCH_SIZE):
+    # полное перестроение каталога, например после первого развёртывания
+    with transaction.atomic():
+        CatalogueItem.objects.all().delete()
+        transaction.on_commit(bump_catalogue_version)
+        transaction.on_commit(schedule_snapshot)
+        return build_catalogue(ProductInfo.objects.filter(shop__state=True), batch_size)
+
+
+def catalogue_facets(queryset):
+    # число предложений выборки каталога по категориям, магазинам и значениям параметров - группировкой в БД
+    offers = queryset.values('pk')
+    categories = queryset.order_by().values('category_id', 'category_name').annotate(
+        count=Count('pk')).order_by('category_name', 'category_id')
+    shops = queryset.order_by().values('shop_id', 'shop_name').annotate(count=Count('pk')).order_by(
+        'shop_name', 'shop_id')
+
+    parameters = {}
+    for name, minimum, maximum in ProductParameter.objects.filter(product_info_id__in=offers).values(
+            'parameter__name').annotate(minimum=Min('numeric_value'), maximum=Max('numeric_value')).order_by(
+            'parameter__name').values_list('parameter__name', 'minimum', 'maximum'):
+        parameters[name] = {'parameter': name, 'min': minimum, 'max': maximum, 'values': []}
+    for name, value, count in ProductParameter.objects.filter(product_info_id__in=offers).values(
+            'parameter__name', 'value').annotate(count=Count('id')).order_by(
+            'parameter__name', 'value').values_list('parameter__name', 'value', 'count'):
+        parameters[name]['values'].append({'value': value, 'count': count})
+
+    return {
+        'categories': [{'id': row['category_id'], 'name': row['category_name'], 'count': row['count']}
+                       for row in categories],
+        'shops': [{'id': row['shop_id'], 'name': row['shop_name'], 'count': row['count']} for row in shops],
+        'parameters': list(parameters.values()),
+    }
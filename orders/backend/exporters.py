@@ -0,0 +1,107 @@
+import csv
+import io
+import json
+from collections import defaultdict
+
+import yaml
+
+from backend.importer import chunks
+from backend.models import Parameter, ProductInfo, ProductParameter
+from backend.parsers import CSV_COLUMNS, FORMATS
+
+try:
+    from yaml import CSafeDumper as YamlDumper
+except ImportError:
+    from yaml import SafeDumper as YamlDumper
+
+EXPORT_CHUNK_SIZE = 2000
+
+# название формата -> функция выгрузки; тип содержимого и расширение берутся из форматов загрузки
+EXPORTERS = {}
+
+
+def register_exporter(name):
+    def decorator(exporter):
+        EXPORTERS[name] = exporter
+        return exporter
+    return decorator
+
+
+def export_content_type(name):
+    return f'{FORMATS[name][1][0]}; charset=utf-8'
+
+
+def export_filename(shop, name):
+    return f'shop-{shop.id}{FORMATS[name][2][0]}'
+
+
+def export_price_list(shop, format_name, chunk_size=EXPORT_CHUNK_SIZE):
+    # генератор частей файла: шапка отдаётся сразу, товары - порциями по chunk_size
+    return EXPORTERS[format_name](shop, chunk_size)
+
+
+def shop_categories(shop):
+    return list(shop.categories.order_by('id').values('id', 'name'))
+
+
+def iter_goods(shop, chunk_size=EXPORT_CHUNK_SIZE):
+    # предложения магазина через серверный курсор, параметры - одним запросом на порцию
+    offers = ProductInfo.objects.filter(shop_id=shop.id).order_by('id').values_list(
+        'id', 'external_id', 'product__category_id', 'model', 'product__name', 'price', 'price_rrc',
+        'quantity').iterator(chunk_size=chunk_size)
+
+    for batch in chunks(offers, chunk_size):
+        parameters = defaultdict(dict)
+        for product_info_id, name, value in ProductParameter.objects.filter(
+                product_info_id__in=[row[0] for row in batch]).order_by('id').values_list(
+                'product_info_id', 'parameter__name', 'value'):
+            parameters[product_info_id][name] = value
+
+        yield [{'id': external_id, 'category': category_id, 'model': model, 'name': name, 'price': price,
+                'price_rrc': price_rrc, 'quantity': quantity, 'parameters': parameters[product_info_id]}
+               for product_info_id, external_id, category_id, model, name, price, price_rrc, quantity in batch]
+
+
+def dump_yaml(data):
+    return yaml.dump(data, Dumper=YamlDumper, allow_unicode=True, sort_keys=False)
+
+
+@register_exporter('yaml')
+def export_yaml(shop, chunk_size):
+    # та же раскладка, что и в data/shop1.yaml
+    yield dump_yaml({'shop': shop.name, 'categories': shop_categories(shop)})
+    yield 'goods:\n'
+    for goods in iter_goods(shop, chunk_size):
+        yield dump_yaml(goods)
+
+
+def flush(buffer):
+    value = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return value
+
+
+@register_exporter('csv')
+def export_csv(shop, chunk_size):
+    # колонки CSV_COLUMNS, затем по колонке на каждый параметр, встречающийся у товаров магазина
+    categories = {category['id']: category['name'] for category in shop_categories(shop)}
+    parameters = list(Parameter.objects.filter(product_parameters__product_info__shop_id=shop.id).distinct().order_by(
+        'name').values_list('name', flat=True))
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS + tuple(parameters))
+    yield flush(buffer)
+    for goods in iter_goods(shop, chunk_size):
+        writer.writerows([shop.name, item['category'], categories.get(item['category'], ''), item['id'], item['name'],
+                          item['model'], item['price'], item['price_rrc'], item['quantity'],
+                          *(item['parameters'].get(name, '') for name in parameters)] for item in goods)
+        yield flush(buffer)
+
+
+@register_exporter('ndjson')
+def export_ndjson(shop, chunk_size):
+    yield json.dumps({'shop': shop.name, 'categories': shop_categories(shop)}, ensure_ascii=False) + '\n'
+    for goods in iter_goods(shop, chunk_size):
+        yield ''.join(json.dumps(item, ensure_ascii=False) + '\n' for item in goods)
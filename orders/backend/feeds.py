@@ -0,0 +1,100 @@
+import asyncio
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+
+from backend.importer import import_price_file, content_hash
+from backend.models import Shop
+from backend.parsers import find_format
+
+FEED_SPOOL_SIZE = 8 * 2 ** 20
+
+FEED_CHUNK_SIZE = 64 * 2 ** 10
+
+
+class FeedResponse:
+    def __init__(self, status, file=None, etag='', last_modified='', content_type=''):
+        self.status = status
+        self.file = file
+        self.content_type = content_type
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+def fetch_feed(url, etag='', last_modified='', timeout=None):
+    # условный GET: при 304 тело не скачивается, иначе прайс пишется во временный файл
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+
+    with requests.get(url, headers=headers, stream=True, timeout=timeout or settings.FEED_TIMEOUT) as response:
+        if response.status_code == 304:
+            return FeedResponse(304, etag=etag, last_modified=last_modified)
+        response.raise_for_status()
+
+        file = tempfile.SpooledTemporaryFile(max_size=FEED_SPOOL_SIZE)
+        for chunk in response.iter_content(FEED_CHUNK_SIZE):
+            file.write(chunk)
+        file.seek(0)
+        return FeedResponse(response.status_code, file, response.headers.get('ETag', ''),
+                            response.headers.get('Last-Modified', ''), response.headers.get('Content-Type', ''))
+
+
+async def fetch_feeds(shops, concurrency=None, timeout=None):
+    # все прайсы запрашиваются одновременно; сетевой ввод-вывод requests вынесен в пул потоков
+    loop = asyncio.get_running_loop()
+
+    with ThreadPoolExecutor(max_workers=concurrency or settings.FEED_CONCURRENCY) as executor:
+        async def fetch(shop):
+            try:
+                return shop, await loop.run_in_executor(executor, fetch_feed, shop.url, shop.feed_etag,
+                                                        shop.feed_last_modified, timeout), None
+            except requests.RequestException as error:
+                return shop, None, error
+
+        return await asyncio.gather(*(fetch(shop) for shop in shops))
+
+
+def poll_feeds(shops=None, concurrency=None, timeout=None):
+    # опрос прайсов магазинов; загрузка только для изменившихся
+    if shops is None:
+        shops = Shop.objects.exclude(url__isnull=True).exclude(url='')
+    shops = list(shops)
+
+    results = []
+    for shop, response, error in asyncio.run(fetch_feeds(shops, concurrency, timeout)):
+        result = {'shop': shop.name, 'status': None, 'rows': 0, 'error': None}
+        results.append(result)
+        shop.feed_checked_at = timezone.now()
+
+        if error is not None:
+            result.update(status='error', error=f'{type(error).__name__}: {error}')
+        elif response.status == 304:
+            result['status'] = 'not_modified'
+        else:
+            try:
+                with File(response.file) as file:
+                    digest = content_hash(file)
+                    format_name = find_format(urlsplit(shop.url).path, response.content_type)
+                    importer = import_price_file(file, format_name, shop.user_id, shop=shop, content_hash=digest)
+            except Exception as error:
+                result.update(status='error', error=f'{type(error).__name__}: {error}')
+            else:
+                # валидаторы сохраняем только после успешной загрузки, чтобы ошибочный прайс запросить снова
+                shop.feed_etag = response.etag
+                shop.feed_last_modified = response.last_modified
+                if importer.modified:
+                    result.update(status='imported', rows=importer.goods_count)
+                else:
+                    result['status'] = 'not_modified'
+
+        shop.save(update_fields=['feed_etag', 'feed_last_modified', 'feed_checked_at'])
+
+    return results
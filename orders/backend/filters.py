@@ -0,0 +1,101 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Case, IntegerField, Q, When
+from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from backend.models import ProductParameter, parse_number
+
+PARAMETER_PREFIX = 'parameter__'
+
+RANGE_LOOKUPS = ('gt', 'gte', 'lt', 'lte')
+
+IDS_PARAM = 'ids'
+
+
+def parse_parameter_filters(query_params):
+    # parameter__<имя>=значение (повтор параметра - любое из значений) и parameter__<имя>__gte=6 и т.п.
+    # -> {имя параметра: Q по его значениям}
+    filters = defaultdict(Q)
+    errors = {}
+    for key in query_params:
+        if not key.startswith(PARAMETER_PREFIX):
+            continue
+
+        name, _, lookup = key[len(PARAMETER_PREFIX):].rpartition('__')
+        if lookup not in RANGE_LOOKUPS:
+            name, lookup = key[len(PARAMETER_PREFIX):], None
+        values = [value for value in query_params.getlist(key) if value != '']
+        if not name or not values:
+            continue
+
+        numbers = [parse_number(value) for value in values]
+        if lookup is None:
+            # равенство строке или числу: "256" найдёт и "256.0"
+            filters[name] &= Q(value__in=values) | Q(numeric_value__in=[number for number in numbers
+                                                                           if number is not None])
+        elif None in numbers or len(numbers) > 1:
+            errors[key] = 'A single number is required.'
+        else:
+            filters[name] &= Q(**{f'numeric_value__{lookup}': numbers[0]})
+
+    if errors:
+        raise ValidationError(errors)
+    return filters
+
+
+class ProductParameterFilter(BaseFilterBackend):
+    # фильтр по характеристикам: на каждый параметр один подзапрос по индексам (parameter, value)
+    # и (parameter, numeric_value), условия разных параметров объединяются через И
+    def filter_queryset(self, request, queryset, view):
+        for name, condition in parse_parameter_filters(request.query_params).items():
+            queryset = queryset.filter(product_info_id__in=ProductParameter.objects.filter(
+                condition, parameter__name=name).values('product_info_id'))
+        return queryset
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {'name': f'{PARAMETER_PREFIX}{{name}}', 'required': False, 'in': 'query',
+             'description': 'Значение характеристики; повтор параметра - любое из значений. '
+                            f'Суффиксы {", ".join("__" + lookup for lookup in RANGE_LOOKUPS)} - '
+                            'сравнение с числовым значением',
+             'schema': {'type': 'string'}},
+        ]
+
+
+def parse_ids(value):
+    # ?ids=3,1,2 -> (3, 1, 2) без повторов, в порядке запроса
+    try:
+        ids = tuple(dict.fromkeys(int(item) for item in value.split(',') if item.strip()))
+    except ValueError:
+        raise ParseError(f'{IDS_PARAM} must be a comma-separated list of integers.')
+    if not ids:
+        raise ParseError(f'{IDS_PARAM} must not be empty.')
+    if len(ids) > settings.MAX_BULK_IDS:
+        raise ParseError(f'No more than {settings.MAX_BULK_IDS} {IDS_PARAM} per request.')
+    return ids
+
+
+def requested_ids(request):
+    value = request.query_params.get(IDS_PARAM)
+    return None if value is None else parse_ids(value)
+
+
+class IdsFilter(BaseFilterBackend):
+    # выборка нескольких объектов одним запросом вместо запроса на каждый: строки в порядке ids,
+    # несуществующие id пропускаются
+    def filter_queryset(self, request, queryset, view):
+        ids = requested_ids(request)
+        if ids is None:
+            return queryset
+        position = Case(*(When(pk=pk, then=index) for index, pk in enumerate(ids)), output_field=IntegerField())
+        return queryset.filter(pk__in=ids).order_by(position)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {'name': IDS_PARAM, 'required': False, 'in': 'query',
+             'description': f'Список id через запятую, не больше {settings.MAX_BULK_IDS}; '
+                            'ответ - все найденные объекты в порядке списка, без постраничного вывода',
+             'schema': {'type': 'string'}},
+        ]
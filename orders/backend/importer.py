@@ -0,0 +1,540 @@
+import hashlib
+import json
+from collections import defaultdict
+from contextvars import ContextVar
+
+from django.core.exceptions import ValidationError
+from django.core.validators import BaseValidator
+from django.db import models, transaction
+
+from backend.cache import bump_catalogue_version
+from backend.models import Category, Shop, ProductInfo, Product, Parameter, ProductParameter, OrderItem, \
+    CatalogueItem, parse_number
+from backend.parsers import parse_price_list, PriceListFormatError
+from backend.snapshots import schedule_snapshot
+
+BATCH_SIZE = 1000
+
+OFFER_FIELDS = ('product_id', 'model', 'price', 'price_rrc', 'quantity')
+
+IMPORT_MODES = ('upsert', 'replace')
+
+# поле строки прайса -> поле модели, по которому она проверяется
+GOODS_SCHEMA = {
+    'id': ProductInfo._meta.get_field('external_id'),
+    'category': Category._meta.get_field('id'),
+    'name': Product._meta.get_field('name'),
+    'model': ProductInfo._meta.get_field('model'),
+    'price': ProductInfo._meta.get_field('price'),
+    'price_rrc': ProductInfo._meta.get_field('price_rrc'),
+    'quantity': ProductInfo._meta.get_field('quantity'),
+}
+
+VALIDATION_ERRORS_LIMIT = 1000
+
+# пока идёт загрузка, строки каталога ведёт сам импорт: приёмники сигналов предложений их не трогают
+importing = ContextVar('importing', default=False)
+
+
+class PriceListValidationError(ValueError):
+    def __init__(self, errors):
+        self.errors = errors
+        message = errors[0] if len(errors) == 1 else f'{errors[0]} (and {len(errors) - 1} more errors)'
+        super().__init__(message)
+
+
+def content_hash(file):
+    # хеш содержимого прайса целиком, file - django.core.files.File
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def row_hash(offer, values):
+    # хеш нормализованной строки прайса: поля предложения и значения параметров
+    payload = json.dumps([offer[name] for name in OFFER_FIELDS] + sorted(values.items()), ensure_ascii=False)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def clean_field(field, value):
+    # Field.clean для строки прайса: валидатор вызывается целиком только при нарушении границы,
+    # иначе на сотнях тысяч строк основное время уходит на подготовку текстов ошибок
+    if isinstance(field, models.IntegerField) and (
+            isinstance(value, bool) or isinstance(value, float) and not value.is_integer()):
+        # to_python приводит через int(): 1.7 стало бы 1, а True - 1
+        raise ValidationError(field.error_messages['invalid'], code='invalid', params={'value': value})
+    value = field.to_python(value)
+    if value in field.empty_values and not (field.null if value is None else field.blank):
+        raise ValidationError(field.error_messages['null' if value is None else 'blank'])
+    for validator in field.validators:
+        if not isinstance(validator, BaseValidator) or \
+                validator.compare(validator.clean(value), validator.limit_value):
+            validator(value)
+    return value
+
+
+def render_parameters(parameters):
+    # параметры строки каталога в том виде, в каком их отдаёт ProductParameterSerializer
+    return json.dumps([{'parameter': name, 'value': value} for name, value in parameters], ensure_ascii=False)
+
+
+def chunks(iterable, size):
+    # разбиение последовательности на пачки фиксированного размера
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def removable_offers(shop_id):
+    # предложения, которые загрузка может удалить или обнулить: уже обнулённые заказанные повторно не считаются
+    return ProductInfo.objects.filter(shop_id=shop_id).exclude(
+        quantity=0, id__in=OrderItem.objects.values('product_info_id'))
+
+
+class PriceListValidator:
+    # проверка прайса до записи: схема и типы строк, ссылки на категории, повторы внешних идентификаторов.
+    # Заодно считается план загрузки для магазина shop (без него все строки - новые), БД при этом только читается
+    def __init__(self, shop=None, mode='upsert', batch_size=BATCH_SIZE):
+        self.shop = shop
+        self.mode = mode
+        self.batch_size = batch_size
+        self.errors = []
+        self.errors_count = 0
+        self.categories = set()
+        self.seen = {}
+        self.products = {}
+        self.parameters = None
+        self.goods_count = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.removed = 0
+
+    def validate(self, data):
+        if not isinstance(data.get('shop'), str) or not data['shop']:
+            self._error('Header', 'shop name is required.')
+
+        categories = data.get('categories')
+        if not isinstance(categories, list):
+            self._error('Header', 'categories list is required.')
+            categories = []
+        for number, category in enumerate(categories, start=1):
+            self._validate_category(number, category)
+
+        goods = data.get('goods')
+        if isinstance(goods, (str, bytes, dict)) or not hasattr(goods, '__iter__'):
+            self._error('Header', 'goods list is required.')
+            goods = []
+
+        try:
+            for batch in chunks(enumerate(goods, start=1), self.batch_size):
+                self.goods_count += len(batch)
+                self._plan([offer for offer in (self._clean(number, item) for number, item in batch)
+                            if offer is not None])
+        except PriceListFormatError as error:
+            # испорченный файл: строки после места ошибки прочитать нельзя
+            self._error('File', str(error))
+
+        if self.shop is not None:
+            self._plan_removed()
+
+        if self.errors_count > len(self.errors):
+            self.errors.append(f'... and {self.errors_count - len(self.errors)} more errors.')
+        return self
+
+    def _error(self, where, message):
+        self.errors_count += 1
+        if len(self.errors) < VALIDATION_ERRORS_LIMIT:
+            self.errors.append(f'{where}: {message}')
+
+    def _validate_category(self, number, category):
+        where = f'Category {number}'
+        if not isinstance(category, dict) or 'id' not in category or 'name' not in category:
+            return self._error(where, 'id and name are required.')
+        try:
+            self.categories.add(clean_field(Category._meta.get_field('id'), category['id']))
+            clean_field(Category._meta.get_field('name'), category['name'])
+        except ValidationError as error:
+            self._error(where, ' '.join(error.messages))
+
+    def _clean(self, number, item):
+        # нормализованная строка прайса или None, если в ней есть ошибки
+        where = f'Row {number}'
+        if not isinstance(item, dict):
+            return self._error(where, 'good must be a mapping.')
+
+        missing = [name for name in (*GOODS_SCHEMA, 'parameters') if name not in item]
+        if missing:
+            return self._error(where, f'missing fields: {", ".join(missing)}.')
+
+        offer = {}
+        errors = []
+        for name, field in GOODS_SCHEMA.items():
+            try:
+                offer[name] = clean_field(field, item[name])
+            except ValidationError as error:
+                errors.append(f'{name}: {" ".join(error.messages)}')
+
+        if 'category' in offer and offer['category'] not in self.categories:
+            errors.append(f'category: unknown category {offer["category"]}.')
+
+        if 'id' in offer:
+            if offer['id'] in self.seen:
+                errors.append(f'id: duplicate external id {offer["id"]}, first seen in row {self.seen[offer["id"]]}.')
+            else:
+                self.seen[offer['id']] = number
+
+        offer['parameters'] = {}
+        if not isinstance(item['parameters'], dict):
+            errors.append('parameters: mapping is required.')
+        else:
+            for name, value in item['parameters'].items():
+                if isinstance(value, (dict, list)) or value is None:
+                    errors.append(f'parameters: value of "{name}" must be a scalar.')
+                    continue
+                try:
+                    offer['parameters'][clean_field(Parameter._meta.get_field('name'), name)] = \
+                        clean_field(ProductParameter._meta.get_field('value'), str(value))
+                except ValidationError as error:
+                    errors.append(f'parameters: "{name}": {" ".join(error.messages)}')
+
+        for error in errors:
+            self._error(where, error)
+        return None if errors else offer
+
+    def _plan(self, offers):
+        # сравнение с загруженными предложениями по хешу строки, как это сделает импорт
+        if self.shop is None or self.mode == 'replace':
+            self.inserted += len(offers)
+            return
+
+        if self.parameters is None:
+            self.parameters = {name: parameter_id for parameter_id, name in
+                               Parameter.objects.values_list('id', 'name')}
+
+        keys = {(offer['name'], offer['category']) for offer in offers} - set(self.products)
+        if keys:
+            for product_id, name, category_id in Product.objects.filter(
+                    name__in={name for name, _ in keys}, category_id__in={category_id for _, category_id in keys}
+            ).order_by('id').values_list('id', 'name', 'category_id'):
+                self.products.setdefault((name, category_id), product_id)
+            self.products.update({key: None for key in keys if key not in self.products})
+
+        existing = dict(ProductInfo.objects.filter(
+            shop_id=self.shop.id, external_id__in=[offer['id'] for offer in offers]).values_list(
+            'external_id', 'row_hash'))
+
+        for offer in offers:
+            if offer['id'] not in existing:
+                self.inserted += 1
+                continue
+
+            product_id = self.products[(offer['name'], offer['category'])]
+            values = {self.parameters.get(name): value for name, value in offer['parameters'].items()}
+            if product_id is None or None in values:
+                self.updated += 1
+                continue
+
+            current = {'product_id': product_id, **{name: offer[name] for name in OFFER_FIELDS[1:]}}
+            if existing[offer['id']] == row_hash(current, values):
+                self.unchanged += 1
+            else:
+                self.updated += 1
+
+    def _plan_removed(self):
+        if self.mode == 'replace':
+            self.removed = ProductInfo.objects.filter(shop_id=self.shop.id).count()
+        else:
+            self.removed = sum(1 for external_id in removable_offers(self.shop.id).values_list(
+                'external_id', flat=True).iterator() if external_id not in self.seen)
+
+
+class PriceListImporter:
+    # импорт прайса поставщика пачками: справочники держим в памяти, строки пишем через bulk_create/bulk_update
+    def __init__(self, shop, batch_size=BATCH_SIZE, progress=None):
+        self.shop = shop
+        self.batch_size = batch_size
+        self.progress = progress
+        self.categories = {}
+        self.products = {}
+        self.parameters = {}
+        self.seen = set()
+        self.kept = set()
+        self.goods_count = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.removed = 0
+        self.modified = True
+
+    def load_categories(self, categories):
+        categories = {int(category['id']): category['name'] for category in categories}
+
+        self.categories = Category.objects.in_bulk(list(categories))
+        missing = [Category(id=category_id, name=name) for category_id, name in sorted(categories.items())
+                   if category_id not in self.categories]
+        if missing:
+            # категории общие для всех магазинов: параллельная загрузка может создать их раньше нас
+            Category.objects.bulk_create(missing, batch_size=self.batch_size, ignore_conflicts=True)
+            self.categories.update({category.id: category for category in missing})
+
+        through = Category.shops.through
+        through.objects.bulk_create([through(category_id=category_id, shop_id=self.shop.id)
+                                     for category_id in categories],
+                                    batch_size=self.batch_size, ignore_conflicts=True)
+
+    def clear_goods(self):
+        ProductInfo.objects.filter(shop_id=self.shop.id).delete()
+
+    def load_goods(self, goods):
+        if not self.parameters:
+            self.parameters = {name: parameter_id for parameter_id, name in
+                               Parameter.objects.values_list('id', 'name')}
+
+        for batch in chunks(goods, self.batch_size):
+            self.goods_count += len(batch)
+            self._write_batch([item for item in batch if self._first_seen(item)])
+            if self.progress:
+                self.progress(self)
+
+    def remove_vanished(self):
+        # предложения, пропавшие из прайса: удаляем, а попавшие в заказы обнуляем, чтобы не терять заказы
+        vanished = [product_info_id for product_info_id in
+                    removable_offers(self.shop.id).values_list('id', flat=True)
+                    if product_info_id not in self.kept]
+
+        for batch in chunks(vanished, self.batch_size):
+            ordered = set(OrderItem.objects.filter(product_info_id__in=batch).values_list('product_info_id', flat=True))
+            if ordered:
+                ProductInfo.objects.filter(id__in=ordered).update(quantity=0)
+                CatalogueItem.objects.filter(product_info_id__in=ordered).update(quantity=0)
+            ProductInfo.objects.filter(id__in=[product_info_id for product_info_id in batch
+                                               if product_info_id not in ordered]).delete()
+            self.removed += len(batch)
+
+    def _first_seen(self, item):
+        external_id = int(item['id'])
+        if external_id in self.seen:
+            return False
+        self.seen.add(external_id)
+        return True
+
+    def _resolve_products(self, batch):
+        keys = {(item['name'], int(item['category'])) for item in batch} - set(self.products)
+        if not keys:
+            return
+
+        names = {name for name, _ in keys}
+        category_ids = {category_id for _, category_id in keys}
+        for product_id, name, category_id in Product.objects.filter(
+                name__in=names, category_id__in=category_ids).order_by('id').values_list('id', 'name', 'category_id'):
+            self.products.setdefault((name, category_id), product_id)
+
+        missing = [Product(name=name, category_id=category_id) for name, category_id in keys
+                   if (name, category_id) not in self.products]
+        if missing:
+            Product.objects.bulk_create(missing, batch_size=self.batch_size)
+            if any(product.pk is None for product in missing):
+                # бэкенд не вернул первичные ключи (например, SQLite) - перечитываем
+                return self._resolve_products(batch)
+            self.products.update({(product.name, product.category_id): product.id for product in missing})
+
+    def _resolve_parameters(self, batch):
+        missing = {name for item in batch for name in item['parameters'] if name not in self.parameters}
+        if not missing:
+            return
+
+        Parameter.objects.bulk_create([Parameter(name=name) for name in sorted(missing)],
+                                      batch_size=self.batch_size, ignore_conflicts=True)
+        self.parameters.update({name: parameter_id for parameter_id, name in
+                                Parameter.objects.filter(name__in=missing).values_list('id', 'name')})
+
+    def _offer(self, item):
+        offer = {'product_id': self.products[(item['name'], int(item['category']))],
+                 'model': item['model'],
+                 'price': item['price'],
+                 'price_rrc': item['price_rrc'],
+                 'quantity': item['quantity']}
+        return {name: ProductInfo._meta.get_field(name).to_python(value) for name, value in offer.items()}
+
+    def _write_batch(self, batch):
+        if not batch:
+            return
+
+        self._resolve_products(batch)
+        self._resolve_parameters(batch)
+
+        existing = {}
+        for product_info in ProductInfo.objects.filter(
+                shop_id=self.shop.id, external_id__in=[item['id'] for item in batch]).order_by('id').only(
+                'id', 'external_id', 'row_hash', *OFFER_FIELDS):
+            existing.setdefault(product_info.external_id, product_info)
+
+        rows = []
+        for item in batch:
+            offer = self._offer(item)
+            values = {self.parameters[name]: str(value) for name, value in item['parameters'].items()}
+            offer['row_hash'] = row_hash(offer, values)
+            rows.append((item, offer, values, existing.get(int(item['id']))))
+
+        # параметры читаем только для строк, хеш которых изменился
+        stale = [product_info.id for _, offer, _, product_info in rows
+                 if product_info is not None and product_info.row_hash != offer['row_hash']]
+        current_parameters = defaultdict(dict)
+        if stale:
+            for product_info_id, parameter_id, value in ProductParameter.objects.filter(
+                    product_info_id__in=stale).values_list('product_info_id', 'parameter_id', 'value'):
+                current_parameters[product_info_id][parameter_id] = value
+
+        created = []
+        changed = defaultdict(list)
+        parameters = []
+        reset_parameters = []
+        catalogue = []
+        for item, offer, values, product_info in rows:
+            if product_info is None:
+                created.append((ProductInfo(shop_id=self.shop.id, external_id=item['id'], **offer), values))
+                catalogue.append((created[-1][0], item, offer, False))
+                continue
+
+            self.kept.add(product_info.id)
+            if product_info.row_hash == offer['row_hash']:
+                self.unchanged += 1
+                continue
+
+            changed_fields = frozenset(name for name, value in offer.items()
+                                       if getattr(product_info, name) != value)
+            for name in changed_fields:
+                setattr(product_info, name, offer[name])
+            changed[changed_fields].append(product_info)
+            catalogue.append((product_info, item, offer, True))
+
+            parameters_changed = current_parameters[product_info.id] != values
+            if parameters_changed:
+                reset_parameters.append(product_info.id)
+                parameters.append((product_info, values))
+
+            # строка без хеша (загружена до его появления) с теми же данными считается неизменной
+            if changed_fields - {'row_hash'} or parameters_changed:
+                self.updated += 1
+            else:
+                self.unchanged += 1
+
+        # строки с одинаковым набором изменённых полей обновляются одним запросом
+        for fields, product_infos in changed.items():
+            ProductInfo.objects.bulk_update(product_infos, list(fields), batch_size=self.batch_size)
+
+        if reset_parameters:
+            ProductParameter.objects.filter(product_info_id__in=reset_parameters).delete()
+
+        if created:
+            self._create_offers([product_info for product_info, _ in created])
+            parameters.extend(created)
+            self.inserted += len(created)
+
+        ProductParameter.objects.bulk_create(
+            [ProductParameter(product_info_id=product_info.pk, parameter_id=parameter_id, value=value,
+                              numeric_value=parse_number(value))
+             for product_info, values in parameters
+             for parameter_id, value in values.items()],
+            batch_size=self.batch_size)
+
+        self._write_catalogue(catalogue)
+
+    def _write_catalogue(self, rows):
+        # строки каталога новых и изменившихся предложений собираются из уже разобранного прайса, без чтения БД
+        if not rows or not self.shop.state:
+            return
+
+        stale = [product_info.pk for product_info, _, _, existed in rows if existed]
+        if stale:
+            CatalogueItem.objects.filter(product_info_id__in=stale).delete()
+        items = []
+        for product_info, item, offer, _ in rows:
+            category = self.categories[int(item['category'])]
+            items.append(CatalogueItem(
+                product_info_id=product_info.pk, shop_id=self.shop.id, shop_name=self.shop.name,
+                product_id=offer['product_id'], product_name=item['name'], category_id=category.id,
+                category_name=category.name, external_id=int(item['id']), model=offer['model'],
+                quantity=offer['quantity'], price=offer['price'], price_rrc=offer['price_rrc'],
+                parameters=render_parameters((name, str(value)) for name, value in item['parameters'].items())))
+        CatalogueItem.objects.bulk_create(items, batch_size=self.batch_size)
+
+    def _create_offers(self, product_infos):
+        ProductInfo.objects.bulk_create(product_infos, batch_size=self.batch_size)
+
+        if any(product_info.pk is None for product_info in product_infos):
+            ids = {(product_id, external_id): product_info_id for product_info_id, product_id, external_id in
+                   ProductInfo.objects.filter(shop_id=self.shop.id,
+                                              external_id__in=[product_info.external_id
+                                                               for product_info in product_infos]).values_list(
+                       'id', 'product_id', 'external_id')}
+            for product_info in product_infos:
+                product_info.pk = ids[(product_info.product_id, product_info.external_id)]
+
+        self.kept.update(product_info.pk for product_info in product_infos)
+
+
+def import_price_list(data, user_id, mode='upsert', batch_size=BATCH_SIZE, progress=None, shop=None,
+                      content_hash=None):
+    # загрузка прайса магазина одной транзакцией: upsert по внешнему идентификатору или полная замена
+    token = importing.set(True)
+    try:
+        return _import_price_list(data, user_id, mode, batch_size, progress, shop, content_hash)
+    finally:
+        importing.reset(token)
+
+
+def _import_price_list(data, user_id, mode, batch_size, progress, shop, content_hash):
+    with transaction.atomic():
+        if shop is None and user_id is None:
+            shop = Shop.objects.filter(name=data['shop']).order_by('id').first() or \
+                Shop.objects.create(name=data['shop'])
+        elif shop is None:
+            shop, _ = Shop.objects.get_or_create(name=data['shop'], user_id=user_id)
+
+        importer = PriceListImporter(shop, batch_size=batch_size, progress=progress)
+
+        # тот же файл, что и при прошлой успешной загрузке, - пропускаем
+        if mode == 'upsert' and content_hash and shop.price_hash == content_hash:
+            importer.modified = False
+            return importer
+
+        importer.load_categories(data['categories'])
+        if mode == 'replace':
+            importer.clear_goods()
+        importer.load_goods(data['goods'])
+        importer.remove_vanished()
+        # кеши каталога сбрасываются только после фиксации новых строк
+        transaction.on_commit(bump_catalogue_version)
+        transaction.on_commit(schedule_snapshot)
+
+        if content_hash:
+            shop.price_hash = content_hash
+            shop.save(update_fields=['price_hash'])
+
+    return importer
+
+
+def validate_price_list(data, shop=None, mode='upsert', batch_size=BATCH_SIZE):
+    # проверка прайса без записи в БД; с shop - ещё и план вставок, обновлений и удалений
+    return PriceListValidator(shop, mode=mode, batch_size=batch_size).validate(data)
+
+
+def import_price_file(file, format_name, user_id, mode='upsert', batch_size=BATCH_SIZE, progress=None, shop=None,
+                      content_hash=None):
+    # два прохода по файлу: сначала проверяется весь прайс, загрузка начинается только если ошибок нет
+    validator = validate_price_list(parse_price_list(file, format_name), batch_size=batch_size)
+    if validator.errors:
+        raise PriceListValidationError(validator.errors)
+
+    file.seek(0)
+    return import_price_list(parse_price_list(file, format_name), user_id, mode=mode, batch_size=batch_size,
+                             progress=progress, shop=shop, content_hash=content_hash)
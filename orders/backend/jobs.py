@@ -0,0 +1,126 @@
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from backend.importer import import_price_file, content_hash, PriceListValidationError
+from backend.models import ImportJob, Shop
+from backend.parsers import DEFAULT_FORMAT
+
+
+def enqueue_import(user, file, mode='upsert', format_name=DEFAULT_FORMAT):
+    # сохранение прайса на диск и постановка задачи в очередь; None - прайс не изменился с прошлой загрузки
+    if isinstance(file, str):
+        file = ContentFile(file.encode('utf-8'), name=f'price.{format_name}')
+
+    digest = content_hash(file)
+    if mode == 'upsert' and Shop.objects.filter(user_id=user.id, price_hash=digest).exists():
+        return None
+
+    job = ImportJob(user=user, mode=mode, format=format_name, content_hash=digest)
+    job.file.save(getattr(file, 'name', None) or f'price.{format_name}', file, save=False)
+    job.save()
+    return job
+
+
+def requeue_stale_jobs():
+    # задачи обработчиков, которые перестали обновлять пульс (процесс убит, сервер перезапущен). Импорт идёт
+    # одной транзакцией, поэтому такая задача безопасно выполняется заново; после IMPORT_JOB_ATTEMPTS попыток
+    # она завершается ошибкой. Возвращает (возвращено в очередь, завершено ошибкой)
+    now = timezone.now()
+    deadline = now - timedelta(seconds=settings.IMPORT_JOB_TIMEOUT)
+    # задачи, захваченные до появления пульса, проверяются по времени начала
+    stale = ImportJob.objects.filter(
+        Q(heartbeat_at__lt=deadline) | Q(heartbeat_at__isnull=True, started_at__lt=deadline), state='running')
+    failed = stale.filter(attempts__gte=settings.IMPORT_JOB_ATTEMPTS).update(
+        state='failed', errors='Import worker stopped responding.', finished_at=now)
+    requeued = stale.update(state='new', rows_processed=0, started_at=None, heartbeat_at=None)
+    return requeued, failed
+
+
+def claim_job():
+    # захват следующей задачи; skip_locked позволяет запускать несколько обработчиков
+    requeue_stale_jobs()
+    with transaction.atomic():
+        job = ImportJob.objects.select_for_update(skip_locked=True).filter(state='new').order_by('id').first()
+        if job is None:
+            return None
+
+        job.state = 'running'
+        job.started_at = job.heartbeat_at = timezone.now()
+        job.attempts += 1
+        job.save(update_fields=['state', 'started_at', 'heartbeat_at', 'attempts'])
+    return job
+
+
+class ProgressReporter(threading.Thread):
+    # импорт идёт в одной транзакции, поэтому прогресс и пульс пишем из отдельного потока со своим соединением
+    def __init__(self, job_id, interval):
+        super().__init__(daemon=True)
+        self.job_id = job_id
+        self.interval = interval
+        self.rows_processed = 0
+        self.stopped = threading.Event()
+
+    def __call__(self, importer):
+        self.rows_processed = importer.goods_count
+
+    def run(self):
+        try:
+            while not self.stopped.wait(self.interval):
+                ImportJob.objects.filter(id=self.job_id).update(rows_processed=self.rows_processed,
+                                                                heartbeat_at=timezone.now())
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def run_job(job):
+    reporter = ProgressReporter(job.id, settings.IMPORT_PROGRESS_INTERVAL)
+    reporter.start()
+    try:
+        with job.file.open('rb') as file:
+            importer = import_price_file(file, job.format, job.user_id, mode=job.mode, progress=reporter,
+                                         content_hash=job.content_hash)
+    except PriceListValidationError as error:
+        job.state = 'failed'
+        job.errors = '\n'.join(error.errors)
+    except Exception as error:
+        job.state = 'failed'
+        job.errors = f'{type(error).__name__}: {error}'
+    else:
+        job.state = 'done'
+        job.shop = importer.shop
+        job.rows_processed = importer.goods_count
+        job.inserted = importer.inserted
+        job.updated = importer.updated
+        job.unchanged = importer.unchanged
+        job.removed = importer.removed
+    finally:
+        reporter.stop()
+
+    # исходный файл храним только для разбора неудачных загрузок
+    if job.state == 'done':
+        job.file.delete(save=False)
+
+    job.finished_at = timezone.now()
+    job.save()
+    return job
+
+
+def run_pending():
+    # обработка всех задач из очереди, возвращает количество выполненных
+    processed = 0
+    while True:
+        job = claim_job()
+        if job is None:
+            return processed
+        run_job(job)
+        processed += 1
@@ -0,0 +1,14 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from backend.snapshots import build_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Сборка сжатого снимка всего активного каталога для product/snapshot'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        version, rows = build_snapshot()
+        self.stdout.write(f'Snapshot {version}: {rows} rows in {time.perf_counter() - started:.2f}s')
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from backend.cache import cache_stats, catalogue_version
+
+
+class Command(BaseCommand):
+    help = 'Статистика кеша ответов каталога: попадания, промахи и текущая версия каталога'
+
+    def handle(self, *args, **options):
+        stats = cache_stats()
+        ratio = 'n/a' if stats['ratio'] is None else f'{stats["ratio"]:.1%}'
+        self.stdout.write(f'Catalogue version: {catalogue_version()}')
+        self.stdout.write(f'Hits: {stats["hits"]}, misses: {stats["misses"]}, hit ratio: {ratio}')
@@ -0,0 +1,101 @@
+import glob
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, OperationalError
+
+from backend.importer import import_price_file, content_hash, IMPORT_MODES, BATCH_SIZE
+from backend.parsers import find_format, FORMATS
+
+DEADLOCK_RETRIES = 2
+
+
+def find_price_lists(source):
+    if os.path.isdir(source):
+        paths = [path for _, _, extensions in FORMATS.values() for extension in extensions
+                 for path in glob.glob(os.path.join(source, f'*{extension}'))]
+    else:
+        paths = glob.glob(source)
+    return sorted(path for path in paths if os.path.isfile(path))
+
+
+def import_file(path, mode=IMPORT_MODES[0], batch_size=BATCH_SIZE):
+    # загрузка одного файла в собственной транзакции: ошибка не влияет на остальные магазины
+    started = time.perf_counter()
+    result = {'path': path, 'shop': None, 'rows': 0, 'error': None}
+
+    for attempt in range(DEADLOCK_RETRIES + 1):
+        try:
+            with File(open(path, 'rb')) as file:
+                digest = content_hash(file)
+                importer = import_price_file(file, find_format(path), None, mode=mode, batch_size=batch_size,
+                                             content_hash=digest)
+        except OperationalError as error:
+            # взаимная блокировка при одновременном создании общих справочников - повторяем
+            if getattr(error.__cause__, 'pgcode', None) != '40P01' or attempt == DEADLOCK_RETRIES:
+                result['error'] = f'{type(error).__name__}: {error}'
+                break
+        except Exception as error:
+            result['error'] = f'{type(error).__name__}: {error}'
+            break
+        else:
+            result.update(shop=importer.shop.name, rows=importer.goods_count, modified=importer.modified,
+                          inserted=importer.inserted, updated=importer.updated, unchanged=importer.unchanged,
+                          removed=importer.removed)
+            break
+
+    result['seconds'] = time.perf_counter() - started
+    return result
+
+
+class Command(BaseCommand):
+    help = 'Параллельная загрузка прайсов из каталога или по маске'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='Каталог с прайсами или маска, например data/*.yaml')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Количество процессов; 0 - загрузка в текущем процессе')
+        parser.add_argument('--mode', choices=IMPORT_MODES, default=IMPORT_MODES[0])
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        paths = find_price_lists(options['source'])
+        if not paths:
+            raise CommandError(f'No price lists found: {options["source"]}')
+
+        started = time.perf_counter()
+        arguments = [(path, options['mode'], options['batch_size']) for path in paths]
+
+        if options['workers'] == 0:
+            results = [import_file(*argument) for argument in arguments]
+        else:
+            # дочерние процессы должны открыть собственные соединения с БД
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=min(options['workers'], len(paths)),
+                                     mp_context=multiprocessing.get_context('fork')) as executor:
+                results = list(executor.map(import_file, *zip(*arguments)))
+
+        self.print_summary(results, time.perf_counter() - started)
+
+        if any(result['error'] for result in results):
+            raise CommandError(f'{sum(1 for result in results if result["error"])} of {len(results)} files failed.')
+
+    def print_summary(self, results, elapsed):
+        self.stdout.write(f'{"file":<40} {"shop":<20} {"rows":>8} {"seconds":>8} {"rows/s":>9}  status')
+        for result in results:
+            rows_per_second = result['rows'] / result['seconds'] if result['seconds'] else 0
+            if result['error']:
+                status = result['error']
+            elif not result['modified']:
+                status = 'not modified'
+            else:
+                status = f'+{result["inserted"]} ~{result["updated"]} ={result["unchanged"]} -{result["removed"]}'
+            self.stdout.write(f'{os.path.basename(result["path"]):<40} {result["shop"] or "-":<20} '
+                              f'{result["rows"]:>8} {result["seconds"]:>8.2f} {rows_per_second:>9.0f}  {status}')
+
+        total = sum(result['rows'] for result in results)
+        self.stdout.write(f'Total: {len(results)} files, {total} rows in {elapsed:.2f}s')
@@ -0,0 +1,28 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from backend.jobs import claim_job, run_job
+
+
+class Command(BaseCommand):
+    help = 'Обработка очереди загрузок прайсов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Обработать очередь и завершиться')
+        parser.add_argument('--interval', type=float, default=settings.IMPORT_WORKER_POLL_INTERVAL,
+                            help='Пауза между опросами очереди, сек.')
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_job()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
+                continue
+
+            job = run_job(job)
+            self.stdout.write(f'Job {job.id}: {job.state}, rows {job.rows_processed}'
+                              + (f', {job.errors}' if job.errors else ''))
@@ -0,0 +1,27 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from backend.feeds import poll_feeds
+
+
+class Command(BaseCommand):
+    help = 'Опрос прайсов поставщиков по ссылкам магазинов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Опросить прайсы один раз и завершиться')
+        parser.add_argument('--interval', type=float, default=settings.FEED_POLL_INTERVAL,
+                            help='Пауза между опросами, сек.')
+        parser.add_argument('--concurrency', type=int, default=settings.FEED_CONCURRENCY)
+
+    def handle(self, *args, **options):
+        while True:
+            for result in poll_feeds(concurrency=options['concurrency']):
+                self.stdout.write(f'{result["shop"]}: {result["status"]}'
+                                  + (f', rows {result["rows"]}' if result['rows'] else '')
+                                  + (f', {result["error"]}' if result['error'] else ''))
+
+            if options['once']:
+                return
+            time.sleep(options['interval'])
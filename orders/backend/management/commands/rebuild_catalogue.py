@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from backend.catalogue import rebuild_catalogue
+from backend.importer import BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Перестроение плоской таблицы каталога по предложениям активных магазинов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        created = rebuild_catalogue(options['batch_size'])
+        self.stdout.write(f'Catalogue rebuilt: {created} rows in {time.perf_counter() - started:.2f}s')
@@ -0,0 +1,31 @@
+# Generated by Django 3.0 on 2026-10-18 13:24
+
+from django.db import migrations
+from django.db.models import Min
+
+
+def merge_duplicate_parameters(apps, schema_editor):
+    # перед созданием ограничения сводим одноимённые параметры к одному
+    Parameter = apps.get_model('backend', 'Parameter')
+    ProductParameter = apps.get_model('backend', 'ProductParameter')
+
+    for name, parameter_id in Parameter.objects.values('name').annotate(
+            first_id=Min('id')).values_list('name', 'first_id'):
+        for duplicate_id in Parameter.objects.filter(name=name).exclude(id=parameter_id).values_list('id', flat=True):
+            ProductParameter.objects.filter(
+                parameter_id=duplicate_id,
+                product_info__in=ProductParameter.objects.filter(parameter_id=parameter_id).values('product_info')
+            ).delete()
+            ProductParameter.objects.filter(parameter_id=duplicate_id).update(parameter_id=parameter_id)
+            Parameter.objects.filter(id=duplicate_id).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0004_import_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_parameters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.0 on 2026-10-18 13:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0006_unique_parameter_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shop',
+            name='feed_checked_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Дата проверки прайса'),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='feed_etag',
+            field=models.CharField(blank=True, max_length=255, verbose_name='ETag прайса'),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='feed_last_modified',
+            field=models.CharField(blank=True, max_length=64, verbose_name='Дата изменения прайса'),
+        ),
+    ]
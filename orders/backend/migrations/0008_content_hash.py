@@ -0,0 +1,28 @@
+# Generated by Django 3.0 on 2026-10-18 13:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0007_shop_feed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64, verbose_name='Хеш прайса'),
+        ),
+        migrations.AddField(
+            model_name='productinfo',
+            name='row_hash',
+            field=models.CharField(blank=True, max_length=32, verbose_name='Хеш строки прайса'),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='price_hash',
+            field=models.CharField(blank=True, max_length=64, verbose_name='Хеш загруженного прайса'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.0 on 2026-10-18 13:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0008_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='format',
+            field=models.CharField(default='yaml', max_length=10, verbose_name='Формат'),
+        ),
+    ]
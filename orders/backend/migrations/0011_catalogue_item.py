@@ -0,0 +1,84 @@
+# Generated by Django 3.0 on 2026-10-18 13:42
+
+import json
+from collections import defaultdict
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BATCH_SIZE = 1000
+
+CATALOGUE_FIELDS = ('id', 'shop_id', 'shop__name', 'product_id', 'product__name', 'product__category_id',
+                    'product__category__name', 'external_id', 'model', 'quantity', 'price', 'price_rrc')
+
+
+def fill_catalogue(apps, schema_editor):
+    # копия backend.catalogue.build_catalogue на момент миграции: каталог по уже загруженным предложениям
+    # активных магазинов, пачками - один запрос параметров и одна вставка на пачку
+    ProductInfo = apps.get_model('backend', 'ProductInfo')
+    ProductParameter = apps.get_model('backend', 'ProductParameter')
+    CatalogueItem = apps.get_model('backend', 'CatalogueItem')
+
+    offers = ProductInfo.objects.filter(shop__state=True).order_by('id').values_list(*CATALOGUE_FIELDS)
+    for start in range(0, offers.count(), BATCH_SIZE):
+        batch = list(offers[start:start + BATCH_SIZE])
+        parameters = defaultdict(list)
+        for product_info_id, name, value in ProductParameter.objects.filter(
+                product_info_id__in=[row[0] for row in batch]).order_by('id').values_list(
+                'product_info_id', 'parameter__name', 'value'):
+            parameters[product_info_id].append({'parameter': name, 'value': value})
+
+        CatalogueItem.objects.bulk_create([
+            CatalogueItem(product_info_id=product_info_id, shop_id=shop_id, shop_name=shop_name,
+                          product_id=product_id, product_name=product_name, category_id=category_id,
+                          category_name=category_name, external_id=external_id, model=model, quantity=quantity,
+                          price=price, price_rrc=price_rrc,
+                          parameters=json.dumps(parameters[product_info_id], ensure_ascii=False))
+            for product_info_id, shop_id, shop_name, product_id, product_name, category_id, category_name,
+            external_id, model, quantity, price, price_rrc in batch], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0010_product_info_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogueItem',
+            fields=[
+                ('product_info', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='catalogue_item', serialize=False, to='backend.ProductInfo', verbose_name='Информация о продукте')),
+                ('shop_name', models.CharField(max_length=50, verbose_name='Название магазина')),
+                ('product_name', models.CharField(max_length=80, verbose_name='Название продукта')),
+                ('category_name', models.CharField(max_length=40, verbose_name='Название категории')),
+                ('external_id', models.PositiveIntegerField(verbose_name='Внешний идентификатор')),
+                ('model', models.CharField(blank=True, max_length=80, verbose_name='Модель')),
+                ('quantity', models.PositiveIntegerField(verbose_name='Количество')),
+                ('price', models.PositiveIntegerField(verbose_name='Цена')),
+                ('price_rrc', models.PositiveIntegerField(verbose_name='Рекомендуемая розничная цена')),
+                ('parameters', models.TextField(default='[]', verbose_name='Параметры (JSON)')),
+                ('category', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='catalogue_items', to='backend.Category', verbose_name='Категория')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='catalogue_items', to='backend.Product', verbose_name='Продукт')),
+                ('shop', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='catalogue_items', to='backend.Shop', verbose_name='Магазин')),
+            ],
+            options={
+                'verbose_name': 'Строка каталога',
+                'verbose_name_plural': 'Строки каталога',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='catalogueitem',
+            index=models.Index(fields=['shop', 'product_info'], name='catalogue_shop'),
+        ),
+        migrations.AddIndex(
+            model_name='catalogueitem',
+            index=models.Index(fields=['category', 'product_info'], name='catalogue_category'),
+        ),
+        migrations.AddIndex(
+            model_name='catalogueitem',
+            index=models.Index(fields=['price', 'product_info'], name='catalogue_price'),
+        ),
+        migrations.RunPython(fill_catalogue, migrations.RunPython.noop),
+    ]
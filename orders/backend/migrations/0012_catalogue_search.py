@@ -0,0 +1,44 @@
+# Generated by Django 3.0 on 2026-10-18 13:55
+
+from django.db import migrations
+
+# выражение должно совпадать с backend.search.SEARCH_VECTOR
+SEARCH_VECTOR = ("to_tsvector('russian'::regconfig, COALESCE(\"product_name\", '') || ' ' || "
+                 "COALESCE(REPLACE(\"model\", '/', ' '), ''))")
+
+
+def create_search_indexes(apps, schema_editor):
+    # GIN-индексы есть только в PostgreSQL; на остальных БД поиск работает через SearchFilter
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute(f'CREATE INDEX catalogue_search ON backend_catalogueitem USING GIN ({SEARCH_VECTOR})')
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        trigram = cursor.fetchone() is not None
+    if trigram:
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        schema_editor.execute('CREATE INDEX catalogue_name_trgm ON backend_catalogueitem '
+                              'USING GIN (product_name gin_trgm_ops)')
+        schema_editor.execute('CREATE INDEX catalogue_model_trgm ON backend_catalogueitem '
+                              'USING GIN (model gin_trgm_ops)')
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    for name in ('catalogue_search', 'catalogue_name_trgm', 'catalogue_model_trgm'):
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0011_catalogue_item'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
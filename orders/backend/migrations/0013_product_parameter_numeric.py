@@ -0,0 +1,58 @@
+# Generated by Django 3.0 on 2026-10-18 13:49
+
+import math
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def parse_number(value):
+    # копия backend.models.parse_number на момент миграции: миграция не зависит от текущего кода моделей
+    try:
+        number = float(str(value).strip().replace(',', '.'))
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+
+def fill_numeric_values(apps, schema_editor):
+    # разбираем уже загруженные значения; строки без числа остаются с NULL
+    ProductParameter = apps.get_model('backend', 'ProductParameter')
+
+    last_id = 0
+    while True:
+        batch = list(ProductParameter.objects.filter(id__gt=last_id).order_by('id').only('id', 'value')[:BATCH_SIZE])
+        if not batch:
+            return
+        last_id = batch[-1].id
+        numeric = []
+        for product_parameter in batch:
+            product_parameter.numeric_value = parse_number(product_parameter.value)
+            if product_parameter.numeric_value is not None:
+                numeric.append(product_parameter)
+        ProductParameter.objects.bulk_update(numeric, ['numeric_value'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0012_catalogue_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productparameter',
+            name='numeric_value',
+            field=models.FloatField(blank=True, null=True, verbose_name='Числовое значение'),
+        ),
+        migrations.RunPython(fill_numeric_values, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='productparameter',
+            index=models.Index(fields=['parameter', 'numeric_value'], name='product_parameter_numeric'),
+        ),
+        migrations.AddIndex(
+            model_name='productparameter',
+            index=models.Index(fields=['parameter', 'value'], name='product_parameter_value'),
+        ),
+    ]
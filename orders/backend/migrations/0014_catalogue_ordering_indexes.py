@@ -0,0 +1,37 @@
+# Generated by Django 3.0 on 2026-10-18 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0013_product_parameter_numeric'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='catalogueitem',
+            index=models.Index(fields=['price_rrc', 'product_info'], name='catalogue_price_rrc'),
+        ),
+        migrations.AddIndex(
+            model_name='catalogueitem',
+            index=models.Index(fields=['quantity', 'product_info'], name='catalogue_quantity'),
+        ),
+        migrations.AddIndex(
+            model_name='catalogueitem',
+            index=models.Index(fields=['category', 'price', 'product_info'], name='catalogue_category_price'),
+        ),
+        migrations.AddIndex(
+            model_name='catalogueitem',
+            index=models.Index(condition=models.Q(quantity__gt=0), fields=['price', 'product_info'], name='catalogue_stock_price'),
+        ),
+        migrations.AddIndex(
+            model_name='catalogueitem',
+            index=models.Index(condition=models.Q(quantity__gt=0), fields=['category', 'price', 'product_info'], name='catalogue_stock_category'),
+        ),
+        migrations.AddIndex(
+            model_name='catalogueitem',
+            index=models.Index(condition=models.Q(quantity__gt=0), fields=['shop', 'price', 'product_info'], name='catalogue_stock_shop'),
+        ),
+    ]
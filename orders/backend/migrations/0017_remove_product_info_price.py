@@ -0,0 +1,17 @@
+# Generated by Django 3.0 on 2026-10-18 14:39
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0016_import_job_heartbeat'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='productinfo',
+            name='product_info_price',
+        ),
+    ]
@@ -1,3 +1,5 @@
+import math
+
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import AbstractUser
 from django.db import models
@@ -13,6 +15,13 @@ STATE_CHOICES = (
     ('canceled', 'Отменён'),
 )
 
+IMPORT_STATE_CHOICES = (
+    ('new', 'В очереди'),
+    ('running', 'Выполняется'),
+    ('done', 'Завершён'),
+    ('failed', 'Ошибка'),
+)
+
 USER_TYPE_CHOICES = (
     ('shop', 'Магазин'),
     ('buyer', 'Покупатель'),
@@ -20,6 +29,15 @@ USER_TYPE_CHOICES = (
 )
 
 
+def parse_number(value):
+    # числовое значение параметра ("6.5", "6,5", "256"); для нечисловых строк - None
+    try:
+        number = float(str(value).strip().replace(',', '.'))
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+
 class UserManager(BaseUserManager):
     use_in_migrations = True
 
@@ -78,6 +96,10 @@ class Shop(models.Model):
                                 blank=True, null=True,
                                 on_delete=models.CASCADE)
     state = models.BooleanField(verbose_name='Статус заказа', default=True)
+    feed_etag = models.CharField(verbose_name='ETag прайса', max_length=255, blank=True)
+    feed_last_modified = models.CharField(verbose_name='Дата изменения прайса', max_length=64, blank=True)
+    feed_checked_at = models.DateTimeField(verbose_name='Дата проверки прайса', blank=True, null=True)
+    price_hash = models.CharField(verbose_name='Хеш загруженного прайса', max_length=64, blank=True)
 
     class Meta:
         verbose_name = 'Магазин'
@@ -125,6 +147,7 @@ class ProductInfo(models.Model):
     quantity = models.PositiveIntegerField(verbose_name='Количество')
     price = models.PositiveIntegerField(verbose_name='Цена')
     price_rrc = models.PositiveIntegerField(verbose_name='Рекомендуемая розничная цена')
+    row_hash = models.CharField(verbose_name='Хеш строки прайса', max_length=32, blank=True)
 
     class Meta:
         verbose_name = 'Информация о продукте'
@@ -132,6 +155,9 @@ class ProductInfo(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['product', 'shop', 'external_id'], name='unique_product_info'),
         ]
+        indexes = [
+            models.Index(fields=['shop', 'external_id'], name='product_info_shop_external'),
+        ]
 
 
 class Parameter(models.Model):
@@ -141,6 +167,9 @@ class Parameter(models.Model):
         verbose_name = 'Имя параметра'
         verbose_name_plural = "Имена параметров"
         ordering = ('-name',)
+        constraints = [
+            models.UniqueConstraint(fields=['name'], name='unique_parameter_name'),
+        ]
 
     def __str__(self):
         return self.name
@@ -153,6 +182,8 @@ class ProductParameter(models.Model):
     parameter = models.ForeignKey(Parameter, verbose_name='Параметр', related_name='product_parameters', blank=True,
                                   on_delete=models.CASCADE)
     value = models.CharField(verbose_name='Значение', max_length=100)
+    # value, разобранное как число, для фильтров по диапазону; ведётся вместе с value
+    numeric_value = models.FloatField(verbose_name='Числовое значение', null=True, blank=True)
 
     class Meta:
         verbose_name = 'Параметр'
@@ -160,6 +191,54 @@ class ProductParameter(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['product_info', 'parameter'], name='unique_product_parameter'),
         ]
+        indexes = [
+            models.Index(fields=['parameter', 'numeric_value'], name='product_parameter_numeric'),
+            models.Index(fields=['parameter', 'value'], name='product_parameter_value'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.numeric_value = parse_number(self.value)
+        super().save(*args, **kwargs)
+
+
+class CatalogueItem(models.Model):
+    # плоская строка каталога для чтения: одна на предложение активного магазина, ведётся импортом прайсов
+    product_info = models.OneToOneField(ProductInfo, verbose_name='Информация о продукте', primary_key=True,
+                                        related_name='catalogue_item', on_delete=models.CASCADE)
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='catalogue_items', db_index=False,
+                             on_delete=models.CASCADE)
+    shop_name = models.CharField(max_length=50, verbose_name='Название магазина')
+    product = models.ForeignKey(Product, verbose_name='Продукт', related_name='catalogue_items',
+                                on_delete=models.CASCADE)
+    product_name = models.CharField(max_length=80, verbose_name='Название продукта')
+    category = models.ForeignKey(Category, verbose_name='Категория', related_name='catalogue_items', db_index=False,
+                                 on_delete=models.CASCADE)
+    category_name = models.CharField(max_length=40, verbose_name='Название категории')
+    external_id = models.PositiveIntegerField(verbose_name='Внешний идентификатор')
+    model = models.CharField(max_length=80, verbose_name='Модель', blank=True)
+    quantity = models.PositiveIntegerField(verbose_name='Количество')
+    price = models.PositiveIntegerField(verbose_name='Цена')
+    price_rrc = models.PositiveIntegerField(verbose_name='Рекомендуемая розничная цена')
+    parameters = models.TextField(verbose_name='Параметры (JSON)', default='[]')
+
+    class Meta:
+        verbose_name = 'Строка каталога'
+        verbose_name_plural = 'Строки каталога'
+        indexes = [
+            models.Index(fields=['shop', 'product_info'], name='catalogue_shop'),
+            models.Index(fields=['category', 'product_info'], name='catalogue_category'),
+            models.Index(fields=['price', 'product_info'], name='catalogue_price'),
+            models.Index(fields=['price_rrc', 'product_info'], name='catalogue_price_rrc'),
+            models.Index(fields=['quantity', 'product_info'], name='catalogue_quantity'),
+            models.Index(fields=['category', 'price', 'product_info'], name='catalogue_category_price'),
+            # "дешёвые в наличии": частичные индексы только по строкам с quantity > 0
+            models.Index(fields=['price', 'product_info'], name='catalogue_stock_price',
+                         condition=models.Q(quantity__gt=0)),
+            models.Index(fields=['category', 'price', 'product_info'], name='catalogue_stock_category',
+                         condition=models.Q(quantity__gt=0)),
+            models.Index(fields=['shop', 'price', 'product_info'], name='catalogue_stock_shop',
+                         condition=models.Q(quantity__gt=0)),
+        ]
 
 
 class Contact(models.Model):
@@ -217,3 +296,39 @@ class OrderItem(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['order_id', 'product_info'], name='unique_order_item'),
         ]
+
+
+class ImportJob(models.Model):
+    user = models.ForeignKey(User, verbose_name='Пользователь',
+                             related_name='import_jobs', blank=True,
+                             on_delete=models.CASCADE)
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='import_jobs', blank=True, null=True,
+                             on_delete=models.SET_NULL)
+    file = models.FileField(verbose_name='Файл прайса', upload_to='imports/')
+    mode = models.CharField(verbose_name='Режим', max_length=10, default='upsert')
+    format = models.CharField(verbose_name='Формат', max_length=10, default='yaml')
+    content_hash = models.CharField(verbose_name='Хеш прайса', max_length=64, blank=True)
+    state = models.CharField(verbose_name='Статус', choices=IMPORT_STATE_CHOICES, max_length=10, default='new')
+    rows_processed = models.PositiveIntegerField(verbose_name='Обработано строк', default=0)
+    inserted = models.PositiveIntegerField(verbose_name='Добавлено', default=0)
+    updated = models.PositiveIntegerField(verbose_name='Обновлено', default=0)
+    unchanged = models.PositiveIntegerField(verbose_name='Без изменений', default=0)
+    removed = models.PositiveIntegerField(verbose_name='Удалено', default=0)
+    errors = models.TextField(verbose_name='Ошибки', blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    # пульс обработчика: обновляется во время импорта, по нему находятся задачи упавших обработчиков
+    heartbeat_at = models.DateTimeField(blank=True, null=True)
+    attempts = models.PositiveIntegerField(verbose_name='Попыток', default=0)
+
+    class Meta:
+        verbose_name = 'Загрузка прайса'
+        verbose_name_plural = "Загрузки прайсов"
+        ordering = ('-created_at',)
+        indexes = [
+            models.Index(fields=['state', 'id'], name='import_job_state'),
+        ]
+
+    def __str__(self):
+        return f'{self.id} {self.state}'
@@ -0,0 +1,158 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    # постраничный вывод по ключу сортировки: страница начинается сразу после последней строки предыдущей,
+    # поэтому нет ни OFFSET, ни COUNT(*), и дальние страницы стоят столько же, сколько первая
+    page_size = 50
+    max_page_size = 500
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    ordering_param = 'ordering'
+    # значение параметра ordering -> поля сортировки; последнее поле уникально и делает ключ однозначным
+    orderings = OrderedDict([
+        ('id', ('pk',)),
+        ('-id', ('-pk',)),
+        ('price', ('price', 'pk')),
+        ('-price', ('-price', '-pk')),
+        ('price_rrc', ('price_rrc', 'pk')),
+        ('-price_rrc', ('-price_rrc', '-pk')),
+        ('quantity', ('quantity', 'pk')),
+        ('-quantity', ('-quantity', '-pk')),
+    ])
+    default_ordering = 'id'
+    # сортировка по релевантности, если фильтр поиска добавил аннотацию search_rank; тогда она по умолчанию
+    rank_annotation = 'search_rank'
+    rank_ordering = ('rank', (f'-{rank_annotation}', 'pk'))
+    invalid_cursor_message = 'Invalid cursor'
+
+    @classmethod
+    def key_fields(cls):
+        # поля ключей всех сортировок: они должны быть в строках страницы, из которых строится курсор
+        return tuple(dict.fromkeys(field.lstrip('-') for fields in cls.orderings.values() for field in fields))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        orderings = dict(self.orderings)
+        default_ordering = self.default_ordering
+        if self.rank_annotation in queryset.query.annotations:
+            orderings[self.rank_ordering[0]] = self.rank_ordering[1]
+            default_ordering = self.rank_ordering[0]
+
+        self.ordering_name = request.query_params.get(self.ordering_param)
+        if self.ordering_name not in orderings:
+            self.ordering_name = default_ordering
+        fields = orderings[self.ordering_name]
+
+        cursor = self.decode_cursor(request, fields)
+        reverse = cursor is not None and cursor['r']
+        order = [reverse_field(field) for field in fields] if reverse else list(fields)
+
+        queryset = queryset.order_by(*order)
+        if cursor is not None:
+            queryset = queryset.filter(keyset_filter(order, cursor['k']))
+
+        # лишняя строка показывает, есть ли следующая страница
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        self.has_next = has_more if not reverse else True
+        self.has_previous = has_more if reverse else cursor is not None
+        self.keys = [[getattr(row, field.lstrip('-')) for field in fields] for row in (rows[0], rows[-1])] \
+            if rows else None
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def decode_cursor(self, request, fields):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            valid = cursor['o'] == self.ordering_name and len(cursor['k']) == len(fields) and \
+                isinstance(cursor['r'], bool)
+        except (binascii.Error, ValueError, KeyError, TypeError):
+            valid = False
+        if not valid:
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def encode_cursor(self, keys, reverse):
+        cursor = json.dumps({'o': self.ordering_name, 'k': keys, 'r': reverse}, separators=(',', ':'))
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param,
+                                   base64.urlsafe_b64encode(cursor.encode('utf-8')).decode('ascii'))
+
+    def get_next_link(self):
+        if not self.has_next or self.keys is None:
+            return None
+        return self.encode_cursor(self.keys[1], False)
+
+    def get_previous_link(self):
+        if not self.has_previous or self.keys is None:
+            return None
+        return self.encode_cursor(self.keys[0], True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {'name': self.cursor_query_param, 'required': False, 'in': 'query',
+             'description': 'Непрозрачный курсор из ссылок next/previous', 'schema': {'type': 'string'}},
+            {'name': self.page_size_query_param, 'required': False, 'in': 'query',
+             'description': f'Размер страницы, не больше {self.max_page_size}', 'schema': {'type': 'integer'}},
+            {'name': self.ordering_param, 'required': False, 'in': 'query', 'description': 'Сортировка',
+             'schema': {'type': 'string', 'enum': [*self.orderings, self.rank_ordering[0]]}},
+        ]
+
+
+def reverse_field(field):
+    return field[1:] if field.startswith('-') else f'-{field}'
+
+
+def keyset_filter(order, keys):
+    # строки строго после ключа: (a, b) > (x, y) <=> a > x OR (a = x AND b > y); для убывающих полей - меньше.
+    # Избыточное a >= x даёт условие по первой колонке индекса, иначе дальние страницы читают индекс с начала
+    query = Q()
+    for index, field in enumerate(order):
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        equal = {previous.lstrip('-'): key for previous, key in zip(order[:index], keys)}
+        query |= Q(**equal, **{f'{field.lstrip("-")}__{lookup}': keys[index]})
+    if len(order) > 1:
+        query &= Q(**{f'{order[0].lstrip("-")}__{"lte" if order[0].startswith("-") else "gte"}': keys[0]})
+    return query
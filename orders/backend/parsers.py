@@ -0,0 +1,298 @@
+import csv
+import io
+import json
+import os
+import types
+
+import yaml
+from yaml.events import (AliasEvent, MappingEndEvent, MappingStartEvent, ScalarEvent, SequenceEndEvent,
+                         SequenceStartEvent)
+from yaml.nodes import MappingNode, ScalarNode, SequenceNode
+
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+HEADER_KEYS = ('shop', 'categories')
+
+CSV_COLUMNS = ('shop', 'category', 'category_name', 'id', 'name', 'model', 'price', 'price_rrc', 'quantity')
+
+DEFAULT_FORMAT = 'yaml'
+
+# название формата -> (функция разбора, типы содержимого, расширения файлов)
+FORMATS = {}
+
+
+class PriceListFormatError(ValueError):
+    pass
+
+
+# ошибки разбора, которые возникают на испорченном файле; ошибки JSON и часть ошибок msgpack - ValueError
+PARSE_ERRORS = (yaml.YAMLError, csv.Error, UnicodeDecodeError, ValueError) + \
+    ((msgpack.UnpackException,) if msgpack is not None else ())
+
+
+def format_error(error):
+    if isinstance(error, PriceListFormatError):
+        return error
+    return PriceListFormatError(f'Price list is not readable: {error}')
+
+
+class YamlEventReader:
+    # сборка узлов YAML из потока событий: работает и с C-загрузчиком, у которого нет compose_node
+    def __init__(self, source):
+        self.loader = YamlLoader(source)
+        self.anchors = {}
+
+    def close(self):
+        self.loader.dispose()
+
+    def expect(self, event_class):
+        event = self.loader.get_event()
+        if not isinstance(event, event_class):
+            raise PriceListFormatError(f'Unexpected YAML structure near line {event.start_mark.line + 1}.')
+        return event
+
+    def check(self, event_class):
+        return self.loader.check_event(event_class)
+
+    def compose(self):
+        event = self.loader.get_event()
+
+        if isinstance(event, AliasEvent):
+            if event.anchor not in self.anchors:
+                raise PriceListFormatError(f'Unknown YAML anchor "{event.anchor}".')
+            return self.anchors[event.anchor]
+
+        if isinstance(event, ScalarEvent):
+            tag = event.tag
+            if tag is None or tag == '!':
+                tag = self.loader.resolve(ScalarNode, event.value, event.implicit)
+            node = ScalarNode(tag, event.value, event.start_mark, event.end_mark, style=event.style)
+
+        elif isinstance(event, SequenceStartEvent):
+            tag = event.tag
+            if tag is None or tag == '!':
+                tag = self.loader.resolve(SequenceNode, None, event.implicit)
+            node = SequenceNode(tag, [], event.start_mark, None, flow_style=event.flow_style)
+            while not self.check(SequenceEndEvent):
+                node.value.append(self.compose())
+            node.end_mark = self.loader.get_event().end_mark
+
+        elif isinstance(event, MappingStartEvent):
+            tag = event.tag
+            if tag is None or tag == '!':
+                tag = self.loader.resolve(MappingNode, None, event.implicit)
+            node = MappingNode(tag, [], event.start_mark, None, flow_style=event.flow_style)
+            while not self.check(MappingEndEvent):
+                key = self.compose()
+                node.value.append((key, self.compose()))
+            node.end_mark = self.loader.get_event().end_mark
+
+        else:
+            raise PriceListFormatError(f'Unexpected YAML structure near line {event.start_mark.line + 1}.')
+
+        if event.anchor is not None:
+            self.anchors[event.anchor] = node
+        return node
+
+    def construct(self):
+        return self.loader.construct_document(self.compose())
+
+    def iter_sequence(self):
+        # элементы последовательности по одному, без построения всего списка
+        self.expect(SequenceStartEvent)
+        while not self.check(SequenceEndEvent):
+            yield self.construct()
+        self.loader.get_event()
+
+
+def register_format(name, content_types=(), extensions=()):
+    def decorator(parser):
+        FORMATS[name] = (parser, tuple(content_types), tuple(extensions))
+        return parser
+    return decorator
+
+
+def find_format(filename=None, content_type=None):
+    # формат по расширению файла, затем по типу содержимого; по умолчанию - YAML
+    extension = os.path.splitext(filename or '')[1].lower()
+    content_type = (content_type or '').split(';')[0].strip().lower()
+
+    for name, (_, content_types, extensions) in FORMATS.items():
+        if extension and extension in extensions:
+            return name
+    for name, (_, content_types, extensions) in FORMATS.items():
+        if content_type and content_type in content_types:
+            return name
+    return DEFAULT_FORMAT
+
+
+def parse_price_list(source, format_name=DEFAULT_FORMAT):
+    # все форматы возвращают словарь shop/categories и генератор goods в виде строк как в YAML
+    if format_name not in FORMATS:
+        raise PriceListFormatError(f'Unsupported price list format "{format_name}". '
+                                   f'Available: {", ".join(FORMATS)}.')
+    # ошибки разбора шапки и строк товаров приводятся к PriceListFormatError
+    try:
+        data = FORMATS[format_name][0](source)
+    except PARSE_ERRORS as error:
+        raise format_error(error)
+    if isinstance(data, dict) and isinstance(data.get('goods'), types.GeneratorType):
+        data['goods'] = _iter_format_errors(data['goods'])
+    return data
+
+
+def _iter_format_errors(goods):
+    try:
+        yield from goods
+    except PARSE_ERRORS as error:
+        raise format_error(error)
+
+
+class TextStream(io.TextIOWrapper):
+    # обёртка не закрывает исходный файл при сборке мусора: прайс читается повторно после проверки
+    def close(self):
+        try:
+            self.detach()
+        except ValueError:
+            pass
+
+
+def text_stream(source):
+    if isinstance(source, str):
+        return io.StringIO(source)
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    return TextStream(source, encoding='utf-8-sig', newline='')
+
+
+def binary_stream(source):
+    if isinstance(source, str):
+        return io.BytesIO(source.encode('utf-8'))
+    if isinstance(source, bytes):
+        return io.BytesIO(source)
+    return source
+
+
+@register_format('yaml', content_types=('application/x-yaml', 'application/yaml', 'text/yaml', 'text/x-yaml'),
+                 extensions=('.yaml', '.yml'))
+def parse_yaml(source):
+    # потоковый разбор прайса: шапка (shop, categories) читается целиком, goods отдаются генератором
+    reader = YamlEventReader(source)
+    reader.expect(yaml.StreamStartEvent)
+    reader.expect(yaml.DocumentStartEvent)
+    reader.expect(MappingStartEvent)
+
+    data = {}
+    while not reader.check(MappingEndEvent):
+        key = reader.construct()
+        if key != 'goods':
+            data[key] = reader.construct()
+            continue
+
+        if not reader.check(SequenceStartEvent):
+            data['goods'] = reader.construct() or []
+        elif all(header_key in data for header_key in HEADER_KEYS):
+            data['goods'] = _iter_goods(reader)
+            return data
+        else:
+            # товары идут раньше шапки - потоковая обработка невозможна, читаем целиком
+            data['goods'] = list(reader.iter_sequence())
+
+    reader.close()
+    return data
+
+
+def _iter_goods(reader):
+    try:
+        yield from reader.iter_sequence()
+    finally:
+        reader.close()
+
+
+@register_format('csv', content_types=('text/csv', 'application/csv'), extensions=('.csv',))
+def parse_csv(source):
+    # строка - предложение, лишние колонки - параметры; шапка собирается первым проходом по файлу
+    stream = text_stream(source)
+    reader = csv.DictReader(stream)
+    missing = [column for column in CSV_COLUMNS if column not in (reader.fieldnames or ())]
+    if missing:
+        raise PriceListFormatError(f'CSV columns are missing: {", ".join(missing)}.')
+
+    data = {'shop': None, 'categories': []}
+    categories = {}
+    for row in reader:
+        data['shop'] = data['shop'] or row['shop']
+        categories.setdefault(row['category'], row['category_name'])
+    data['categories'] = [{'id': category_id, 'name': name} for category_id, name in categories.items()]
+
+    stream.seek(0)
+    data['goods'] = _iter_csv_goods(stream)
+    return data
+
+
+def _iter_csv_goods(stream):
+    reader = csv.DictReader(stream)
+    parameters = [column for column in reader.fieldnames if column not in CSV_COLUMNS]
+    for row in reader:
+        item = {column: row[column] for column in CSV_COLUMNS[3:]}
+        item['category'] = row['category']
+        item['parameters'] = {name: row[name] for name in parameters if row[name] not in ('', None)}
+        yield item
+
+
+@register_format('ndjson', content_types=('application/x-ndjson', 'application/jsonl', 'application/x-jsonlines'),
+                 extensions=('.ndjson', '.jsonl'))
+def parse_ndjson(source):
+    # первая строка - шапка {"shop", "categories"}, далее по одному товару в строке
+    stream = text_stream(source)
+    line = stream.readline()
+    try:
+        data = json.loads(line)
+    except ValueError as error:
+        raise PriceListFormatError(f'Line 1: {error}')
+    if not isinstance(data, dict):
+        raise PriceListFormatError('Line 1: header object is expected.')
+
+    data['goods'] = _iter_ndjson_goods(stream)
+    return data
+
+
+def _iter_ndjson_goods(stream):
+    for number, line in enumerate(stream, start=2):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as error:
+            raise PriceListFormatError(f'Line {number}: {error}')
+
+
+if msgpack is not None:
+    @register_format('msgpack', content_types=('application/msgpack', 'application/x-msgpack'),
+                     extensions=('.msgpack', '.mpk'))
+    def parse_msgpack(source):
+        # последовательность объектов: шапка, затем товары
+        unpacker = msgpack.Unpacker(binary_stream(source), raw=False, strict_map_key=False)
+        try:
+            data = next(unpacker)
+        except (StopIteration, ValueError, msgpack.UnpackException) as error:
+            raise PriceListFormatError(f'MessagePack header is not readable: {error}')
+        if not isinstance(data, dict):
+            raise PriceListFormatError('MessagePack header object is expected.')
+
+        data['goods'] = _iter_msgpack_goods(unpacker)
+        return data
+
+    def _iter_msgpack_goods(unpacker):
+        try:
+            yield from unpacker
+        except (ValueError, msgpack.UnpackException) as error:
+            raise PriceListFormatError(f'MessagePack data is not readable: {error}')
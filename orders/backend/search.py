@@ -0,0 +1,63 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections
+from django.db.models import CharField, F, FloatField, Func, Lookup, Q, Value
+from django.db.models.functions import Cast, Greatest, Replace
+from rest_framework.filters import SearchFilter
+
+SEARCH_CONFIG = 'russian'
+
+# выражение совпадает с индексом catalogue_search (миграция 0012), иначе PostgreSQL его не использует;
+# '/' в модели заменяется пробелом, чтобы apple/iphone/xs-max разбиралось на слова, а не одним путём
+SEARCH_VECTOR = SearchVector('product_name', Replace(F('model'), Value('/'), Value(' ')), config=SEARCH_CONFIG)
+
+_trigram_available = {}
+
+
+class WordSimilarity(Func):
+    # word_similarity из pg_trgm: насколько запрос похож на самый близкий фрагмент строки
+    function = 'word_similarity'
+    output_field = FloatField()
+
+
+@CharField.register_lookup
+class TrigramWordSimilar(Lookup):
+    # поле %> запрос: нечёткое совпадение с частью строки, использует GIN-индекс gin_trgm_ops
+    lookup_name = 'trigram_word_similar'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} %%> {rhs}', lhs_params + rhs_params
+
+
+def trigram_available(alias):
+    # расширение pg_trgm ставит миграция 0012, если оно есть в сборке PostgreSQL
+    if alias not in _trigram_available:
+        with connections[alias].cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _trigram_available[alias] = cursor.fetchone() is not None
+    return _trigram_available[alias]
+
+
+def search_products(queryset, terms):
+    # полнотекстовый поиск по названию и модели плюс нечёткое совпадение триграмм; аннотация search_rank -
+    # релевантность, по ней сортирует пагинация
+    query = SearchQuery(terms, config=SEARCH_CONFIG)
+    condition = Q(search_vector=query)
+    rank = SearchRank(SEARCH_VECTOR, query)
+
+    if trigram_available(queryset.db):
+        condition |= Q(product_name__trigram_word_similar=terms) | Q(model__trigram_word_similar=terms)
+        rank = rank + Greatest(WordSimilarity(Value(terms), 'product_name'), WordSimilarity(Value(terms), 'model'))
+
+    return queryset.annotate(search_vector=SEARCH_VECTOR,
+                             search_rank=Cast(rank, FloatField())).filter(condition)
+
+
+class ProductSearchFilter(SearchFilter):
+    # на PostgreSQL - индексный поиск с ранжированием, на остальных БД - обычный SearchFilter по search_fields
+    def filter_queryset(self, request, queryset, view):
+        terms = ' '.join(self.get_search_terms(request))
+        if not terms or connections[queryset.db].vendor != 'postgresql':
+            return super().filter_queryset(request, queryset, view)
+        return search_products(queryset, terms)
@@ -1,10 +1,15 @@
+import json
 import re
+from operator import attrgetter
 
 from django.conf import settings
+from django.utils import timezone
 
 from rest_framework import serializers
 
-from backend.models import Category, Shop, Product, ProductInfo, User, Contact, ProductParameter, OrderItem, Order
+from backend.models import Category, Shop, Product, ProductInfo, User, Contact, ProductParameter, OrderItem, Order, \
+    ImportJob, CatalogueItem
+from backend.renderers import loads
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -77,6 +82,89 @@ class ProductInfoSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
+def parse_fields(value, available):
+    # ?fields=id,price -> запрошенные поля в порядке сериализатора; без параметра - None, то есть все поля
+    if not value:
+        return None
+    names = {name.strip() for name in value.split(',') if name.strip()}
+    unknown = names - set(available)
+    if unknown:
+        raise ValueError(f'Unknown fields: {", ".join(sorted(unknown))}. Available: {", ".join(available)}.')
+    return tuple(name for name in available if name in names)
+
+
+class SparseFieldsMixin:
+    # сериализатор с подмножеством полей: Serializer(..., fields=('id', 'price')); None - все поля
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sparse_fields = fields
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class CatalogueItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    # строка плоского каталога в том же виде, что и ProductInfoSerializer
+    id = serializers.IntegerField(source='product_info_id')
+    product = serializers.SerializerMethodField()
+    shop = serializers.IntegerField(source='shop_id')
+    product_parameters = serializers.SerializerMethodField()
+
+    # колонки каталога, из которых строится каждое поле; по ним сужается запрос при ?fields=
+    field_columns = {'id': ('pk',), 'model': ('model',), 'product': ('product_id', 'product_name'),
+                     'shop': ('shop_id',), 'quantity': ('quantity',), 'price': ('price',), 'price_rrc': ('price_rrc',),
+                     'product_parameters': ('parameters',)}
+
+    class Meta:
+        model = CatalogueItem
+        fields = ('id', 'model', 'product', 'shop', 'quantity', 'price', 'price_rrc', 'product_parameters',)
+        read_only_fields = fields
+
+    @classmethod
+    def columns_for(cls, fields=None):
+        return tuple(dict.fromkeys(column for name in fields or cls.Meta.fields for column in cls.field_columns[name]))
+
+    def get_product(self, obj):
+        return {'id': obj.product_id, 'name': obj.product_name}
+
+    def get_product_parameters(self, obj):
+        return json.loads(obj.parameters)
+
+
+class CatalogueRowListSerializer(serializers.ListSerializer):
+    # быстрый вывод списка каталога из кортежей values_list(*CatalogueRowSerializer.columns): строки собираются
+    # распаковкой по заранее заданному плану колонок, без полей DRF; дополнительные колонки (ранг поиска) в конце
+    builders = {
+        'id': attrgetter('pk'),
+        'model': attrgetter('model'),
+        'product': lambda row: {'id': row.product_id, 'name': row.product_name},
+        'shop': attrgetter('shop_id'),
+        'quantity': attrgetter('quantity'),
+        'price': attrgetter('price'),
+        'price_rrc': attrgetter('price_rrc'),
+        'product_parameters': lambda row: loads(row.parameters),
+    }
+
+    def to_representation(self, data):
+        fields = self.child.sparse_fields
+        if fields is not None:
+            # подмножество полей: строки values_list(*columns_for(fields), named=True), поля по именам колонок
+            builders = [(name, self.builders[name]) for name in fields]
+            return [{name: build(row) for name, build in builders} for row in data]
+
+        return [{'id': pk, 'model': model, 'product': {'id': product_id, 'name': product_name}, 'shop': shop_id,
+                 'quantity': quantity, 'price': price, 'price_rrc': price_rrc, 'product_parameters': loads(parameters)}
+                for pk, model, product_id, product_name, shop_id, quantity, price, price_rrc, parameters, *_ in data]
+
+
+class CatalogueRowSerializer(CatalogueItemSerializer):
+    # тот же вывод, что и CatalogueItemSerializer, для списков из values_list
+    columns = CatalogueItemSerializer.columns_for()
+
+    class Meta(CatalogueItemSerializer.Meta):
+        list_serializer_class = CatalogueRowListSerializer
+
+
 class OrderItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = OrderItem
@@ -87,7 +175,13 @@ class OrderItemSerializer(serializers.ModelSerializer):
         }
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class BasketItemSerializer(serializers.Serializer):
+    # позиция для добавления в корзину: здесь только типы, товары и повторы проверяются для всего списка сразу
+    product_info = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     ordered_items = OrderItemSerializer(read_only=True, many=True)
 
     class Meta:
@@ -95,3 +189,22 @@ class OrderSerializer(serializers.ModelSerializer):
         fields = ('id', 'ordered_items', 'state', 'dt', )
         read_only_fields = ('id',)
 
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    errors = serializers.SerializerMethodField()
+    rows_per_second = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ImportJob
+        fields = ('id', 'state', 'mode', 'shop', 'rows_processed', 'rows_per_second', 'inserted', 'updated',
+                  'unchanged', 'removed', 'errors', 'created_at', 'started_at', 'finished_at',)
+        read_only_fields = fields
+
+    def get_errors(self, obj):
+        return obj.errors.splitlines()
+
+    def get_rows_per_second(self, obj):
+        if obj.started_at is None:
+            return None
+        elapsed = ((obj.finished_at or timezone.now()) - obj.started_at).total_seconds()
+        return round(obj.rows_processed / elapsed, 1) if elapsed > 0 else None
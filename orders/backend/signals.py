@@ -0,0 +1,78 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from backend.cache import bump_catalogue_version
+from backend.catalogue import refresh_offer_parameters, sync_offer_catalogue, sync_shop_catalogue
+from backend.importer import importing
+from backend.models import CatalogueItem, Category, Product, ProductInfo, ProductParameter, Shop
+from backend.serializer import ShopSerializer
+from backend.snapshots import schedule_snapshot
+
+
+def catalogue_changed(snapshot=True):
+    # каскадное удаление шлёт сигнал на каждую строку: отложенные действия регистрируются один раз на транзакцию
+    pending = {func for _, func in transaction.get_connection().run_on_commit}
+    if bump_catalogue_version not in pending:
+        transaction.on_commit(bump_catalogue_version)
+    if snapshot and schedule_snapshot not in pending:
+        transaction.on_commit(schedule_snapshot)
+
+
+@receiver(post_save, sender=Shop)
+def shop_saved(sender, instance, created, update_fields=None, **kwargs):
+    # изменение любого поля, которое отдаёт shop/; служебные сохранения (хеш прайса, состояние фида) кеш не сбрасывают
+    if update_fields is not None and not set(ShopSerializer.Meta.fields) & set(update_fields):
+        return
+    # строки каталога зависят только от статуса и названия магазина
+    synced = not created and (update_fields is None or {'state', 'name'} & set(update_fields))
+    if synced:
+        sync_shop_catalogue(instance)
+    catalogue_changed(snapshot=synced)
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created, **kwargs):
+    if not created:
+        CatalogueItem.objects.filter(product_id=instance.id).update(
+            product_name=instance.name, category_id=instance.category_id, category_name=instance.category.name)
+        catalogue_changed()
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, created, **kwargs):
+    if not created:
+        CatalogueItem.objects.filter(category_id=instance.id).update(category_name=instance.name)
+    catalogue_changed(snapshot=not created)
+
+
+@receiver(post_delete, sender=Shop)
+@receiver(post_delete, sender=Category)
+def catalogue_object_deleted(sender, instance, **kwargs):
+    # предложения удаляются каскадом вместе с магазином или категорией
+    catalogue_changed()
+
+
+@receiver(post_save, sender=ProductInfo)
+def product_info_saved(sender, instance, **kwargs):
+    # импорт пишет предложения пачками без сигналов и сам ведёт каталог; сюда попадают правки из админки
+    if importing.get():
+        return
+    sync_offer_catalogue(instance.id)
+    catalogue_changed()
+
+
+@receiver(post_delete, sender=ProductInfo)
+def product_info_deleted(sender, instance, **kwargs):
+    # строка каталога удаляется каскадом
+    if not importing.get():
+        catalogue_changed()
+
+
+@receiver(post_save, sender=ProductParameter)
+@receiver(post_delete, sender=ProductParameter)
+def product_parameter_changed(sender, instance, **kwargs):
+    if importing.get():
+        return
+    refresh_offer_parameters(instance.product_info_id)
+    catalogue_changed()
@@ -0,0 +1,233 @@
+import gzip
+import os
+import shutil
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from backend.cache import catalogue_version, shared_cache
+from backend.models import CatalogueItem
+from backend.renderers import FastJSONRenderer
+from backend.serializer import CatalogueRowSerializer
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+SNAPSHOT_NAME = 'catalogue.json'
+
+CURRENT_LINK = 'current'
+
+# версия каталога, по которой собран снимок
+VERSION_NAME = 'catalogue.version'
+
+# сборка идёт в одном процессе за раз: остальные ждут и проверяют, не собран ли уже снимок нужной версии
+BUILD_LOCK_KEY = 'catalogue:snapshot:building'
+
+BUILD_LOCK_POLL = 1
+
+# Content-Encoding -> расширение файла; порядок - предпочтение при выборе по Accept-Encoding
+ENCODINGS = (('br', '.br'), ('gzip', '.gz')) if brotli is not None else (('gzip', '.gz'),)
+
+CHUNK_SIZE = 2000
+
+
+def snapshot_root():
+    return os.path.join(settings.MEDIA_ROOT, settings.SNAPSHOT_DIR)
+
+
+class SnapshotWriter:
+    # один проход по каталогу пишет несжатый файл и все сжатые варианты сразу
+    def __init__(self, directory):
+        path = os.path.join(directory, SNAPSHOT_NAME)
+        self.files = [open(path, 'wb'), gzip.open(f'{path}.gz', 'wb', compresslevel=settings.SNAPSHOT_GZIP_LEVEL)]
+        self.compressor = None
+        if brotli is not None:
+            self.files.append(open(f'{path}.br', 'wb'))
+            self.compressor = brotli.Compressor(quality=settings.SNAPSHOT_BROTLI_QUALITY)
+
+    def write(self, data):
+        for file in self.files[:2]:
+            file.write(data)
+        if self.compressor is not None:
+            self.files[2].write(self.compressor.process(data))
+
+    def close(self):
+        if self.compressor is not None:
+            self.files[2].write(self.compressor.finish())
+        for file in self.files:
+            file.close()
+
+
+def build_snapshot():
+    # весь активный каталог в формате результатов product/ - в новый каталог, затем атомарная подмена ссылки
+    # current: читатели видят либо прежний снимок целиком, либо новый
+    root = snapshot_root()
+    os.makedirs(root, exist_ok=True)
+    version = str(time.time_ns())
+    building = os.path.join(root, f'{version}.tmp')
+    os.makedirs(building)
+    # версия читается до выборки: изменения после неё снимок может не содержать и пересоберётся
+    with open(os.path.join(building, VERSION_NAME), 'w') as file:
+        file.write(str(catalogue_version()))
+
+    renderer = FastJSONRenderer()
+    writer = SnapshotWriter(building)
+    rows = 0
+    try:
+        writer.write(b'[')
+        offers = CatalogueItem.objects.order_by('pk').values_list(*CatalogueRowSerializer.columns).iterator(
+            chunk_size=CHUNK_SIZE)
+        batch = []
+        for offer in offers:
+            batch.append(offer)
+            if len(batch) == CHUNK_SIZE:
+                writer.write((b',' if rows else b'') + render_rows(renderer, batch))
+                rows += len(batch)
+                batch = []
+        if batch:
+            writer.write((b',' if rows else b'') + render_rows(renderer, batch))
+            rows += len(batch)
+        writer.write(b']')
+    finally:
+        writer.close()
+
+    os.rename(building, os.path.join(root, version))
+    link = os.path.join(root, f'{CURRENT_LINK}.{version}')
+    os.symlink(version, link)
+    os.replace(link, os.path.join(root, CURRENT_LINK))
+    remove_stale(root, version)
+    return version, rows
+
+
+def render_rows(renderer, rows):
+    # элементы JSON-массива без скобок, чтобы склеивать порции в один массив
+    return renderer.render(CatalogueRowSerializer(rows, many=True).data)[1:-1]
+
+
+def remove_stale(root, version):
+    # предыдущий снимок остаётся для уже начатых отдач, более старые удаляются; недособранные каталоги
+    # прерванных сборок удаляются, когда сборка не могла бы идти так долго
+    versions = sorted((name for name in os.listdir(root) if name.isdigit()), key=int)
+    for name in versions[:-2]:
+        if name != version:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+    started_before = time.time_ns() - settings.SNAPSHOT_BUILD_TIMEOUT * 10 ** 9
+    for name in os.listdir(root):
+        if name.endswith('.tmp') and name[:-4].isdigit() and int(name[:-4]) < started_before:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def current_snapshot():
+    # (версия, каталог) текущего снимка или None, если его ещё нет
+    link = os.path.join(snapshot_root(), CURRENT_LINK)
+    try:
+        version = os.readlink(link)
+    except OSError:
+        return None
+    return version, os.path.join(snapshot_root(), version)
+
+
+def snapshot_is_current():
+    # текущий снимок собран по действующей версии каталога
+    snapshot = current_snapshot()
+    if snapshot is None:
+        return False
+    try:
+        with open(os.path.join(snapshot[1], VERSION_NAME)) as file:
+            return file.read() == str(catalogue_version())
+    except FileNotFoundError:
+        return False
+
+
+def build_if_stale():
+    # сборка, если снимка текущей версии ещё нет и никто другой его не собирает; False - сборка занята
+    if snapshot_is_current():
+        return True
+    if not shared_cache().add(BUILD_LOCK_KEY, os.getpid(), settings.SNAPSHOT_BUILD_TIMEOUT):
+        return False
+    try:
+        if not snapshot_is_current():
+            build_snapshot()
+    finally:
+        shared_cache().delete(BUILD_LOCK_KEY)
+    return True
+
+
+def choose_encoding(accept_encoding):
+    # (Content-Encoding, расширение файла) по заголовку Accept-Encoding; (None, '') - несжатый файл
+    accepted = set()
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().lower().partition(';')
+        quality = params.strip()[2:] if params.strip().startswith('q=') else '1'
+        try:
+            if float(quality) > 0:
+                accepted.add(name.strip())
+        except ValueError:
+            continue
+
+    for encoding, suffix in ENCODINGS:
+        if encoding in accepted or '*' in accepted:
+            return encoding, suffix
+    return None, ''
+
+
+def open_snapshot(suffix):
+    # (версия, открытый файл) текущего снимка; снимок мог смениться между чтением ссылки и открытием - повторяем
+    for _ in range(3):
+        snapshot = current_snapshot()
+        if snapshot is None:
+            return None
+        version, directory = snapshot
+        try:
+            return version, open(os.path.join(directory, SNAPSHOT_NAME + suffix), 'rb')
+        except FileNotFoundError:
+            continue
+    return None
+
+
+class SnapshotBuilder(threading.Thread):
+    # фоновая пересборка снимка: загрузки во время сборки объединяются в одну следующую сборку
+    lock = threading.Lock()
+    instance = None
+
+    def __init__(self):
+        super().__init__(name='catalogue-snapshot')
+        self.pending = threading.Event()
+
+    @classmethod
+    def schedule(cls):
+        with cls.lock:
+            if cls.instance is None:
+                cls.instance = cls()
+                cls.instance.start()
+            cls.instance.pending.set()
+            return cls.instance
+
+    def run(self):
+        try:
+            while True:
+                with self.lock:
+                    # поток снимает себя под той же блокировкой, поэтому запрос на сборку не теряется
+                    if not self.pending.is_set():
+                        SnapshotBuilder.instance = None
+                        return
+                    self.pending.clear()
+                while not build_if_stale():
+                    time.sleep(BUILD_LOCK_POLL)
+        finally:
+            # после ошибки сборки следующая загрузка запустит новый поток
+            with self.lock:
+                if SnapshotBuilder.instance is self:
+                    SnapshotBuilder.instance = None
+            connection.close()
+
+
+def schedule_snapshot():
+    # вызывается после фиксации изменений каталога; снимок этой версии мог уже собрать другой процесс
+    if settings.SNAPSHOT_ON_IMPORT and not snapshot_is_current():
+        SnapshotBuilder.schedule()
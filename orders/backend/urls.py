@@ -2,7 +2,8 @@ from rest_framework.routers import DefaultRouter
 from django.urls import path
 
 from backend.views import PartnerPriceLoad, CategoryView, ShopView, UserLogin, UserRegister, ProductInfoView, \
-    PartnerOrdersView, BasketView, ContactView, OrderView
+    PartnerOrdersView, BasketView, ContactView, OrderView, PartnerPriceLoadStatus, \
+    PartnerFeed, PartnerExport
 
 app_name = 'backend'
 
@@ -13,6 +14,9 @@ urlpatterns = [
     path('user/basket', BasketView.as_view(), name='user-basket'),
     path('user/orders', OrderView.as_view(), name='user-orders'),
     path('partner/load', PartnerPriceLoad.as_view(), name='partner-load'),
+    path('partner/load/<int:pk>', PartnerPriceLoadStatus.as_view(), name='partner-load-status'),
+    path('partner/feed', PartnerFeed.as_view(), name='partner-feed'),
+    path('partner/export', PartnerExport.as_view(), name='partner-export'),
     path('partner/orders', PartnerOrdersView.as_view(), name='partner-orders'),
 ]
 
@@ -1,22 +1,45 @@
+from collections import Counter
+
+from django.conf import settings
 from django.contrib.auth import authenticate
 
-from django.db.models import Q
+from django.db import IntegrityError, transaction
+from django.db.models import Case, PositiveIntegerField, Q, Value, When
 
 from django.contrib.auth.password_validation import validate_password
 
-from django.http import JsonResponse
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+
+from django.core.cache import cache
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
 
+from rest_framework.decorators import action
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.viewsets import ReadOnlyModelViewSet
 
 from rest_framework.authtoken.models import Token
 
-import yaml
-
-from backend.models import Category, Shop, ProductInfo, Product, Parameter, ProductParameter, Order, OrderItem, Contact
-from backend.serializer import CategorySerializer, ShopSerializer, UserSerializer, ProductInfoSerializer, \
-    OrderSerializer, OrderItemSerializer, ContactSerializer, ContactSerializerCreate
+from backend.cache import cache_key, CachedResponseMixin
+from backend.catalogue import catalogue_facets
+from backend.exporters import export_content_type, export_filename, export_price_list, EXPORTERS
+from backend.filters import IdsFilter, ProductParameterFilter, requested_ids
+from backend.importer import IMPORT_MODES, validate_price_list
+from backend.jobs import enqueue_import
+from backend.models import Category, Shop, Order, OrderItem, Contact, ImportJob, CatalogueItem, ProductInfo
+from backend.pagination import KeysetPagination
+from backend.renderers import FastJSONRenderer
+from backend.search import ProductSearchFilter
+from backend.parsers import find_format, parse_price_list, DEFAULT_FORMAT, FORMATS, PriceListFormatError
+from backend.serializer import CategorySerializer, ShopSerializer, UserSerializer, CatalogueItemSerializer, \
+    CatalogueRowSerializer, OrderSerializer, ContactSerializer, ContactSerializerCreate, ImportJobSerializer, \
+    BasketItemSerializer, parse_fields
+from backend.snapshots import choose_encoding, open_snapshot, SNAPSHOT_NAME
 
 
 class PartnerPriceLoad(APIView):
@@ -32,63 +55,166 @@ class PartnerPriceLoad(APIView):
             return JsonResponse({'Status': False, 'Error': 'Access denied! Available only for shops.'},
                                 status=403)
 
-        file = request.data.get('url')
+        file = request.FILES.get('file') or request.data.get('url')
+        mode = request.data.get('mode', 'upsert')
+
+        if mode not in IMPORT_MODES:
+            return JsonResponse({'Status': False,
+                                 'Errors': f'Unknown import mode. Available: {", ".join(IMPORT_MODES)}.'})
 
         if file:
-            data = yaml.load(file, Loader=yaml.FullLoader)
-            shop, _ = Shop.objects.get_or_create(name=data['shop'], user_id=request.user.id)
-
-            for category in data['categories']:
-                category_object, _ = Category.objects.get_or_create(id=category['id'], name=category['name'])
-                category_object.shops.add(shop.id)
-                category_object.save()
-
-            ProductInfo.objects.filter(shop_id=shop.id).delete()
-            for item in data['goods']:
-                product, _ = Product.objects.get_or_create(name=item['name'], category_id=item['category'])
-
-                product_info = ProductInfo.objects.create(product_id=product.id,
-                                                          external_id=item['id'],
-                                                          model=item['model'],
-                                                          price=item['price'],
-                                                          price_rrc=item['price_rrc'],
-                                                          quantity=item['quantity'],
-                                                          shop_id=shop.id)
-                for name, value in item['parameters'].items():
-                    parameter_object, _ = Parameter.objects.get_or_create(name=name)
-                    ProductParameter.objects.create(product_info_id=product_info.id,
-                                                    parameter_id=parameter_object.id,
-                                                    value=value)
+            format_name = request.data.get('format') or find_format(getattr(file, 'name', None),
+                                                                    getattr(file, 'content_type', None))
+            if format_name not in FORMATS:
+                return JsonResponse({'Status': False,
+                                     'Errors': f'Unsupported price list format. Available: {", ".join(FORMATS)}.'})
+
+            # пробная загрузка: проверка прайса и план изменений без записи в БД
+            if request.query_params.get('dry_run') in ('1', 'true'):
+                try:
+                    validator = validate_price_list(parse_price_list(file, format_name),
+                                                    shop=Shop.objects.filter(user_id=request.user.id).first(),
+                                                    mode=mode)
+                except PriceListFormatError as error:
+                    return JsonResponse({'Status': False, 'Errors': [str(error)]})
+
+                return JsonResponse({'Status': not validator.errors, 'DryRun': True, 'Rows': validator.goods_count,
+                                     'Inserted': validator.inserted, 'Updated': validator.updated,
+                                     'Unchanged': validator.unchanged, 'Removed': validator.removed,
+                                     'Errors': validator.errors})
+
+            job = enqueue_import(request.user, file, mode=mode, format_name=format_name)
+
+            if job is None:
+                return JsonResponse({'Status': True, 'Modified': False})
+
+            return JsonResponse({'Status': True, 'Job': job.id}, status=202)
+
+        return JsonResponse({'Status': False, 'Errors': 'Input Error! All required fields are not filled.'})
+
+
+class PartnerPriceLoadStatus(APIView):
+    # состояние загрузки прайса
+    def get(self, request, pk, *args, **kwargs):
+
+        if not request.user.is_authenticated:
+            return JsonResponse({'Status': False,
+                                 'Error': 'Access denied! Available only for registered users.'},
+                                status=403)
+
+        if request.user.type != 'shop':
+            return JsonResponse({'Status': False, 'Error': 'Access denied! Available only for shops.'},
+                                status=403)
+
+        job = ImportJob.objects.filter(id=pk, user_id=request.user.id).first()
+
+        if job is None:
+            return JsonResponse({'Status': False, 'Errors': 'Import job not found.'}, status=404)
+
+        serializer = ImportJobSerializer(job)
+        return Response(serializer.data)
+
+
+class PartnerFeed(APIView):
+    # ссылка на прайс поставщика для регулярного опроса
+    def post(self, request, *args, **kwargs):
+
+        if not request.user.is_authenticated:
+            return JsonResponse({'Status': False,
+                                 'Error': 'Access denied! Available only for registered users.'},
+                                status=403)
+
+        if request.user.type != 'shop':
+            return JsonResponse({'Status': False, 'Error': 'Access denied! Available only for shops.'},
+                                status=403)
+
+        url = request.data.get('url')
+
+        if url:
+            try:
+                URLValidator()(url)
+            except ValidationError as error:
+                return JsonResponse({'Status': False, 'Errors': error.messages})
+
+            shop = Shop.objects.filter(user_id=request.user.id).first()
+
+            if shop is None:
+                return JsonResponse({'Status': False, 'Errors': 'Shop not found. Load a price list first.'})
+
+            shop.url = url
+            shop.feed_etag = ''
+            shop.feed_last_modified = ''
+            shop.save(update_fields=['url', 'feed_etag', 'feed_last_modified'])
 
             return JsonResponse({'Status': True})
 
         return JsonResponse({'Status': False, 'Errors': 'Input Error! All required fields are not filled.'})
 
 
-class CategoryView(ReadOnlyModelViewSet):
+class PartnerExport(APIView):
+    # выгрузка прайса магазина потоком в формате загрузки: ?format=yaml|csv|ndjson
+    def perform_content_negotiation(self, request, force=False):
+        # параметр format выбирает формат выгрузки, а не рендерер DRF
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request, *args, **kwargs):
+
+        if not request.user.is_authenticated:
+            return JsonResponse({'Status': False,
+                                 'Error': 'Access denied! Available only for registered users.'},
+                                status=403)
+
+        if request.user.type != 'shop':
+            return JsonResponse({'Status': False, 'Error': 'Access denied! Available only for shops.'},
+                                status=403)
+
+        format_name = request.query_params.get('format', DEFAULT_FORMAT)
+        if format_name not in EXPORTERS:
+            return JsonResponse({'Status': False,
+                                 'Errors': f'Unsupported export format. Available: {", ".join(EXPORTERS)}.'})
+
+        shop = Shop.objects.filter(user_id=request.user.id).first()
+
+        if shop is None:
+            return JsonResponse({'Status': False, 'Errors': 'Shop not found. Load a price list first.'})
+
+        response = StreamingHttpResponse(export_price_list(shop, format_name),
+                                         content_type=export_content_type(format_name))
+        response['Content-Disposition'] = f'attachment; filename="{export_filename(shop, format_name)}"'
+        return response
+
+
+class CategoryView(CachedResponseMixin, ReadOnlyModelViewSet):
     # просмотр категорий
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    filter_backends = ReadOnlyModelViewSet.filter_backends + [IdsFilter]
 
     search_fields = ["name"]
 
 
-class ShopView(ReadOnlyModelViewSet):
+class ShopView(CachedResponseMixin, ReadOnlyModelViewSet):
     # просмотр магазинов
     queryset = Shop.objects.filter(state=True)
     serializer_class = ShopSerializer
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    filter_backends = ReadOnlyModelViewSet.filter_backends + [IdsFilter]
 
     search_fields = ['name']
 
 
-class ProductInfoView(ReadOnlyModelViewSet):
-    # просмотр продуктов
-    serializer_class = ProductInfoSerializer
+class ProductInfoView(CachedResponseMixin, ReadOnlyModelViewSet):
+    # просмотр продуктов из плоской таблицы каталога: один запрос по индексу без соединений и prefetch
+    serializer_class = CatalogueItemSerializer
+    pagination_class = KeysetPagination
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    filter_backends = [ProductSearchFilter, ProductParameterFilter, IdsFilter]
 
-    search_fields = ['product__name', 'model']
+    search_fields = ['product_name', 'model']
 
     def get_queryset(self):
-        query = Q(shop__state=True)
+        query = Q()
 
         shop_id = self.request.GET.get('shop_id', None)
         category_id = self.request.GET.get('category_id', None)
@@ -97,13 +223,99 @@ class ProductInfoView(ReadOnlyModelViewSet):
             query = query & Q(shop_id=shop_id)
 
         if category_id:
-            query = query & Q(product__category_id=category_id)
-
-        queryset = ProductInfo.objects.filter(query).select_related(
-            'shop', 'product__category').prefetch_related(
-            'product_parameters__parameter').distinct()
-
-        return queryset
+            query = query & Q(category_id=category_id)
+
+        # только в наличии: условие совпадает с частичными индексами каталога
+        if self.request.GET.get('in_stock') in ('1', 'true'):
+            query = query & Q(quantity__gt=0)
+
+        for param, lookup in (('price_min', 'price__gte'), ('price_max', 'price__lte')):
+            value = self.request.GET.get(param)
+            if value:
+                try:
+                    query = query & Q(**{lookup: int(value)})
+                except ValueError:
+                    raise ParseError(f'{param} must be an integer.')
+
+        # в каталоге только предложения активных магазинов
+        return CatalogueItem.objects.filter(query)
+
+    def get_requested_fields(self):
+        # ?fields=id,price,quantity: в ответе и в запросе к каталогу только эти поля
+        if self.request is None:
+            return None
+        try:
+            return parse_fields(self.request.query_params.get('fields'), CatalogueItemSerializer.Meta.fields)
+        except ValueError as error:
+            raise ParseError(str(error))
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        fields = self.get_requested_fields()
+        if self.action == 'retrieve' and fields is not None:
+            return queryset.only(*CatalogueItemSerializer.columns_for(fields))
+        if self.action != 'list':
+            return queryset
+
+        # список читается кортежами по плану колонок CatalogueRowSerializer, без экземпляров моделей;
+        # ключи сортировок и ранг поиска нужны пагинации для курсора
+        columns = CatalogueItemSerializer.columns_for(fields)
+        columns += tuple(field for field in KeysetPagination.key_fields() if field not in columns)
+        if KeysetPagination.rank_annotation in queryset.query.annotations:
+            columns += (KeysetPagination.rank_annotation,)
+        return queryset.values_list(*columns, named=True)
+
+    def paginate_queryset(self, queryset):
+        # ?ids=: все запрошенные предложения одним ответом в порядке ids, без курсора
+        if requested_ids(self.request) is not None:
+            return None
+        return super().paginate_queryset(queryset)
+
+    def get_serializer_class(self):
+        return CatalogueRowSerializer if self.action == 'list' else CatalogueItemSerializer
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    @action(detail=False, pagination_class=None)
+    def facets(self, request):
+        # счётчики для навигации по текущему набору фильтров; кешируются до следующего изменения каталога
+        params = request.query_params.copy()
+        # параметры постраничного вывода на счётчики не влияют
+        for name in (KeysetPagination.cursor_query_param, KeysetPagination.page_size_query_param,
+                     KeysetPagination.ordering_param):
+            params.pop(name, None)
+        key = cache_key('facets', params)
+        facets = cache.get(key)
+        if facets is None:
+            facets = catalogue_facets(self.filter_queryset(self.get_queryset()))
+            cache.set(key, facets, settings.FACETS_CACHE_TIMEOUT)
+        return Response(facets)
+
+    @action(detail=False, pagination_class=None)
+    def snapshot(self, request):
+        # весь активный каталог заранее собранным и сжатым файлом: файл отдаётся как есть, без запросов к БД
+        # и сериализации, через file_wrapper сервера (sendfile)
+        encoding, suffix = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        snapshot = open_snapshot(suffix)
+        if snapshot is None:
+            return JsonResponse({'Status': False, 'Error': 'Catalogue snapshot is not ready yet.'}, status=404)
+
+        version, file = snapshot
+        etag = quote_etag(f'{version}-{encoding or "identity"}')
+        last_modified = int(version) // 10 ** 9
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            file.close()
+        else:
+            response = FileResponse(file, content_type='application/json', filename=SNAPSHOT_NAME)
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
 
 
 class UserLogin(APIView):
@@ -168,6 +380,23 @@ class PartnerOrdersView(APIView):
         return Response(serializer.data)
 
 
+def format_ids(ids):
+    return ', '.join(map(str, sorted(ids)))
+
+
+def validate_basket_items(items):
+    # позиции из запроса к корзине без обращений к БД: (проверенные данные, None) или (None, ошибки)
+    serializer = BasketItemSerializer(data=items, many=True)
+    if not serializer.is_valid():
+        return None, serializer.errors
+
+    product_ids = [item['product_info'] for item in serializer.validated_data]
+    repeated = [pk for pk, count in Counter(product_ids).items() if count > 1]
+    if repeated:
+        return None, f'Positions {format_ids(repeated)} repeated.'
+    return serializer.validated_data, None
+
+
 class BasketView(APIView):
     # действия с корзиной покупателя
     def get(self, request):
@@ -191,25 +420,35 @@ class BasketView(APIView):
         items = request.data.get('ordered_items')
 
         if items:
-            basket, created = Order.objects.get_or_create(user_id=request.user.id, state='basket')
-
-            objects_created = 0
-            for item in items:
+            items, errors = validate_basket_items(items)
+            if errors:
+                return JsonResponse({'Status': False, 'Errors': errors})
 
-                exists_item = OrderItem.objects.filter(order=basket.id, product_info=item["product_info"])
-                if len(exists_item) > 0:
-                    return JsonResponse({'Status': False, 'Errors': f'Position {item["product_info"]} '
-                                                                    f' already added.'})
+            # весь список проверяется одним запросом на каждую проверку и добавляется одним INSERT
+            product_ids = [item['product_info'] for item in items]
 
-                item.update({'order': basket.id})
-                serializer = OrderItemSerializer(data=item)
-                if serializer.is_valid():
-                    serializer.save()
-                    objects_created += 1
-                else:
-                    return JsonResponse({'Status': False, 'Errors': serializer.errors})
+            found = ProductInfo.objects.filter(id__in=product_ids).values_list('id', flat=True)
+            missing = set(product_ids) - set(found)
+            if missing:
+                return JsonResponse({'Status': False, 'Errors': f'Positions {format_ids(missing)} do not exist.'})
 
-            return JsonResponse({'Status': True, 'Positions created:': objects_created})
+            try:
+                with transaction.atomic():
+                    basket, created = Order.objects.get_or_create(user_id=request.user.id, state='basket')
+                    added = OrderItem.objects.filter(order_id=basket.id, product_info_id__in=product_ids).values_list(
+                        'product_info_id', flat=True)
+                    if not created and added:
+                        return JsonResponse({'Status': False,
+                                             'Errors': f'Position {format_ids(added)} already added.'})
+
+                    OrderItem.objects.bulk_create(
+                        OrderItem(order_id=basket.id, product_info_id=item['product_info'], quantity=item['quantity'])
+                        for item in items)
+            except IntegrityError:
+                # позицию одновременно добавил параллельный запрос
+                return JsonResponse({'Status': False, 'Errors': 'Positions already added.'})
+
+            return JsonResponse({'Status': True, 'Positions created:': len(product_ids)})
 
         return JsonResponse({'Status': False, 'Errors': 'Input Error! All required fields are not filled.'})
 
@@ -244,14 +483,42 @@ class BasketView(APIView):
         items = request.data.get('ordered_items')
 
         if items:
-            basket, created = Order.objects.get_or_create(user_id=request.user.id, state='basket')
-
-            objects_updated = 0
-            for item in items:
-                objects_updated += OrderItem.objects.filter(order_id=basket.id, product_info=item['product_info']).\
-                    update(quantity=item['quantity'])
-
-                return JsonResponse({'Status': True, 'Objects updated': objects_updated})
+            items, errors = validate_basket_items(items)
+            if errors:
+                return JsonResponse({'Status': False, 'Errors': errors})
+
+            quantities = {item['product_info']: item['quantity'] for item in items}
+            with transaction.atomic():
+                basket, created = Order.objects.get_or_create(user_id=request.user.id, state='basket')
+                # позиции корзины и текущий остаток одним запросом; позиции заблокированы до конца транзакции
+                stock = dict(OrderItem.objects.select_for_update(of=('self',)).filter(
+                    order_id=basket.id, product_info_id__in=quantities).values_list(
+                    'product_info_id', 'product_info__quantity'))
+
+                positions = []
+                for product_id, quantity in quantities.items():
+                    if product_id not in stock:
+                        positions.append({'product_info': product_id, 'Status': False,
+                                          'Error': 'Position is not in the basket.'})
+                    elif quantity > stock[product_id]:
+                        positions.append({'product_info': product_id, 'Status': False,
+                                          'Error': f'Only {stock[product_id]} in stock.'})
+                    else:
+                        positions.append({'product_info': product_id, 'Status': True, 'quantity': quantity})
+
+                # все изменения одним UPDATE ... SET quantity = CASE product_info_id WHEN ... END
+                accepted = {position['product_info']: position['quantity'] for position in positions
+                            if position['Status']}
+                objects_updated = 0
+                if accepted:
+                    objects_updated = OrderItem.objects.filter(
+                        order_id=basket.id, product_info_id__in=accepted).update(quantity=Case(
+                            *(When(product_info_id=product_id, then=Value(quantity))
+                              for product_id, quantity in accepted.items()), output_field=PositiveIntegerField()))
+
+            # ни одна позиция не изменилась - запрос неуспешен, результаты по позициям всё равно возвращаются
+            return JsonResponse({'Status': bool(objects_updated), 'Objects updated': objects_updated,
+                                 'Positions': positions})
 
         return JsonResponse({'Status': False, 'Errors': 'Input Error! All required fields are not filled.'})
 
@@ -330,12 +597,19 @@ class OrderView(APIView):
                                  'Error': 'Access denied! Available only for registered users.'},
                                 status=403)
 
-        order = Order.objects.filter(
-            user_id=request.user.id).exclude(state='basket').prefetch_related(
-            'ordered_items__product_info__product__category',
-            'ordered_items__product_info__product_parameters__parameter').select_related('contact').distinct()
+        # ?fields=id,state: в ответе только эти поля, позиции заказов читаются, только если запрошены
+        try:
+            fields = parse_fields(request.query_params.get('fields'), OrderSerializer.Meta.fields)
+        except ValueError as error:
+            return JsonResponse({'Status': False, 'Errors': str(error)})
 
-        serializer = OrderSerializer(order, many=True)
+        order = Order.objects.filter(user_id=request.user.id).exclude(state='basket').distinct()
+        if fields is None or 'ordered_items' in fields:
+            order = order.prefetch_related('ordered_items')
+        if fields is not None:
+            order = order.only('id', *(name for name in fields if name != 'ordered_items'))
+
+        serializer = OrderSerializer(order, many=True, fields=fields)
 
         return Response(serializer.data)
 
@@ -0,0 +1,21 @@
+from tests.samples import load_sample
+
+
+def make_sample(categories=None, parameters=None):
+    # образец каталога с заданным числом категорий и параметров у товара; None - как в data/shop1.yaml
+    sample = load_sample()
+    goods = sample['goods']
+
+    if categories:
+        sample['categories'] = [{'id': 10000 + index, 'name': f'Категория {index}'} for index in range(categories)]
+        goods = [dict(goods[index % len(goods)], category=10000 + index % categories)
+                 for index in range(max(categories, len(goods)))]
+
+    if parameters is not None:
+        goods = [dict(item, parameters={**dict(list(item['parameters'].items())[:parameters]),
+                                        **{f'Параметр {number}': f'значение {(index + number) % 50}'
+                                           for number in range(len(item['parameters']), parameters)}})
+                 for index, item in enumerate(goods)]
+
+    sample['goods'] = goods
+    return sample
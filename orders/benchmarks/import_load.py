@@ -0,0 +1,148 @@
+# Сквозной замер загрузки прайса (постановка в очередь + обработчик) на временной тестовой БД:
+#   python -m benchmarks.import_load --goods 1000 --goods 10000 --goods 100000 (запуск из каталога orders)
+# Результаты пишутся в benchmarks/results/*.json; --compare сравнивает с сохранённым прогоном.
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'orders.settings')
+django.setup()
+
+from django.conf import settings
+from django.core.files import File
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+
+from backend.jobs import enqueue_import, run_pending
+from backend.models import User
+from benchmarks.catalogue import make_sample
+from tests.samples import WRITERS
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+PHASES = (
+    # название, режим загрузки, ревизия каталога: первая загрузка и повторные с изменёнными ценами
+    ('insert', 'upsert', 0),
+    ('update', 'upsert', 1),
+    ('replace', 'replace', 1),
+)
+
+
+def import_catalogue(user_id, path, mode, format_name):
+    # выполняется в отдельном процессе, чтобы пик RSS относился только к этой загрузке
+    user = User.objects.get(id=user_id)
+    with CaptureQueriesContext(connection) as context:
+        started = time.perf_counter()
+        with File(open(path, 'rb'), name=os.path.basename(path)) as file:
+            job = enqueue_import(user, file, mode=mode, format_name=format_name)
+        run_pending()
+        elapsed = time.perf_counter() - started
+
+    job.refresh_from_db()
+    if job.state != 'done':
+        raise RuntimeError(f'Import failed: {job.errors}')
+    return {'seconds': round(elapsed, 3), 'rows': job.rows_processed,
+            'rows_per_second': round(job.rows_processed / elapsed, 1), 'queries': len(context.captured_queries),
+            'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10, 1),
+            'inserted': job.inserted, 'updated': job.updated, 'unchanged': job.unchanged, 'removed': job.removed}
+
+
+def run_isolated(function, *args):
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('fork')) as executor:
+        return executor.submit(function, *args).result()
+
+
+def run(counts, categories, parameters, format_name, directory):
+    results = []
+    sample = make_sample(categories, parameters)
+    for count in counts:
+        call_command('flush', interactive=False, verbosity=0)
+        user = User.objects.create(email='benchmark@example.com', type='shop')
+
+        for phase, mode, revision in PHASES:
+            path = os.path.join(directory, f'price-{count}-{revision}.{format_name}')
+            if not os.path.exists(path):
+                WRITERS[format_name](path, count, sample, revision=revision)
+
+            result = {'goods': count, 'phase': phase, 'file_mb': round(os.path.getsize(path) / 2 ** 20, 2),
+                      **run_isolated(import_catalogue, user.id, path, mode, format_name)}
+            results.append(result)
+            print(f'{count:>8} {phase:>8} {result["file_mb"]:>8.1f} {result["seconds"]:>8.2f} '
+                  f'{result["rows_per_second"]:>9.0f} {result["queries"]:>8} {result["peak_rss_mb"]:>8.1f}')
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, path):
+    # относительное изменение скорости и числа запросов по сравнению с сохранённым прогоном
+    with open(path, encoding='utf-8') as file:
+        previous = {(result['goods'], result['phase']): result for result in json.load(file)['results']}
+
+    print(f'\nCompared with {path}:')
+    for result in results:
+        before = previous.get((result['goods'], result['phase']))
+        if before is None:
+            continue
+        print(f'{result["goods"]:>8} {result["phase"]:>8} '
+              f'rows/s {(result["rows_per_second"] / before["rows_per_second"] - 1) * 100:>+7.1f}%  '
+              f'queries {result["queries"] - before["queries"]:>+6}  '
+              f'peak RSS {result["peak_rss_mb"] - before["peak_rss_mb"]:>+7.1f} MB')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--goods', type=int, action='append')
+    parser.add_argument('--categories', type=int, help='Количество категорий; по умолчанию как в data/shop1.yaml')
+    parser.add_argument('--parameters', type=int, help='Параметров у товара; по умолчанию как в data/shop1.yaml')
+    parser.add_argument('--format', choices=list(WRITERS), default='yaml')
+    parser.add_argument('--output', help='Файл результатов; по умолчанию benchmarks/results/import-<время>.json')
+    parser.add_argument('--compare', help='Файл результатов предыдущего прогона')
+    parser.add_argument('--keepdb', action='store_true', help='Не удалять тестовую БД после прогона')
+    args = parser.parse_args()
+
+    counts = args.goods or [1000, 10000]
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False,
+                                                  keepdb=args.keepdb)
+    print(f'{"goods":>8} {"phase":>8} {"file MB":>8} {"seconds":>8} {"rows/s":>9} {"queries":>8} {"peak MB":>8}')
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            settings.MEDIA_ROOT = os.path.join(directory, 'media')
+            results = run(counts, args.categories, args.parameters, args.format, directory)
+    finally:
+        connections.close_all()
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=args.keepdb)
+
+    output = args.output or os.path.join(RESULTS_DIR, f'import-{time.strftime("%Y%m%d-%H%M%S")}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump({'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'revision': git_revision(),
+                   'python': platform.python_version(), 'django': django.get_version(),
+                   'database': connection.vendor, 'format': args.format, 'categories': args.categories,
+                   'parameters': args.parameters, 'results': results}, file, indent=2)
+    print(f'Results: {output}')
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+# Скорость разбора одного и того же синтетического каталога в разных форматах:
+#   python -m benchmarks.parse_formats --goods 20000 (запуск из каталога orders)
+import argparse
+import os
+import tempfile
+import time
+
+from backend.parsers import parse_price_list, FORMATS
+from tests.samples import WRITERS
+
+
+def parse(path, format_name):
+    with open(path, 'rb') as file:
+        data = parse_price_list(file, format_name)
+        return sum(1 for _ in data['goods'])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--goods', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f'{"format":>8} {"file MB":>8} {"seconds":>8} {"goods/s":>10} {"vs yaml":>8}')
+    baseline = None
+    with tempfile.TemporaryDirectory() as directory:
+        for format_name, writer in WRITERS.items():
+            if format_name not in FORMATS:
+                continue
+            path = os.path.join(directory, f'price.{format_name}')
+            writer(path, args.goods)
+
+            timings = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                assert parse(path, format_name) == args.goods
+                timings.append(time.perf_counter() - started)
+
+            elapsed = min(timings)
+            baseline = baseline or elapsed
+            print(f'{format_name:>8} {os.path.getsize(path) / 2 ** 20:>8.1f} {elapsed:>8.3f} '
+                  f'{args.goods / elapsed:>10.0f} {baseline / elapsed:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+# Стоимость вывода одной строки списка product/: поля DRF против плана колонок и orjson, без обращений к БД:
+#   python -m benchmarks.serialize_catalogue --rows 500 (запуск из каталога orders)
+import argparse
+import os
+import time
+from collections import namedtuple
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'orders.settings')
+django.setup()
+
+from rest_framework.renderers import JSONRenderer
+
+from backend.importer import render_parameters
+from backend.models import CatalogueItem
+from backend.renderers import FastJSONRenderer, orjson
+from backend.serializer import CatalogueItemSerializer, CatalogueRowSerializer
+from tests.samples import iter_goods
+
+Row = namedtuple('Row', CatalogueRowSerializer.columns)
+
+
+def make_items(count):
+    return [CatalogueItem(product_info_id=index + 1, shop_id=1, shop_name='Связной', product_id=index + 1,
+                          product_name=item['name'], category_id=item['category'], category_name='Смартфоны',
+                          external_id=item['id'], model=item['model'], quantity=item['quantity'],
+                          price=item['price'], price_rrc=item['price_rrc'],
+                          parameters=render_parameters((name, str(value))
+                                                       for name, value in item['parameters'].items()))
+            for index, item in enumerate(iter_goods(count))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=500, help='Строк на странице')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    items = make_items(args.rows)
+    rows = [Row(*(getattr(item, column) for column in Row._fields)) for item in items]
+    variants = (
+        ('ModelSerializer + json', lambda: JSONRenderer().render(CatalogueItemSerializer(items, many=True).data)),
+        ('plan + json', lambda: JSONRenderer().render(CatalogueRowSerializer(rows, many=True).data)),
+        ('plan + orjson', lambda: FastJSONRenderer().render(CatalogueRowSerializer(rows, many=True).data)),
+    )
+
+    expected = variants[0][1]()
+    print(f'orjson: {"yes" if orjson is not None else "not installed, json fallback"}')
+    print(f'{"variant":>24} {"us/row":>8} {"speedup":>8}')
+    baseline = None
+    for name, render in variants:
+        # вывод совпадает байт в байт, иначе сравнение скоростей не имеет смысла
+        assert render() == expected, name
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            render()
+            timings.append(time.perf_counter() - started)
+
+        per_row = min(timings) / args.rows * 1e6
+        baseline = baseline or per_row
+        print(f'{name:>24} {per_row:>8.2f} {baseline / per_row:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+# Сравнение пикового потребления памяти при разборе прайса:
+#   python -m benchmarks.yaml_memory --goods 10000 --goods 50000 (запуск из каталога orders)
+# Каждый способ разбора выполняется в отдельном процессе и измеряется по пику RSS: tracemalloc не видит
+# выделений libyaml. Полная загрузка идёт тем же загрузчиком, что и потоковый разбор (CSafeLoader, если есть).
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import yaml
+
+from backend.parsers import parse_price_list, YamlLoader
+from tests.samples import write_yaml
+
+
+def idle(path):
+    # пустой процесс: RSS интерпретатора и импортов, от которого считается прирост
+    return 0
+
+
+def full_load(path):
+    with open(path, 'rb') as file:
+        data = yaml.load(file, Loader=YamlLoader)
+    return len(data['goods'])
+
+
+def streaming_load(path):
+    with open(path, 'rb') as file:
+        return sum(1 for _ in parse_price_list(file)['goods'])
+
+
+def measure(function, path):
+    # выполняется в отдельном процессе, чтобы пик RSS относился только к этому разбору
+    started = time.perf_counter()
+    count = function(path)
+    elapsed = time.perf_counter() - started
+    return count, elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 2 ** 10
+
+
+def run_isolated(function, path):
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('fork')) as executor:
+        return executor.submit(measure, function, path).result()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--goods', type=int, action='append')
+    args = parser.parse_args()
+
+    print(f'loader: {YamlLoader.__name__}')
+    print(f'{"goods":>8} {"file MB":>8} {"loader":>10} {"seconds":>8} {"peak MB":>8} {"delta MB":>9}')
+    for count in args.goods or [1000, 10000]:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'price.yaml')
+            write_yaml(path, count)
+            size = os.path.getsize(path) / 2 ** 20
+            _, _, baseline = run_isolated(idle, path)
+
+            for name, function in (('full', full_load), ('streaming', streaming_load)):
+                loaded, elapsed, peak = run_isolated(function, path)
+                assert loaded == count
+                print(f'{count:>8} {size:>8.1f} {name:>10} {elapsed:>8.2f} {peak / 2 ** 20:>8.1f} '
+                      f'{(peak - baseline) / 2 ** 20:>9.1f}')
+
+
+if __name__ == '__main__':
+    main()
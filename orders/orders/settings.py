@@ -124,6 +124,21 @@ DATABASES = {
     }
 }
 
+# default - быстрый кеш процесса для ответов и троттлинга. catalogue - общее для веб-процессов и import_worker
+# хранилище версии каталога: загрузка в обработчике меняет версию, и ключи кешей всех процессов устаревают.
+# По умолчанию - таблица в БД (создаётся миграцией), memcached и т.п. задаются через окружение
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalogue': {
+        'BACKEND': os.getenv('cache_backend', 'django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': os.getenv('cache_location', 'backend_cache'),
+    },
+}
+
+CATALOGUE_CACHE = 'catalogue'
+
 AUTH_USER_MODEL = 'backend.User'
 
 # Password validation
@@ -164,6 +179,8 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': ['rest_framework.authentication.TokenAuthentication', ],
     'DEFAULT_FILTER_BACKENDS': ['rest_framework.filters.SearchFilter',
@@ -187,3 +204,39 @@ SPECTACULAR_SETTINGS = {
 }
 
 LIMIT_CONTACTS = 6
+
+# не больше id в одном запросе ?ids=
+MAX_BULK_IDS = 100
+
+IMPORT_PROGRESS_INTERVAL = 1
+
+IMPORT_WORKER_POLL_INTERVAL = 2
+
+# задача без пульса дольше этого времени (сек.) считается брошенной и возвращается в очередь
+IMPORT_JOB_TIMEOUT = 300
+
+IMPORT_JOB_ATTEMPTS = 3
+
+FEED_POLL_INTERVAL = 3600
+
+FEED_CONCURRENCY = 20
+
+FEED_TIMEOUT = 30
+
+FACETS_CACHE_TIMEOUT = 600
+
+RESPONSE_CACHE_TIMEOUT = 300
+
+CACHE_STATS_FLUSH_EVERY = 100
+
+# снимки каталога для выгрузки целиком (product/snapshot), каталог внутри MEDIA_ROOT
+SNAPSHOT_DIR = 'snapshots'
+
+SNAPSHOT_ON_IMPORT = True
+
+SNAPSHOT_GZIP_LEVEL = 6
+
+SNAPSHOT_BROTLI_QUALITY = 9
+
+# сборка дольше этого времени (сек.) считается прерванной: её блокировка снимается, каталог удаляется
+SNAPSHOT_BUILD_TIMEOUT = 3600
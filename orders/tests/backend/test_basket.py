@@ -0,0 +1,124 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework.status import HTTP_200_OK
+
+from backend.models import OrderItem, ProductInfo
+
+
+@pytest.fixture
+def client(api_client):
+    api_client.force_authenticate(baker.make('backend.User'))
+    return api_client
+
+
+@pytest.fixture
+def products():
+    return baker.make(ProductInfo, product__category=baker.make('backend.Category'), shop=baker.make('backend.Shop'),
+                      _quantity=20)
+
+
+def add_items(client, items):
+    with CaptureQueriesContext(connection) as context:
+        response = client.post(reverse('backend:user-basket'), {'ordered_items': items})
+    return response.json(), len(context.captured_queries)
+
+
+# число запросов не зависит от количества позиций
+@pytest.mark.django_db
+def test_basket_add_bulk(client, products):
+    data, _ = add_items(client, [{'product_info': products[0].id, 'quantity': 1}])
+    assert data == {'Status': True, 'Positions created:': 1}
+
+    data, few = add_items(client, [{'product_info': products[1].id, 'quantity': 2}])
+    assert data == {'Status': True, 'Positions created:': 1}
+    data, many = add_items(client, [{'product_info': product.id, 'quantity': 2} for product in products[2:]])
+    assert data == {'Status': True, 'Positions created:': 18}
+    assert many == few
+    assert OrderItem.objects.filter(order__state='basket', quantity=2).count() == 19
+
+
+# повтор в запросе, несуществующий товар и уже добавленная позиция ничего не добавляют
+@pytest.mark.django_db
+def test_basket_add_invalid(client, products):
+    add_items(client, [{'product_info': products[0].id, 'quantity': 1}])
+
+    for items, error in (
+            ([{'product_info': products[1].id, 'quantity': 1}] * 2, f'Positions {products[1].id} repeated.'),
+            ([{'product_info': products[1].id, 'quantity': 1}, {'product_info': 0, 'quantity': 1}],
+             'Positions 0 do not exist.'),
+            ([{'product_info': products[1].id, 'quantity': 1}, {'product_info': products[0].id, 'quantity': 1}],
+             f'Position {products[0].id} already added.'),
+    ):
+        data, _ = add_items(client, items)
+        assert data == {'Status': False, 'Errors': error}
+
+    data, _ = add_items(client, [{'product_info': products[1].id, 'quantity': 0}])
+    assert data['Status'] is False and 'quantity' in data['Errors'][0]
+    assert OrderItem.objects.count() == 1
+
+
+def update_items(client, items):
+    with CaptureQueriesContext(connection) as context:
+        response = client.put(reverse('backend:user-basket'), {'ordered_items': items})
+    return response.json(), [query['sql'] for query in context.captured_queries]
+
+
+# все количества меняются одним UPDATE, число запросов не зависит от количества позиций
+@pytest.mark.django_db
+def test_basket_update_bulk(client, products):
+    add_items(client, [{'product_info': product.id, 'quantity': 1} for product in products])
+    ProductInfo.objects.update(quantity=100)
+
+    data, few = update_items(client, [{'product_info': products[0].id, 'quantity': 3}])
+    assert data['Objects updated'] == 1
+    data, many = update_items(client, [{'product_info': product.id, 'quantity': index + 1}
+                                       for index, product in enumerate(products)])
+
+    assert data['Status'] is True and data['Objects updated'] == 20
+    assert len(many) == len(few)
+    assert len([sql for sql in many if sql.startswith('UPDATE')]) == 1
+    assert dict(OrderItem.objects.values_list('product_info_id', 'quantity')) == \
+        {product.id: index + 1 for index, product in enumerate(products)}
+
+
+# результат по каждой позиции: нет в корзине, не хватает остатка; остальные обновляются
+@pytest.mark.django_db
+def test_basket_update_positions(client, products):
+    add_items(client, [{'product_info': product.id, 'quantity': 1} for product in products[:2]])
+    ProductInfo.objects.filter(id=products[0].id).update(quantity=5)
+    ProductInfo.objects.filter(id=products[1].id).update(quantity=2)
+
+    data, _ = update_items(client, [{'product_info': products[0].id, 'quantity': 4},
+                                    {'product_info': products[1].id, 'quantity': 3},
+                                    {'product_info': products[2].id, 'quantity': 1}])
+
+    assert data == {'Status': True, 'Objects updated': 1, 'Positions': [
+        {'product_info': products[0].id, 'Status': True, 'quantity': 4},
+        {'product_info': products[1].id, 'Status': False, 'Error': 'Only 2 in stock.'},
+        {'product_info': products[2].id, 'Status': False, 'Error': 'Position is not in the basket.'},
+    ]}
+    assert dict(OrderItem.objects.values_list('product_info_id', 'quantity')) == {products[0].id: 4,
+                                                                                 products[1].id: 1}
+
+    data, _ = update_items(client, [{'product_info': products[0].id, 'quantity': 2}] * 2)
+    assert data == {'Status': False, 'Errors': f'Positions {products[0].id} repeated.'}
+
+
+# ни одна позиция не обновлена - Status False, результаты по позициям сохраняются
+@pytest.mark.django_db
+def test_basket_update_nothing_updated(client, products):
+    add_items(client, [{'product_info': products[0].id, 'quantity': 1}])
+    ProductInfo.objects.filter(id=products[0].id).update(quantity=1)
+
+    response = client.put(reverse('backend:user-basket'), {'ordered_items': [
+        {'product_info': products[0].id, 'quantity': 5}, {'product_info': products[1].id, 'quantity': 1}]})
+
+    assert response.status_code == HTTP_200_OK
+    assert response.json() == {'Status': False, 'Objects updated': 0, 'Positions': [
+        {'product_info': products[0].id, 'Status': False, 'Error': 'Only 1 in stock.'},
+        {'product_info': products[1].id, 'Status': False, 'Error': 'Position is not in the basket.'},
+    ]}
+    assert OrderItem.objects.get().quantity == 1
@@ -0,0 +1,63 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST
+
+from backend.models import CatalogueItem
+from backend.serializer import CatalogueItemSerializer
+
+
+def bulk_get(client, url, ids):
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(url, {'ids': ids})
+    return response, len(context.captured_queries)
+
+
+# несколько предложений одним запросом к БД, в порядке ids, без постраничного вывода
+@pytest.mark.django_db
+def test_product_list_ids(api_client, shop):
+    pks = list(CatalogueItem.objects.order_by('-pk').values_list('pk', flat=True)[:3])
+    response, queries = bulk_get(api_client, reverse('backend:product-view-list'),
+                                 ','.join(map(str, pks + [pks[0], 0])))
+
+    assert response.status_code == HTTP_200_OK
+    assert queries == 1
+    expected = {item['id']: item for item in
+                CatalogueItemSerializer(CatalogueItem.objects.filter(pk__in=pks), many=True).data}
+    assert response.json() == [expected[pk] for pk in pks]
+
+
+# ids вместе с другими фильтрами и ?fields=
+@pytest.mark.django_db
+def test_product_list_ids_filters(api_client, shop):
+    items = list(CatalogueItem.objects.order_by('pk')[:2])
+    response = api_client.get(reverse('backend:product-view-list'),
+                              {'ids': f'{items[0].pk},{items[1].pk}', 'shop_id': items[0].shop_id,
+                               'fields': 'id,price'})
+
+    assert response.json() == [{'id': item.pk, 'price': item.price} for item in items]
+
+
+# количество запросов не зависит от числа id
+@pytest.mark.django_db
+def test_shop_and_category_ids(api_client):
+    for basename, model in (('category-view', 'backend.Category'), ('shop-view', 'backend.Shop')):
+        extra = {'state': True} if model == 'backend.Shop' else {}
+        objects = baker.make(model, _quantity=5, **extra)
+        pks = [obj.pk for obj in reversed(objects[1:])]
+        response, queries = bulk_get(api_client, reverse(f'backend:{basename}-list'), ','.join(map(str, pks)))
+
+        assert response.status_code == HTTP_200_OK
+        assert queries == 1
+        assert [row['id'] for row in response.json()] == pks
+
+
+# неверный список и превышение лимита
+@pytest.mark.django_db
+@pytest.mark.parametrize('ids', ['1,a', ',', ','.join(map(str, range(1, 102)))])
+def test_product_list_ids_invalid(api_client, ids):
+    response = api_client.get(reverse('backend:product-view-list'), {'ids': ids})
+
+    assert response.status_code == HTTP_400_BAD_REQUEST
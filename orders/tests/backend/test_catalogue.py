@@ -0,0 +1,140 @@
+import copy
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from django.urls import reverse
+from model_bakery import baker
+
+from backend.cache import catalogue_version
+from backend.catalogue import rebuild_catalogue
+from backend.importer import import_price_list
+from backend.models import CatalogueItem, Order, OrderItem, Parameter, Product, ProductInfo, ProductParameter
+from backend.renderers import FastJSONRenderer
+from backend.serializer import CatalogueItemSerializer, CatalogueRowSerializer, ProductInfoSerializer
+
+
+def catalogue_rows():
+    return list(CatalogueItem.objects.order_by('pk').values())
+
+
+# строки, записанные импортом, совпадают с построенными по БД и отдаются в прежнем виде
+@pytest.mark.django_db
+def test_catalogue_import(shop, price_list_data):
+    rows = catalogue_rows()
+    assert len(rows) == len(price_list_data['goods'])
+
+    call_command('rebuild_catalogue', stdout=None)
+    assert catalogue_rows() == rows
+
+    assert CatalogueItemSerializer(CatalogueItem.objects.order_by('pk'), many=True).data == \
+        ProductInfoSerializer(ProductInfo.objects.order_by('pk'), many=True).data
+
+
+# повторная загрузка обновляет изменившиеся строки, удаляет пропавшие и обнуляет заказанные
+@pytest.mark.django_db
+def test_catalogue_upsert(shop, price_list_data):
+    data = copy.deepcopy(price_list_data)
+    data['goods'][0]['price'] += 1000
+    data['goods'][1]['parameters']['Цвет'] = 'белый'
+    ordered = data['goods'].pop()
+    vanished = data['goods'].pop()
+
+    basket = baker.make(Order, user=baker.make('backend.User'), state='basket')
+    OrderItem.objects.create(order=basket, product_info=ProductInfo.objects.get(external_id=ordered['id']),
+                             quantity=1)
+    import_price_list(data, shop.user_id)
+
+    rows = catalogue_rows()
+    rebuild_catalogue()
+    assert catalogue_rows() == rows
+    assert not CatalogueItem.objects.filter(external_id=vanished['id']).exists()
+    assert CatalogueItem.objects.get(external_id=ordered['id']).quantity == 0
+    assert CatalogueItem.objects.get(external_id=data['goods'][0]['id']).price == data['goods'][0]['price']
+
+
+# отключённый магазин пропадает из каталога, включённый возвращается
+@pytest.mark.django_db
+def test_catalogue_shop_state(shop, price_list_data):
+    rows = catalogue_rows()
+
+    shop.state = False
+    shop.save()
+    assert CatalogueItem.objects.count() == 0
+
+    shop.state = True
+    shop.save()
+    assert catalogue_rows() == rows
+
+
+# переименование продукта и магазина обновляет каталог
+@pytest.mark.django_db
+def test_catalogue_rename(shop):
+    product = Product.objects.order_by('id').first()
+    product.name = 'Новое название'
+    product.save()
+    shop.name = 'Новый магазин'
+    shop.save()
+
+    assert set(CatalogueItem.objects.filter(product=product).values_list('product_name', flat=True)) == \
+        {'Новое название'}
+    assert set(CatalogueItem.objects.values_list('shop_name', flat=True)) == {'Новый магазин'}
+
+
+# правки предложений и параметров вне импорта (админка) попадают в каталог и меняют его версию
+@pytest.mark.django_db(transaction=True)
+def test_catalogue_offer_edit(shop):
+    offer, removed = ProductInfo.objects.order_by('id')[:2]
+    version = catalogue_version()
+    offer.price += 1000
+    offer.save()
+    assert catalogue_version() > version
+
+    version = catalogue_version()
+    parameter = offer.product_parameters.order_by('id').first()
+    parameter.value = 'новое значение'
+    parameter.save()
+    ProductParameter.objects.create(product_info=offer, parameter=Parameter.objects.create(name='Новый'), value='1')
+    offer.product_parameters.exclude(id=parameter.id).exclude(parameter__name='Новый').first().delete()
+    removed.delete()
+    assert catalogue_version() > version
+
+    rows = catalogue_rows()
+    rebuild_catalogue()
+    assert catalogue_rows() == rows
+    assert CatalogueItem.objects.get(pk=offer.pk).price == offer.price
+    assert not CatalogueItem.objects.filter(pk=removed.pk).exists()
+
+
+# список продуктов - один запрос к каталогу без соединений и prefetch
+@pytest.mark.django_db
+def test_catalogue_product_list(api_client, shop, price_list_data):
+    with CaptureQueriesContext(connection) as context:
+        response = api_client.get(reverse('backend:product-view-list'), {'category_id': 224})
+
+    assert len(response.json()['results']) == len(price_list_data['goods'])
+    assert len(context.captured_queries) == 1
+    assert 'JOIN' not in context.captured_queries[0]['sql']
+
+
+# быстрый вывод списка совпадает с ProductInfoSerializer байт в байт
+@pytest.mark.django_db
+def test_catalogue_fast_serialization(api_client, shop):
+    expected = JSONRenderer().render(ProductInfoSerializer(ProductInfo.objects.order_by('pk'), many=True).data)
+    rows = CatalogueItem.objects.order_by('pk').values_list(*CatalogueRowSerializer.columns, named=True)
+
+    assert FastJSONRenderer().render(CatalogueRowSerializer(rows, many=True).data) == expected
+    response = api_client.get(reverse('backend:product-view-list'))
+    assert response.content == b'{"next":null,"previous":null,"results":' + expected + b'}'
+
+
+# orjson выдаёт тот же JSON, что и JSONRenderer, включая экранирование U+2028 и отступы
+@pytest.mark.parametrize('data, media_type', [
+    ({'name': 'строка\u2028перевод\u2029', 'price': 6.1, 'items': [1, None, True]}, None),
+    ({'name': 'строка'}, 'application/json; indent=2'),
+    (None, None),
+])
+def test_fast_json_renderer(data, media_type):
+    assert FastJSONRenderer().render(data, media_type) == JSONRenderer().render(data, media_type)
@@ -0,0 +1,125 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from django.urls import reverse
+from model_bakery import baker
+
+from backend.feeds import poll_feeds
+from backend.models import ProductInfo, Shop
+
+
+@pytest.fixture
+def feed_server(price_list):
+    # локальный HTTP-сервер с поддержкой условных запросов
+    state = {'body': price_list.encode('utf-8'), 'etag': '"v1"', 'requests': []}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            state['requests'].append(dict(self.headers))
+            if self.path == '/missing.yaml':
+                self.send_response(404)
+                self.end_headers()
+                return
+            if self.headers.get('If-None-Match') == state['etag']:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('ETag', state['etag'])
+            self.send_header('Content-Length', str(len(state['body'])))
+            self.end_headers()
+            self.wfile.write(state['body'])
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    state['url'] = f'http://127.0.0.1:{server.server_address[1]}'
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+# первый опрос загружает прайс, повторный получает 304 и пропускает загрузку
+@pytest.mark.django_db
+def test_poll_feeds_not_modified(feed_server, price_list_data):
+    shop = baker.make(Shop, name=price_list_data['shop'], url=f'{feed_server["url"]}/shop1.yaml')
+
+    results = poll_feeds()
+    assert results[0]['status'] == 'imported'
+    assert results[0]['rows'] == len(price_list_data['goods'])
+    assert ProductInfo.objects.filter(shop=shop).count() == len(price_list_data['goods'])
+
+    shop.refresh_from_db()
+    assert shop.feed_etag == '"v1"'
+    assert shop.feed_checked_at is not None
+
+    results = poll_feeds()
+    assert results[0]['status'] == 'not_modified'
+    assert feed_server['requests'][-1]['If-None-Match'] == '"v1"'
+
+
+# изменившийся прайс загружается снова
+@pytest.mark.django_db
+def test_poll_feeds_changed(feed_server, price_list_data):
+    shop = baker.make(Shop, name=price_list_data['shop'], url=f'{feed_server["url"]}/shop1.yaml')
+    poll_feeds()
+
+    feed_server['etag'] = '"v2"'
+    feed_server['body'] = feed_server['body'].replace(b'price: 110000', b'price: 100000')
+    results = poll_feeds()
+
+    assert results[0]['status'] == 'imported'
+    shop.refresh_from_db()
+    assert shop.feed_etag == '"v2"'
+
+
+# сервер не поддерживает условные запросы, но содержимое прайса не изменилось
+@pytest.mark.django_db
+def test_poll_feeds_same_content(feed_server, price_list_data):
+    shop = baker.make(Shop, name=price_list_data['shop'], url=f'{feed_server["url"]}/shop1.yaml')
+    poll_feeds()
+
+    feed_server['etag'] = '"v2"'
+    results = poll_feeds()
+
+    assert results[0]['status'] == 'not_modified'
+    shop.refresh_from_db()
+    assert shop.feed_etag == '"v2"'
+
+
+# ошибка одного поставщика не мешает остальным
+@pytest.mark.django_db
+def test_poll_feeds_error(feed_server, price_list_data):
+    baker.make(Shop, name='missing', url=f'{feed_server["url"]}/missing.yaml')
+    baker.make(Shop, name=price_list_data['shop'], url=f'{feed_server["url"]}/shop1.yaml')
+
+    results = {result['shop']: result for result in poll_feeds()}
+
+    assert results['missing']['status'] == 'error'
+    assert results[price_list_data['shop']]['status'] == 'imported'
+    assert Shop.objects.get(name='missing').feed_etag == ''
+
+
+# регистрация ссылки на прайс
+@pytest.mark.django_db
+def test_partner_feed_register(shop_client):
+    shop = baker.make(Shop, user=shop_client.user, feed_etag='"old"')
+    response = shop_client.post(reverse('backend:partner-feed'), {'url': 'http://example.com/shop.yaml'})
+
+    assert response.json() == {'Status': True}
+    shop.refresh_from_db()
+    assert shop.url == 'http://example.com/shop.yaml'
+    assert shop.feed_etag == ''
+
+
+# некорректная ссылка на прайс
+@pytest.mark.django_db
+def test_partner_feed_incorrect_url(shop_client):
+    baker.make(Shop, user=shop_client.user)
+    response = shop_client.post(reverse('backend:partner-feed'), {'url': 'not a url'})
+
+    assert response.json()['Status'] is False
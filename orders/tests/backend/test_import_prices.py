@@ -0,0 +1,61 @@
+import copy
+from io import StringIO
+
+import pytest
+import yaml
+from django.core.management import call_command, CommandError
+
+from backend.models import Category, Parameter, ProductInfo, Shop
+
+
+@pytest.fixture
+def price_lists_dir(tmp_path, price_list_data):
+    # два магазина с общими категориями и параметрами
+    for index in range(2):
+        data = copy.deepcopy(price_list_data)
+        data['shop'] = f'Магазин {index}'
+        (tmp_path / f'shop{index}.yaml').write_text(yaml.dump(data, allow_unicode=True), encoding='utf-8')
+    return tmp_path
+
+
+# успешная загрузка каталога прайсов в текущем процессе
+@pytest.mark.django_db
+def test_import_prices_inline(price_lists_dir, price_list_data):
+    out = StringIO()
+    call_command('import_prices', str(price_lists_dir), workers=0, stdout=out)
+
+    assert Shop.objects.count() == 2
+    assert ProductInfo.objects.count() == 2 * len(price_list_data['goods'])
+    assert 'Total: 2 files' in out.getvalue()
+
+
+# ошибка в одном файле не мешает загрузке остальных
+@pytest.mark.django_db
+def test_import_prices_bad_file(price_lists_dir, price_list_data):
+    (price_lists_dir / 'broken.yaml').write_text('shop: broken\ncategories: []\ngoods:\n  - id: 1\n',
+                                                 encoding='utf-8')
+    out = StringIO()
+    with pytest.raises(CommandError):
+        call_command('import_prices', str(price_lists_dir), workers=0, stdout=out)
+
+    assert set(Shop.objects.values_list('name', flat=True)) == {'Магазин 0', 'Магазин 1'}
+    assert ProductInfo.objects.count() == 2 * len(price_list_data['goods'])
+    assert 'PriceListValidationError: Row 1: missing fields' in out.getvalue()
+
+
+# параллельная загрузка не создаёт дублей общих справочников
+@pytest.mark.django_db(transaction=True)
+def test_import_prices_parallel(price_lists_dir, price_list_data):
+    call_command('import_prices', str(price_lists_dir / '*.yaml'), workers=2, stdout=StringIO())
+
+    assert Shop.objects.count() == 2
+    assert ProductInfo.objects.count() == 2 * len(price_list_data['goods'])
+    assert Category.objects.count() == len(price_list_data['categories'])
+    assert Parameter.objects.count() == len({name for item in price_list_data['goods'] for name in item['parameters']})
+
+
+# нет файлов по маске
+@pytest.mark.django_db
+def test_import_prices_not_found(tmp_path):
+    with pytest.raises(CommandError):
+        call_command('import_prices', str(tmp_path / '*.yaml'), workers=0)
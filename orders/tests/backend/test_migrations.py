@@ -0,0 +1,63 @@
+import json
+
+import pytest
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+
+
+def migrate(target):
+    # база в состоянии миграции target; возвращает исторические модели этого состояния
+    executor = MigrationExecutor(connection)
+    executor.migrate([('backend', target)])
+    return executor.loader.project_state([('backend', target)]).apps
+
+
+@pytest.fixture
+def migrator():
+    executor = MigrationExecutor(connection)
+    latest = executor.loader.graph.leaf_nodes('backend')[0][1]
+    yield migrate
+    migrate(latest)
+
+
+# миграция каталога заполняет его уже загруженными предложениями активных магазинов
+@pytest.mark.django_db(transaction=True)
+def test_catalogue_item_backfill(migrator):
+    apps = migrator('0010_product_info_price')
+    shop = apps.get_model('backend', 'Shop').objects.create(name='Связной')
+    closed = apps.get_model('backend', 'Shop').objects.create(name='Закрыт', state=False)
+    category = apps.get_model('backend', 'Category').objects.create(id=224, name='Смартфоны')
+    product = apps.get_model('backend', 'Product').objects.create(name='iPhone', category=category)
+    offer, hidden = (apps.get_model('backend', 'ProductInfo').objects.create(
+        product=product, shop=item, external_id=1, model='apple/iphone', quantity=3, price=100, price_rrc=120)
+        for item in (shop, closed))
+    apps.get_model('backend', 'ProductParameter').objects.create(
+        product_info=offer, parameter=apps.get_model('backend', 'Parameter').objects.create(name='Цвет'),
+        value='черный')
+
+    apps = migrator('0011_catalogue_item')
+    items = list(apps.get_model('backend', 'CatalogueItem').objects.all())
+
+    assert [(item.product_info_id, item.shop_name, item.product_name, item.category_name, item.price)
+            for item in items] == [(offer.id, 'Связной', 'iPhone', 'Смартфоны', 100)]
+    assert json.loads(items[0].parameters) == [{'parameter': 'Цвет', 'value': 'черный'}]
+
+
+# миграция числовых значений разбирает уже загруженные значения параметров
+@pytest.mark.django_db(transaction=True)
+def test_numeric_value_backfill(migrator):
+    apps = migrator('0012_catalogue_search')
+    shop = apps.get_model('backend', 'Shop').objects.create(name='Связной')
+    category = apps.get_model('backend', 'Category').objects.create(id=224, name='Смартфоны')
+    offer = apps.get_model('backend', 'ProductInfo').objects.create(
+        product=apps.get_model('backend', 'Product').objects.create(name='iPhone', category=category), shop=shop,
+        external_id=1, quantity=3, price=100, price_rrc=120)
+    for name, value in (('Диагональ', '6,5'), ('Память', '256'), ('Цвет', 'черный'), ('Вес', 'nan')):
+        apps.get_model('backend', 'ProductParameter').objects.create(
+            product_info=offer, parameter=apps.get_model('backend', 'Parameter').objects.create(name=name),
+            value=value)
+
+    apps = migrator('0013_product_parameter_numeric')
+
+    assert dict(apps.get_model('backend', 'ProductParameter').objects.values_list('value', 'numeric_value')) == \
+        {'6,5': 6.5, '256': 256.0, 'черный': None, 'nan': None}
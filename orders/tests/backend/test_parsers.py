@@ -0,0 +1,81 @@
+import types
+
+import pytest
+
+from backend.parsers import parse_price_list, find_format, PriceListFormatError, FORMATS
+from tests.samples import WRITERS
+
+
+# товары отдаются генератором, шапка разобрана заранее
+def test_parse_price_list_streaming(price_list, price_list_data):
+    data = parse_price_list(price_list)
+
+    assert data['shop'] == price_list_data['shop']
+    assert data['categories'] == price_list_data['categories']
+    assert isinstance(data['goods'], types.GeneratorType)
+    assert list(data['goods']) == price_list_data['goods']
+
+
+# разбор файла, открытого в бинарном режиме
+def test_parse_price_list_binary_file(tmp_path, price_list, price_list_data):
+    path = tmp_path / 'shop.yaml'
+    path.write_text(price_list, encoding='utf-8')
+
+    with open(path, 'rb') as file:
+        assert list(parse_price_list(file)['goods']) == price_list_data['goods']
+
+
+# товары до шапки читаются целиком
+def test_parse_price_list_goods_first():
+    data = parse_price_list('goods:\n  - id: 1\n    name: test\nshop: test\ncategories: []\n')
+
+    assert data == {'goods': [{'id': 1, 'name': 'test'}], 'shop': 'test', 'categories': []}
+
+
+# документ не является словарём
+def test_parse_price_list_incorrect_structure():
+    with pytest.raises(PriceListFormatError):
+        parse_price_list('- 1\n- 2\n')
+
+
+# выбор формата по расширению файла и типу содержимого
+def test_find_format():
+    assert find_format('price.CSV') == 'csv'
+    assert find_format('price.jsonl', 'text/plain') == 'ndjson'
+    assert find_format('price', 'application/x-ndjson; charset=utf-8') == 'ndjson'
+    assert find_format('price.txt') == 'yaml'
+
+
+# один и тот же каталог одинаково разбирается во всех форматах
+@pytest.mark.parametrize('format_name', [name for name in WRITERS if name in FORMATS])
+def test_parse_price_list_formats(tmp_path, format_name):
+    WRITERS['yaml'](tmp_path / 'price.yaml', 5)
+    WRITERS[format_name](tmp_path / f'price.{format_name}', 5)
+
+    parsed = []
+    for path, name in ((tmp_path / 'price.yaml', 'yaml'), (tmp_path / f'price.{format_name}', format_name)):
+        with open(path, 'rb') as file:
+            data = parse_price_list(file, name)
+            data['goods'] = [{key: str(value) for key, value in item.items() if key != 'parameters'}
+                             for item in data['goods']]
+            data['categories'] = {str(category['id']): category['name'] for category in data['categories']}
+            parsed.append(data)
+    expected, data = parsed
+
+    assert data['shop'] == expected['shop']
+    assert data['categories'].items() <= expected['categories'].items()
+    assert data['goods'] == expected['goods']
+
+
+# строка CSV без обязательных колонок
+def test_parse_price_list_csv_missing_columns():
+    with pytest.raises(PriceListFormatError):
+        parse_price_list('shop,id,name\ntest,1,test\n', 'csv')
+
+
+# ошибка в строке NDJSON указывает номер строки
+def test_parse_price_list_ndjson_incorrect_line():
+    data = parse_price_list('{"shop": "test", "categories": []}\n{"id": 1}\n{"id": \n', 'ndjson')
+
+    with pytest.raises(PriceListFormatError, match='Line 3'):
+        list(data['goods'])
@@ -0,0 +1,75 @@
+import pytest
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework.status import HTTP_200_OK, HTTP_403_FORBIDDEN
+
+from backend.exporters import export_price_list, EXPORTERS
+from backend.importer import import_price_list
+from backend.models import Shop
+from backend.parsers import parse_price_list
+
+
+def export(client, format_name):
+    response = client.get(reverse('backend:partner-export'), {'format': format_name})
+    assert response.status_code == HTTP_200_OK
+    assert response.streaming
+    return b''.join(response.streaming_content).decode('utf-8')
+
+
+# выгруженный прайс загружается обратно без потерь во всех форматах
+@pytest.mark.django_db
+@pytest.mark.parametrize('format_name', list(EXPORTERS))
+def test_partner_export(shop_client, price_list_data, format_name):
+    import_price_list(price_list_data, shop_client.user.id)
+    data = parse_price_list(export(shop_client, format_name), format_name)
+    goods = list(data['goods'])
+
+    assert data['shop'] == price_list_data['shop']
+    # в CSV категории без товаров не выгружаются
+    categories = {int(category['id']): category['name'] for category in data['categories']}
+    assert categories.items() <= {category['id']: category['name']
+                                  for category in price_list_data['categories']}.items()
+    assert set(categories) >= {item['category'] for item in price_list_data['goods']}
+    assert [{name: str(value) for name, value in item.items() if name != 'parameters'} for item in goods] == \
+        [{name: str(value) for name, value in item.items() if name != 'parameters'}
+         for item in price_list_data['goods']]
+    assert [item['parameters'] for item in goods] == \
+        [{name: str(value) for name, value in item['parameters'].items()} for item in price_list_data['goods']]
+
+
+# шапка отдаётся первой частью, товары - порциями
+@pytest.mark.django_db
+def test_partner_export_chunks(shop_client, price_list_data):
+    import_price_list(price_list_data, shop_client.user.id)
+    parts = list(export_price_list(Shop.objects.get(user=shop_client.user), 'ndjson', chunk_size=2))
+
+    assert parts[0].startswith('{"shop": ')
+    assert len(parts) == 1 + (len(price_list_data['goods']) + 1) // 2
+
+
+# выгружаются только предложения своего магазина
+@pytest.mark.django_db
+def test_partner_export_own_shop(shop_client, price_list_data):
+    import_price_list(dict(price_list_data, shop='Другой магазин'), baker.make('backend.User', type='shop').id)
+    import_price_list(dict(price_list_data, goods=price_list_data['goods'][:1]), shop_client.user.id)
+
+    assert len(export(shop_client, 'ndjson').splitlines()) == 2
+
+
+# неизвестный формат выгрузки
+@pytest.mark.django_db
+def test_partner_export_unknown_format(shop_client, price_list_data):
+    import_price_list(price_list_data, shop_client.user.id)
+    response = shop_client.get(reverse('backend:partner-export'), {'format': 'xml'})
+
+    assert response.status_code == HTTP_200_OK
+    assert response.json()['Status'] is False
+
+
+# выгрузка недоступна покупателю
+@pytest.mark.django_db
+def test_partner_export_not_shop(api_client):
+    api_client.force_authenticate(user=baker.make('backend.User', email='buyer@test.com'))
+    response = api_client.get(reverse('backend:partner-export'))
+
+    assert response.status_code == HTTP_403_FORBIDDEN
@@ -0,0 +1,410 @@
+import copy
+import time
+from datetime import timedelta
+
+import pytest
+import yaml
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from model_bakery import baker
+from rest_framework.status import HTTP_200_OK, HTTP_202_ACCEPTED, HTTP_403_FORBIDDEN, HTTP_404_NOT_FOUND
+
+from backend.jobs import ProgressReporter, requeue_stale_jobs, run_pending
+from backend.models import Category, ImportJob, Order, OrderItem, Product, ProductInfo, ProductParameter, Shop
+from tests.samples import iter_goods, scale_price_list, write_csv
+
+
+def load(client, payload):
+    # постановка загрузки в очередь и её выполнение обработчиком
+    if 'goods' in payload:
+        payload = {'url': yaml.dump(payload, allow_unicode=True)}
+    response = client.post(reverse('backend:partner-load'), payload)
+    assert response.status_code == HTTP_202_ACCEPTED
+
+    run_pending()
+    return client.get(reverse('backend:partner-load-status', args=[response.json()['Job']])).json()
+
+
+def load_queries(client, data):
+    response = client.post(reverse('backend:partner-load'), {'url': yaml.dump(data, allow_unicode=True)})
+    with CaptureQueriesContext(connection) as context:
+        run_pending()
+    assert ImportJob.objects.get(id=response.json()['Job']).state == 'done'
+    return len(context.captured_queries)
+
+
+# успешная постановка прайса в очередь
+@pytest.mark.django_db
+def test_partner_load_enqueue(shop_client, price_list):
+    response = shop_client.post(reverse('backend:partner-load'), {'url': price_list})
+
+    assert response.status_code == HTTP_202_ACCEPTED
+    response_json = response.json()
+    assert response_json['Status'] is True
+
+    job = ImportJob.objects.get(id=response_json['Job'])
+    assert job.state == 'new'
+    assert job.user == shop_client.user
+    assert ProductInfo.objects.count() == 0
+
+
+# успешная загрузка прайса
+@pytest.mark.django_db
+def test_partner_load_correct(shop_client, price_list, price_list_data):
+    job = load(shop_client, {'url': price_list})
+
+    assert job['state'] == 'done'
+    assert job['rows_processed'] == len(price_list_data['goods'])
+    assert (job['inserted'], job['updated'], job['unchanged'], job['removed']) == \
+        (len(price_list_data['goods']), 0, 0, 0)
+    assert job['errors'] == []
+
+    shop = Shop.objects.get(user=shop_client.user)
+    assert job['shop'] == shop.id
+    assert shop.name == price_list_data['shop']
+    assert set(shop.categories.values_list('id', flat=True)) == {item['id'] for item in price_list_data['categories']}
+    assert ProductInfo.objects.filter(shop=shop).count() == len(price_list_data['goods'])
+    assert ProductParameter.objects.filter(product_info__shop=shop).count() == \
+        sum(len(item['parameters']) for item in price_list_data['goods'])
+
+    item = price_list_data['goods'][0]
+    product_info = ProductInfo.objects.get(shop=shop, external_id=item['id'])
+    assert product_info.product.name == item['name']
+    assert product_info.product.category_id == item['category']
+    assert product_info.price == item['price']
+    assert {parameter.parameter.name: parameter.value for parameter in product_info.product_parameters.all()} == \
+        {name: str(value) for name, value in item['parameters'].items()}
+
+
+# повторная загрузка не создаёт дублей справочников
+@pytest.mark.django_db
+def test_partner_load_repeat(shop_client, price_list, price_list_data):
+    load(shop_client, {'url': price_list})
+    load(shop_client, {'url': price_list, 'mode': 'replace'})
+
+    assert Category.objects.count() == len(price_list_data['categories'])
+    assert Product.objects.count() == len({item['name'] for item in price_list_data['goods']})
+    assert ProductInfo.objects.count() == len(price_list_data['goods'])
+
+
+# повторная загрузка того же файла не ставится в очередь
+@pytest.mark.django_db
+def test_partner_load_not_modified(shop_client, price_list):
+    load(shop_client, {'url': price_list})
+    response = shop_client.post(reverse('backend:partner-load'), {'url': price_list})
+
+    assert response.status_code == HTTP_200_OK
+    assert response.json() == {'Status': True, 'Modified': False}
+    assert ImportJob.objects.count() == 1
+
+
+# строки с неизменившимся хешем не перечитываются и не перезаписываются
+@pytest.mark.django_db
+def test_partner_load_row_hash(shop_client, price_list_data):
+    load(shop_client, price_list_data)
+    data = copy.deepcopy(price_list_data)
+    data['goods'][0]['quantity'] += 1
+
+    response = shop_client.post(reverse('backend:partner-load'), {'url': yaml.dump(data, allow_unicode=True)})
+    with CaptureQueriesContext(connection) as context:
+        run_pending()
+    job = ImportJob.objects.get(id=response.json()['Job'])
+
+    assert (job.updated, job.unchanged) == (1, len(data['goods']) - 1)
+    parameter_queries = [query['sql'] for query in context.captured_queries
+                         if 'FROM "backend_productparameter"' in query['sql']]
+    assert len(parameter_queries) == 1
+    assert ProductInfo.objects.filter(row_hash='').count() == 0
+
+
+# количество запросов к БД не зависит от числа товаров
+@pytest.mark.django_db
+def test_partner_load_query_count_flat(shop_client, price_list_data):
+    load_queries(shop_client, price_list_data)
+    small = load_queries(shop_client, scale_price_list(5, price_list_data))
+    large = load_queries(shop_client, scale_price_list(200, price_list_data, start=5))
+
+    assert large == small
+    assert ProductInfo.objects.count() == 200
+
+
+# неуспешная загрузка прайса покупателем
+@pytest.mark.django_db
+def test_partner_load_not_shop(api_client, price_list):
+    user = baker.make('backend.User', email='buyer@test.com')
+    api_client.force_authenticate(user=user)
+    response = api_client.post(reverse('backend:partner-load'), {'url': price_list})
+
+    assert response.status_code == HTTP_403_FORBIDDEN
+    assert response.json()['Error'] == 'Access denied! Available only for shops.'
+
+
+# успешная загрузка прайса файлом
+@pytest.mark.django_db
+def test_partner_load_file(shop_client, price_list, price_list_data):
+    file = SimpleUploadedFile('shop1.yaml', price_list.encode('utf-8'))
+    response = shop_client.post(reverse('backend:partner-load'), {'file': file}, format='multipart')
+
+    assert response.status_code == HTTP_202_ACCEPTED
+    call_command('import_worker', once=True)
+
+    assert ImportJob.objects.get(id=response.json()['Job']).state == 'done'
+    assert ProductInfo.objects.count() == len(price_list_data['goods'])
+
+
+# загрузка прайса в CSV даёт тот же результат, что и YAML
+@pytest.mark.django_db
+def test_partner_load_csv(shop_client, tmp_path):
+    write_csv(tmp_path / 'shop1.csv', 5)
+    file = SimpleUploadedFile('shop1.csv', (tmp_path / 'shop1.csv').read_bytes(), content_type='text/csv')
+    response = shop_client.post(reverse('backend:partner-load'), {'file': file}, format='multipart')
+    run_pending()
+
+    job = ImportJob.objects.get(id=response.json()['Job'])
+    assert (job.format, job.state, job.inserted) == ('csv', 'done', 5)
+
+    item = next(iter_goods(5))
+    product_info = ProductInfo.objects.get(external_id=item['id'])
+    assert product_info.price == item['price']
+    assert product_info.product.category_id == item['category']
+    assert {parameter.parameter.name: parameter.value for parameter in product_info.product_parameters.all()} == \
+        {name: str(value) for name, value in item['parameters'].items()}
+
+
+# неподдерживаемый формат прайса
+@pytest.mark.django_db
+def test_partner_load_unknown_format(shop_client, price_list):
+    response = shop_client.post(reverse('backend:partner-load'), {'url': price_list, 'format': 'xml'})
+
+    assert response.json()['Status'] is False
+    assert ImportJob.objects.count() == 0
+
+
+# неуспешная загрузка некорректного прайса
+@pytest.mark.django_db
+def test_partner_load_incorrect_file(shop_client):
+    job = load(shop_client, {'url': '- 1\n- 2\n'})
+
+    assert job['state'] == 'failed'
+    assert job['errors'][0].startswith('PriceListFormatError')
+
+
+# все ошибки прайса собираются до записи и возвращаются с номерами строк
+@pytest.mark.django_db
+def test_partner_load_validation(shop_client, price_list, price_list_data):
+    load(shop_client, {'url': price_list})
+    ids = set(ProductInfo.objects.values_list('id', flat=True))
+
+    data = copy.deepcopy(price_list_data)
+    data['goods'][0]['price'] = 'дорого'
+    data['goods'][1]['category'] = 999999
+    data['goods'][2]['id'] = data['goods'][0]['id']
+    del data['goods'][3]['quantity']
+    job = load(shop_client, {'url': yaml.dump(data, allow_unicode=True), 'mode': 'replace'})
+
+    assert job['state'] == 'failed'
+    assert [error.split(':')[0] for error in job['errors']] == ['Row 1', 'Row 2', 'Row 3', 'Row 4']
+    assert 'unknown category 999999' in job['errors'][1]
+    assert 'first seen in row 1' in job['errors'][2]
+    assert set(ProductInfo.objects.values_list('id', flat=True)) == ids
+
+
+# пробная загрузка возвращает план изменений и ничего не записывает
+@pytest.mark.django_db
+def test_partner_load_dry_run(shop_client, price_list, price_list_data):
+    load(shop_client, {'url': price_list})
+    prices = dict(ProductInfo.objects.values_list('id', 'price'))
+
+    data = copy.deepcopy(price_list_data)
+    data['goods'][0]['price'] += 1000
+    data['goods'].pop()
+    data['goods'].append(dict(data['goods'][1], id=1))
+    response = shop_client.post(reverse('backend:partner-load') + '?dry_run=1',
+                                {'url': yaml.dump(data, allow_unicode=True)})
+
+    assert response.status_code == HTTP_200_OK
+    assert response.json() == {'Status': True, 'DryRun': True, 'Rows': len(data['goods']), 'Inserted': 1,
+                               'Updated': 1, 'Unchanged': len(data['goods']) - 2, 'Removed': 1, 'Errors': []}
+    assert ImportJob.objects.count() == 1
+    assert dict(ProductInfo.objects.values_list('id', 'price')) == prices
+
+
+# пробная загрузка некорректного прайса
+@pytest.mark.django_db
+def test_partner_load_dry_run_errors(shop_client, price_list_data):
+    price_list_data['goods'][0]['parameters'] = ['Цвет']
+    response = shop_client.post(reverse('backend:partner-load') + '?dry_run=1',
+                                {'url': yaml.dump(price_list_data, allow_unicode=True)})
+
+    response_json = response.json()
+    assert response_json['Status'] is False
+    assert response_json['Inserted'] == len(price_list_data['goods']) - 1
+    assert response_json['Errors'] == ['Row 1: parameters: mapping is required.']
+    assert ImportJob.objects.count() == 0
+
+
+# дробные и логические значения целочисленных полей - ошибка, а не молчаливое приведение к int
+@pytest.mark.django_db
+def test_partner_load_dry_run_integers(shop_client, price_list_data):
+    price_list_data['goods'][0]['price'] = 1.7
+    price_list_data['goods'][1]['quantity'] = True
+    price_list_data['goods'][2]['price_rrc'] = 2.0
+    response = shop_client.post(reverse('backend:partner-load') + '?dry_run=1',
+                                {'url': yaml.dump(price_list_data, allow_unicode=True)})
+
+    assert response.json()['Errors'] == ['Row 1: price: “1.7” value must be an integer.',
+                                         'Row 2: quantity: “True” value must be an integer.']
+
+
+# испорченный файл в пробной загрузке - ошибка формата вместо 500, ни одной задачи
+@pytest.mark.django_db
+@pytest.mark.parametrize('content, format_name, error', [
+    ('shop: [Связной\n', 'yaml', 'Price list is not readable: '),
+    ('shop: Связной\ncategories: []\ngoods:\n  - id: 1\n  - {name: [\n', 'yaml', 'File: Price list is not readable: '),
+    ('{"shop": "Связной", "categories": []}\n{"id": 1\n', 'ndjson', 'File: Line 2: '),
+])
+def test_partner_load_dry_run_malformed(shop_client, content, format_name, error):
+    response = shop_client.post(reverse('backend:partner-load') + '?dry_run=1',
+                                {'url': content, 'format': format_name})
+
+    assert response.status_code == HTTP_200_OK
+    response_json = response.json()
+    assert response_json['Status'] is False
+    assert response_json['Errors'][-1].startswith(error)
+    assert ImportJob.objects.count() == 0
+
+
+def abandoned_job(client, price_list, attempts, minutes):
+    # задача, которую обработчик захватил и перестал обновлять пульс minutes минут назад
+    response = client.post(reverse('backend:partner-load'), {'url': price_list})
+    started = timezone.now() - timedelta(minutes=minutes)
+    ImportJob.objects.filter(id=response.json()['Job']).update(state='running', started_at=started,
+                                                               heartbeat_at=started, attempts=attempts)
+    return response.json()['Job']
+
+
+# задача упавшего обработчика возвращается в очередь и выполняется заново; живая задача не трогается
+@pytest.mark.django_db
+def test_partner_load_abandoned_requeued(shop_client, price_list, price_list_data, settings):
+    settings.IMPORT_JOB_TIMEOUT = 300
+    abandoned = abandoned_job(shop_client, price_list, attempts=1, minutes=10)
+
+    assert run_pending() == 1
+    job = ImportJob.objects.get(id=abandoned)
+    assert job.state == 'done' and job.attempts == 2
+    assert ProductInfo.objects.count() == len(price_list_data['goods'])
+
+    data = copy.deepcopy(price_list_data)
+    data['goods'][0]['price'] += 1
+    alive = abandoned_job(shop_client, yaml.dump(data, allow_unicode=True), attempts=1, minutes=1)
+    assert run_pending() == 0
+    assert ImportJob.objects.get(id=alive).state == 'running'
+
+
+# после исчерпания попыток брошенная задача завершается ошибкой
+@pytest.mark.django_db
+def test_partner_load_abandoned_failed(shop_client, price_list, settings):
+    settings.IMPORT_JOB_ATTEMPTS = 3
+    abandoned = abandoned_job(shop_client, price_list, attempts=3, minutes=10)
+
+    assert requeue_stale_jobs() == (0, 1)
+    response = shop_client.get(reverse('backend:partner-load-status', args=[abandoned])).json()
+    assert response['state'] == 'failed'
+    assert response['errors'] == ['Import worker stopped responding.']
+    assert ProductInfo.objects.count() == 0
+
+
+# пульс обновляется во время импорта
+@pytest.mark.django_db(transaction=True)
+def test_partner_load_heartbeat(shop_client, price_list):
+    job_id = abandoned_job(shop_client, price_list, attempts=1, minutes=1)
+    reporter = ProgressReporter(job_id, 0.01)
+    reporter.start()
+    time.sleep(0.1)
+    reporter.stop()
+
+    assert ImportJob.objects.get(id=job_id).heartbeat_at > timezone.now() - timedelta(seconds=5)
+
+
+# состояние чужой загрузки недоступно
+@pytest.mark.django_db
+def test_partner_load_status_foreign(shop_client):
+    job = baker.make(ImportJob, user=baker.make('backend.User', type='shop'))
+    response = shop_client.get(reverse('backend:partner-load-status', args=[job.id]))
+
+    assert response.status_code == HTTP_404_NOT_FOUND
+    assert response.json()['Status'] is False
+
+
+# повторная загрузка обновляет только изменившиеся предложения и сохраняет их идентификаторы
+@pytest.mark.django_db
+def test_partner_load_upsert(shop_client, price_list, price_list_data):
+    load(shop_client, {'url': price_list})
+    ids = dict(ProductInfo.objects.values_list('external_id', 'id'))
+
+    data = copy.deepcopy(price_list_data)
+    data['goods'][0]['price'] += 1000
+    data['goods'][1]['parameters']['Цвет'] = 'белый'
+    vanished = data['goods'].pop()
+    job = load(shop_client, data)
+
+    assert (job['inserted'], job['updated'], job['unchanged'], job['removed']) == \
+        (0, 2, len(data['goods']) - 2, 1)
+    assert dict(ProductInfo.objects.values_list('external_id', 'id')) == \
+        {external_id: product_info_id for external_id, product_info_id in ids.items()
+         if external_id != vanished['id']}
+    assert ProductInfo.objects.get(external_id=data['goods'][0]['id']).price == data['goods'][0]['price']
+    assert ProductParameter.objects.get(product_info__external_id=data['goods'][1]['id'],
+                                        parameter__name='Цвет').value == 'белый'
+
+
+# пропавшее из прайса предложение в корзине покупателя обнуляется, а не удаляется
+@pytest.mark.django_db
+def test_partner_load_upsert_keeps_ordered(shop_client, price_list, price_list_data):
+    load(shop_client, {'url': price_list})
+
+    vanished = price_list_data['goods'].pop()
+    product_info = ProductInfo.objects.get(external_id=vanished['id'])
+    basket = baker.make(Order, user=baker.make('backend.User'), state='basket')
+    OrderItem.objects.create(order=basket, product_info=product_info, quantity=1)
+
+    job = load(shop_client, price_list_data)
+
+    assert job['removed'] == 1
+    product_info.refresh_from_db()
+    assert product_info.quantity == 0
+    assert basket.ordered_items.count() == 1
+
+    # уже обнулённое предложение повторная загрузка не трогает и в удалённых не считает
+    data = copy.deepcopy(price_list_data)
+    data['goods'][0]['price'] += 1000
+    plan = shop_client.post(reverse('backend:partner-load') + '?dry_run=1',
+                            {'url': yaml.dump(data, allow_unicode=True)}).json()
+    job = load(shop_client, data)
+    assert (plan['Updated'], plan['Removed']) == (job['updated'], job['removed']) == (1, 0)
+
+
+# полная замена прайса
+@pytest.mark.django_db
+def test_partner_load_replace(shop_client, price_list, price_list_data):
+    load(shop_client, {'url': price_list})
+    ids = set(ProductInfo.objects.values_list('id', flat=True))
+
+    job = load(shop_client, {'url': price_list, 'mode': 'replace'})
+
+    assert job['inserted'] == len(price_list_data['goods'])
+    assert ids.isdisjoint(ProductInfo.objects.values_list('id', flat=True))
+
+
+# неизвестный режим загрузки
+@pytest.mark.django_db
+def test_partner_load_unknown_mode(shop_client, price_list):
+    response = shop_client.post(reverse('backend:partner-load'), {'url': price_list, 'mode': 'merge'})
+
+    assert response.status_code == HTTP_200_OK
+    assert response.json()['Status'] is False
+    assert ImportJob.objects.count() == 0
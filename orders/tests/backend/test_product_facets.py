@@ -0,0 +1,85 @@
+import copy
+from collections import Counter
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework.status import HTTP_200_OK
+
+from backend.importer import import_price_list
+from backend.models import CatalogueItem, ProductParameter, Shop
+
+
+@pytest.fixture
+def shops(price_list_data):
+    # два магазина: второй продаёт только первые два товара
+    import_price_list(price_list_data, baker.make('backend.User', type='shop').id)
+    import_price_list(dict(price_list_data, shop='Другой магазин', goods=price_list_data['goods'][:2]),
+                      baker.make('backend.User', type='shop').id)
+    return list(Shop.objects.order_by('id'))
+
+
+def facets(client, params=None):
+    response = client.get(reverse('backend:product-view-facets'), params or {})
+    assert response.status_code == HTTP_200_OK
+    return response.json()
+
+
+def parameter_counts(data):
+    return {(parameter['parameter'], value['value']): value['count']
+            for parameter in data['parameters'] for value in parameter['values']}
+
+
+# счётчики совпадают с подсчётом по строкам каталога
+@pytest.mark.django_db
+def test_product_facets(api_client, shops):
+    data = facets(api_client)
+
+    assert {row['id']: row['count'] for row in data['shops']} == \
+        dict(Counter(CatalogueItem.objects.values_list('shop_id', flat=True)))
+    assert {row['id']: row['count'] for row in data['categories']} == \
+        dict(Counter(CatalogueItem.objects.values_list('category_id', flat=True)))
+    assert parameter_counts(data) == \
+        dict(Counter(ProductParameter.objects.values_list('parameter__name', 'value')))
+    diagonal = next(parameter for parameter in data['parameters'] if parameter['parameter'] == 'Диагональ (дюйм)')
+    assert diagonal['min'] == 6.1 and diagonal['max'] == 6.5
+
+
+# счётчики считаются по текущему набору фильтров
+@pytest.mark.django_db
+def test_product_facets_filters(api_client, shops):
+    data = facets(api_client, {'shop_id': shops[1].id, 'parameter__Диагональ (дюйм)__lt': '6.2'})
+    offers = CatalogueItem.objects.filter(shop=shops[1], product_info__product_parameters__numeric_value__lt=6.2,
+                                          product_info__product_parameters__parameter__name='Диагональ (дюйм)')
+
+    assert data['shops'] == [{'id': shops[1].id, 'name': shops[1].name, 'count': 1}] and offers.count() == 1
+    assert parameter_counts(data) == dict(Counter(ProductParameter.objects.filter(
+        product_info__in=offers.values('pk')).values_list('parameter__name', 'value')))
+
+    searched = facets(api_client, {'search': 'смартфоны'})
+    assert sum(row['count'] for row in searched['shops']) == CatalogueItem.objects.count()
+
+
+# повторный запрос с тем же набором фильтров в другом порядке и с другой страницей берётся из кеша
+@pytest.mark.django_db
+def test_product_facets_cache(api_client, shops):
+    data = facets(api_client, {'shop_id': shops[0].id, 'category_id': 224})
+    with CaptureQueriesContext(connection) as context:
+        cached = facets(api_client, {'category_id': 224, 'shop_id': shops[0].id, 'cursor': 'x'})
+
+    assert cached == data
+    assert len(context.captured_queries) == 0
+
+
+# повторная загрузка прайса сбрасывает кеш
+@pytest.mark.django_db(transaction=True)
+def test_product_facets_reimport(api_client, shops, price_list_data):
+    before = facets(api_client, {'shop_id': shops[1].id})
+    data = copy.deepcopy(price_list_data)
+    import_price_list(dict(data, shop='Другой магазин', goods=data['goods'][:1]), shops[1].user_id)
+
+    after = facets(api_client, {'shop_id': shops[1].id})
+    assert before['shops'][0]['count'] == 2
+    assert after['shops'][0]['count'] == 1
@@ -0,0 +1,227 @@
+import pytest
+from django.db import connection
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST, HTTP_404_NOT_FOUND
+
+from backend.importer import import_price_list
+from backend.models import CatalogueItem, ProductInfo, ProductParameter, Shop
+from backend.search import search_products
+from tests.samples import iter_goods, load_sample
+
+
+@pytest.fixture
+def catalogue():
+    # два магазина по 7 предложений с повторяющимися ценами
+    sample = load_sample()
+    for number in range(2):
+        goods = list(iter_goods(7, sample))
+        for index, item in enumerate(goods):
+            item['price'] = 1000 * (index % 3)
+        import_price_list(dict(sample, shop=f'Магазин {number}', goods=goods),
+                          baker.make('backend.User', type='shop').id)
+
+
+def walk(client, params, link='next'):
+    # обход всех страниц по ссылкам пагинации, начиная со списка с параметрами params или со ссылки
+    if isinstance(params, str):
+        response = client.get(params)
+    else:
+        response = client.get(reverse('backend:product-view-list'), params)
+    pages = []
+    while True:
+        assert response.status_code == HTTP_200_OK
+        pages.append(response.json())
+        if not pages[-1][link]:
+            return pages
+        response = client.get(pages[-1][link])
+
+
+# постраничный обход по идентификатору без пропусков и повторов
+@pytest.mark.django_db
+def test_product_list_pages(api_client, catalogue):
+    pages = walk(api_client, {'page_size': 3})
+
+    assert [len(page['results']) for page in pages] == [3, 3, 3, 3, 2]
+    assert [item['id'] for page in pages for item in page['results']] == \
+        list(ProductInfo.objects.order_by('id').values_list('id', flat=True))
+    assert pages[0]['previous'] is None
+
+
+# сортировка по цене с одинаковыми ценами и обход назад по ссылкам previous
+@pytest.mark.django_db
+@pytest.mark.parametrize('ordering', ['price', '-price'])
+def test_product_list_price_ordering(api_client, catalogue, ordering):
+    pages = walk(api_client, {'page_size': 4, 'ordering': ordering})
+    expected = list(ProductInfo.objects.order_by(ordering, ordering.replace('price', 'id')).values_list(
+        'id', flat=True))
+
+    assert [item['id'] for page in pages for item in page['results']] == expected
+
+    backward = walk(api_client, pages[-1]['previous'], link='previous')
+    assert [item['id'] for page in reversed(backward) for item in page['results']] == expected[:-2]
+
+
+# фильтр по магазину и поиск работают вместе с курсором
+@pytest.mark.django_db
+def test_product_list_filters(api_client, catalogue):
+    shop = Shop.objects.get(name='Магазин 1')
+    pages = walk(api_client, {'page_size': 2, 'shop_id': shop.id, 'search': '#1'})
+
+    assert sorted(item['id'] for page in pages for item in page['results']) == \
+        list(ProductInfo.objects.filter(shop=shop, product__name__contains='#1').order_by('id').values_list(
+            'id', flat=True))
+
+
+# дальняя страница не использует OFFSET и COUNT(*)
+@pytest.mark.django_db
+def test_product_list_no_offset(api_client, catalogue):
+    pages = walk(api_client, {'page_size': 2})
+    with CaptureQueriesContext(connection) as context:
+        api_client.get(pages[-2]['next'])
+
+    sql = ' '.join(query['sql'] for query in context.captured_queries).upper()
+    assert 'OFFSET' not in sql
+    assert 'COUNT(' not in sql
+
+
+# некорректный курсор
+@pytest.mark.django_db
+def test_product_list_invalid_cursor(api_client, catalogue):
+    response = api_client.get(reverse('backend:product-view-list'), {'cursor': 'not-a-cursor'})
+
+    assert response.status_code == HTTP_404_NOT_FOUND
+
+
+# поиск учитывает морфологию и слова модели, сначала идут более релевантные строки
+@pytest.mark.django_db
+@pytest.mark.parametrize('search, count', [('смартфоны', 14), ('iphone xr', 10), ('xs-max', 4), ('планшет', 0)])
+def test_product_list_search(api_client, catalogue, search, count):
+    pages = walk(api_client, {'page_size': 3, 'search': search})
+    results = [item for page in pages for item in page['results']]
+
+    assert len(results) == count
+    assert len({item['id'] for item in results}) == count
+
+
+# по умолчанию результаты поиска идут по убыванию релевантности, курсор сохраняет этот порядок
+@pytest.mark.django_db
+def test_product_list_search_rank(api_client, catalogue):
+    item = CatalogueItem.objects.order_by('pk').last()
+    item.product_name = 'Смартфон смартфон Apple'
+    item.save()
+    pages = walk(api_client, {'page_size': 3, 'search': 'смартфон'})
+
+    assert [row['id'] for page in pages for row in page['results']] == list(
+        search_products(CatalogueItem.objects.all(), 'смартфон').order_by('-search_rank', 'pk').values_list(
+            'pk', flat=True))
+    assert pages[0]['results'][0]['id'] == item.pk
+
+
+# запрос поиска использует GIN-индекс по выражению из миграции
+@pytest.mark.django_db
+def test_product_list_search_index():
+    with connection.cursor() as cursor:
+        cursor.execute('SET enable_seqscan = off')
+    plan = search_products(CatalogueItem.objects.all(), 'смартфон').explain()
+
+    assert 'catalogue_search' in plan
+
+
+def filtered_ids(client, params):
+    return sorted(item['id'] for page in walk(client, params) for item in page['results'])
+
+
+def parameter_ids(**values):
+    # предложения, у которых значение параметра удовлетворяет условию
+    return sorted(ProductInfo.objects.filter(
+        product_parameters__parameter__name=values.pop('name'), **values).values_list('id', flat=True))
+
+
+# фильтры по характеристикам: равенство, несколько значений, диапазон и их сочетание
+@pytest.mark.django_db
+def test_product_list_parameter_filters(api_client, catalogue):
+    assert filtered_ids(api_client, {'parameter__Цвет': 'красный'}) == \
+        parameter_ids(name='Цвет', product_parameters__value='красный')
+    assert filtered_ids(api_client, {'parameter__Цвет': ['красный', 'синий']}) == \
+        parameter_ids(name='Цвет', product_parameters__value__in=['красный', 'синий'])
+    assert filtered_ids(api_client, {'parameter__Встроенная память (Гб)__gte': '300'}) == \
+        parameter_ids(name='Встроенная память (Гб)', product_parameters__value='512')
+    assert filtered_ids(api_client, {'parameter__Диагональ (дюйм)__gt': '6', 'parameter__Диагональ (дюйм)__lte': '6,2',
+                                     'parameter__Цвет': 'черный'}) == \
+        parameter_ids(name='Цвет', product_parameters__value='черный')
+    assert filtered_ids(api_client, {'parameter__Встроенная память (Гб)': '256.0'}) == \
+        parameter_ids(name='Встроенная память (Гб)', product_parameters__value='256')
+    assert filtered_ids(api_client, {'parameter__Цвет': 'белый'}) == []
+
+
+# диапазон по нечисловому значению
+@pytest.mark.django_db
+def test_product_list_parameter_filters_invalid(api_client, catalogue):
+    response = api_client.get(reverse('backend:product-view-list'), {'parameter__Диагональ (дюйм)__gte': 'шесть'})
+
+    assert response.status_code == HTTP_400_BAD_REQUEST
+
+
+# числовое значение ведётся импортом и сохранением параметра
+@pytest.mark.django_db
+def test_product_parameter_numeric_value(catalogue):
+    values = dict(ProductParameter.objects.values_list('value', 'numeric_value'))
+    assert values['6.5'] == 6.5 and values['512'] == 512 and values['красный'] is None
+
+    product_parameter = ProductParameter.objects.filter(value='512').first()
+    product_parameter.value = '1024'
+    product_parameter.save()
+    product_parameter.refresh_from_db()
+    assert product_parameter.numeric_value == 1024
+
+
+# сортировка по рекомендуемой цене и количеству с обходом по курсору
+@pytest.mark.django_db
+@pytest.mark.parametrize('ordering', ['price_rrc', '-price_rrc', 'quantity', '-quantity'])
+def test_product_list_more_orderings(api_client, catalogue, ordering):
+    pages = walk(api_client, {'page_size': 4, 'ordering': ordering, 'fields': 'id'})
+
+    tie = '-id' if ordering.startswith('-') else 'id'
+    assert [item['id'] for page in pages for item in page['results']] == \
+        list(ProductInfo.objects.order_by(ordering, tie).values_list('id', flat=True))
+
+
+# "самые дешёвые в наличии в категории": фильтры наличия и диапазона цен
+@pytest.mark.django_db
+def test_product_list_in_stock(api_client, catalogue):
+    ProductInfo.objects.filter(id__in=ProductInfo.objects.order_by('id').values('id')[:5]).update(quantity=0)
+    CatalogueItem.objects.filter(pk__in=ProductInfo.objects.filter(quantity=0).values('id')).update(quantity=0)
+    pages = walk(api_client, {'page_size': 3, 'ordering': 'price', 'category_id': 224, 'in_stock': 1,
+                              'price_min': 1000, 'price_max': 1000})
+
+    assert [item['id'] for page in pages for item in page['results']] == list(ProductInfo.objects.filter(
+        product__category_id=224, quantity__gt=0, price=1000).order_by('price', 'id').values_list('id', flat=True))
+    assert api_client.get(reverse('backend:product-view-list'), {'price_min': 'дёшево'}).status_code == \
+        HTTP_400_BAD_REQUEST
+
+
+# запросы с фильтром наличия подходят под частичные индексы: условие индекса, равенство по ведущей колонке
+# и сортировка по остальным колонкам. Проверяется сам запрос, а не выбор планировщика на почти пустой таблице
+@pytest.mark.django_db
+@pytest.mark.parametrize('params, name', [
+    ({'category_id': 224, 'in_stock': 1, 'ordering': 'price'}, 'catalogue_stock_category'),
+    ({'shop_id': 1, 'in_stock': 1, 'ordering': '-price'}, 'catalogue_stock_shop'),
+    ({'in_stock': 1, 'ordering': 'price', 'price_min': 1000}, 'catalogue_stock_price'),
+])
+def test_product_list_in_stock_index(api_client, params, name):
+    with CaptureQueriesContext(connection) as context:
+        api_client.get(reverse('backend:product-view-list'), params)
+        sql = context.captured_queries[-1]['sql']
+    index = next(index for index in CatalogueItem._meta.indexes if index.name == name)
+    table = CatalogueItem._meta.db_table
+    columns = [f'"{table}"."{CatalogueItem._meta.get_field(field).column}"' for field in index.fields]
+    where, _, order = sql.partition(' ORDER BY ')
+    direction = 'DESC' if params['ordering'].startswith('-') else 'ASC'
+
+    assert index.condition == Q(quantity__gt=0) and f'"{table}"."quantity" > 0' in where
+    for column in columns[:-2]:
+        assert f'{column} = ' in where
+    assert order.startswith(', '.join(f'{column} {direction}' for column in columns[-2:]))
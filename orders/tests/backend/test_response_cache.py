@@ -0,0 +1,229 @@
+import copy
+import io
+import multiprocessing
+
+import pytest
+import yaml
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.status import HTTP_200_OK, HTTP_304_NOT_MODIFIED, HTTP_404_NOT_FOUND
+
+from backend.cache import cache_stats
+from backend.importer import import_price_list
+from backend.jobs import enqueue_import
+from backend.models import Category, ImportJob, Shop
+
+SHARED_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'shared-test'},
+    'catalogue': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'backend_cache'},
+}
+
+# соединения родительского процесса: закрытие их в дочернем процессе оборвало бы сессию родителя
+inherited_connections = []
+
+
+# повторный запрос отдаётся из кеша без обращений к БД, другие параметры - отдельная запись
+@pytest.mark.django_db
+@pytest.mark.parametrize('name', ['backend:category-view-list', 'backend:shop-view-list',
+                                  'backend:product-view-list'])
+def test_response_cache(api_client, shop, name):
+    first = api_client.get(reverse(name), {'search': 'a'})
+    with CaptureQueriesContext(connection) as context:
+        second = api_client.get(reverse(name), {'search': 'a'})
+
+    assert first['X-Cache'] == 'MISS' and second['X-Cache'] == 'HIT'
+    assert second.json() == first.json()
+    assert len(context.captured_queries) == 0
+    assert api_client.get(reverse(name))['X-Cache'] == 'MISS'
+
+
+# детальный просмотр тоже кешируется
+@pytest.mark.django_db
+def test_response_cache_retrieve(api_client, shop):
+    url = reverse('backend:shop-view-detail', args=[shop.id])
+
+    assert api_client.get(url)['X-Cache'] == 'MISS'
+    assert api_client.get(url)['X-Cache'] == 'HIT'
+
+
+# загрузка прайса и отключение магазина меняют версию каталога и сбрасывают кеш
+@pytest.mark.django_db(transaction=True)
+def test_response_cache_invalidation(api_client, shop, price_list_data):
+    url = reverse('backend:product-view-list')
+    before = api_client.get(url).json()['results']
+
+    data = copy.deepcopy(price_list_data)
+    data['goods'][0]['price'] += 1000
+    import_price_list(data, shop.user_id)
+    response = api_client.get(url)
+    assert response['X-Cache'] == 'MISS'
+    assert response.json()['results'][0]['price'] == before[0]['price'] + 1000
+
+    assert len(api_client.get(reverse('backend:shop-view-list')).json()) == 1
+    shop.state = False
+    shop.save()
+    assert api_client.get(reverse('backend:shop-view-list')).json() == []
+    assert api_client.get(url).json()['results'] == []
+
+
+
+# изменение любого поля из ответа shop/, создание и удаление магазинов и категорий тоже сбрасывают кеш
+@pytest.mark.django_db(transaction=True)
+def test_response_cache_shop_and_category_changes(api_client, shop):
+    shops, categories = reverse('backend:shop-view-list'), reverse('backend:category-view-list')
+    api_client.get(shops), api_client.get(categories)
+
+    shop.url = 'http://example.com/shop.yaml'
+    shop.save(update_fields=['url'])
+    assert api_client.get(shops).json()[0]['url'] == shop.url
+
+    other = Shop.objects.create(name='Другой', state=True)
+    category = Category.objects.create(id=999, name='Новая')
+    assert {row['id'] for row in api_client.get(shops).json()} == {shop.id, other.id}
+    assert category.id in {row['id'] for row in api_client.get(categories).json()}
+
+    other.delete()
+    category.delete()
+    assert [row['id'] for row in api_client.get(shops).json()] == [shop.id]
+    assert category.id not in {row['id'] for row in api_client.get(categories).json()}
+
+    # служебные поля, которых нет в ответе, кеш не сбрасывают
+    shop.feed_etag = '"new"'
+    shop.save(update_fields=['feed_etag'])
+    assert api_client.get(shops)['X-Cache'] == 'HIT'
+
+# доля попаданий доступна в статистике и через команду управления
+@pytest.mark.django_db
+def test_response_cache_stats(settings, api_client, shop):
+    settings.CACHE_STATS_FLUSH_EVERY = 1
+    for _ in range(4):
+        api_client.get(reverse('backend:category-view-list'))
+
+    assert cache_stats() == {'hits': 3, 'misses': 1, 'ratio': 0.75}
+    output = io.StringIO()
+    call_command('cache_stats', stdout=output)
+    assert 'hit ratio: 75.0%' in output.getvalue()
+
+
+# с общим хранилищем в БД попадание стоит одного чтения версии, счётчики копятся в процессе без записей
+@pytest.mark.django_db
+def test_response_cache_hit_queries(settings, api_client, shop):
+    settings.CACHES = SHARED_CACHES
+    for alias in SHARED_CACHES:
+        caches[alias].clear()
+    url = reverse('backend:category-view-list')
+    api_client.get(url)
+
+    with CaptureQueriesContext(connection) as context:
+        for _ in range(3):
+            assert api_client.get(url)['X-Cache'] == 'HIT'
+
+    assert len(context.captured_queries) == 3
+    assert all(query['sql'].startswith('SELECT') for query in context.captured_queries)
+    assert cache_stats()['hits'] == 0
+
+
+# совпавший ETag или неизменившийся каталог - 304 без тела и без обращений к БД
+@pytest.mark.django_db
+@pytest.mark.parametrize('name', ['backend:category-view-list', 'backend:shop-view-list',
+                                  'backend:product-view-list'])
+def test_conditional_get(api_client, shop, name):
+    response = api_client.get(reverse(name))
+    etag, last_modified = response['ETag'], response['Last-Modified']
+    assert etag.startswith('"') and not etag.startswith('W/')
+
+    with CaptureQueriesContext(connection) as context:
+        by_etag = api_client.get(reverse(name), HTTP_IF_NONE_MATCH=etag)
+        by_date = api_client.get(reverse(name), HTTP_IF_MODIFIED_SINCE=last_modified)
+
+    assert by_etag.status_code == by_date.status_code == HTTP_304_NOT_MODIFIED
+    assert by_etag.content == b'' and by_etag['ETag'] == etag
+    assert len(context.captured_queries) == 0
+    assert cache_stats()['hits'] == 0
+
+    other = api_client.get(reverse(name), {'search': 'a'}, HTTP_IF_NONE_MATCH=etag)
+    assert other.status_code == HTTP_200_OK and other['ETag'] != etag
+
+
+# ETag и дата списка не дают 304 для карточки: существующая отвечает 200, несуществующая - 404
+@pytest.mark.django_db
+def test_conditional_get_detail(api_client, shop):
+    response = api_client.get(reverse('backend:category-view-list'))
+    conditions = {'HTTP_IF_NONE_MATCH': response['ETag'], 'HTTP_IF_MODIFIED_SINCE': response['Last-Modified']}
+    category_id = response.json()[0]['id']
+
+    detail = api_client.get(reverse('backend:category-view-detail', args=[category_id]), **conditions)
+    assert detail.status_code == HTTP_200_OK and detail['ETag'] != response['ETag']
+    assert api_client.get(reverse('backend:category-view-detail', args=[99999]),
+                          **conditions).status_code == HTTP_404_NOT_FOUND
+    assert api_client.get(reverse('backend:category-view-detail', args=[99999]),
+                          HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code == HTTP_404_NOT_FOUND
+
+
+# после изменения каталога прежний ETag не совпадает
+@pytest.mark.django_db(transaction=True)
+def test_conditional_get_changed(api_client, shop, price_list_data):
+    url = reverse('backend:product-view-list')
+    etag = api_client.get(url)['ETag']
+
+    data = copy.deepcopy(price_list_data)
+    data['goods'][0]['price'] += 1000
+    import_price_list(data, shop.user_id)
+    response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    assert response.status_code == HTTP_200_OK
+    assert response['ETag'] != etag
+
+
+def run_worker():
+    # import_worker в отдельном процессе: свои соединения с БД и свой экземпляр кеша
+    for alias in connections:
+        inherited_connections.append(connections[alias].connection)
+        connections[alias].connection = None
+    call_command('import_worker', '--once', stdout=io.StringIO())
+
+
+# загрузка, выполненная обработчиком очереди в другом процессе, видна веб-процессу через общий кеш:
+# ответ и ETag меняются
+@pytest.mark.django_db(transaction=True)
+def test_response_cache_worker_import(settings, api_client, shop, price_list_data):
+    settings.CACHES = SHARED_CACHES
+    for alias in SHARED_CACHES:
+        caches[alias].clear()
+    url = reverse('backend:product-view-list')
+    before = api_client.get(url)
+    assert api_client.get(url)['X-Cache'] == 'HIT'
+
+    data = copy.deepcopy(price_list_data)
+    data['goods'][0]['price'] += 1000
+    job = enqueue_import(shop.user, yaml.safe_dump(data, allow_unicode=True))
+    worker = multiprocessing.get_context('fork').Process(target=run_worker)
+    worker.start()
+    worker.join()
+    assert worker.exitcode == 0
+    assert ImportJob.objects.get(id=job.id).state == 'done'
+
+    response = api_client.get(url, HTTP_IF_NONE_MATCH=before['ETag'])
+    assert response.status_code == HTTP_200_OK
+    assert response['X-Cache'] == 'MISS' and response['ETag'] != before['ETag']
+    assert response.json()['results'][0]['price'] == before.json()['results'][0]['price'] + 1000
+
+
+# после смены ссылки на фид прежний ETag списка магазинов не даёт 304, в ответе новая ссылка
+@pytest.mark.django_db(transaction=True)
+def test_conditional_get_feed_url(api_client, shop):
+    url = reverse('backend:shop-view-list')
+    etag = api_client.get(url)['ETag']
+    assert api_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == HTTP_304_NOT_MODIFIED
+
+    api_client.force_authenticate(shop.user)
+    assert api_client.post(reverse('backend:partner-feed'), {'url': 'http://example.com/shop.yaml'}).json() == \
+        {'Status': True}
+    response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    assert response.status_code == HTTP_200_OK
+    assert response['ETag'] != etag
+    assert response.json()[0]['url'] == 'http://example.com/shop.yaml'
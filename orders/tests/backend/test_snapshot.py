@@ -0,0 +1,154 @@
+import copy
+import gzip
+import json
+import os
+import time
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework.status import HTTP_200_OK, HTTP_304_NOT_MODIFIED, HTTP_404_NOT_FOUND
+
+from backend.cache import bump_catalogue_version, shared_cache
+from backend.importer import import_price_list
+from backend.models import Shop
+from backend.snapshots import build_if_stale, build_snapshot, choose_encoding, current_snapshot, schedule_snapshot, \
+    snapshot_is_current, snapshot_root, SnapshotBuilder, BUILD_LOCK_KEY
+
+
+def wait_for_snapshot():
+    # поток сборки запускается при фиксации загрузки и мог уже завершиться
+    builder = SnapshotBuilder.instance
+    if builder is not None:
+        builder.join()
+
+
+def download(client, encoding='gzip', **headers):
+    response = client.get(reverse('backend:product-view-snapshot'), HTTP_ACCEPT_ENCODING=encoding, **headers)
+    content = b''.join(response.streaming_content) if response.streaming else response.content
+    return response, content
+
+
+# снимок совпадает со списком product/ и отдаётся сжатым файлом без запросов к БД
+@pytest.mark.django_db
+def test_snapshot(api_client, shop):
+    version, rows = build_snapshot()
+    expected = api_client.get(reverse('backend:product-view-list'), {'page_size': 500}).json()['results']
+    assert rows == len(expected)
+
+    with CaptureQueriesContext(connection) as context:
+        response, content = download(api_client)
+        assert len(context.captured_queries) == 0
+    assert response.status_code == HTTP_200_OK
+    assert response['Content-Encoding'] == 'gzip' and response['Content-Type'] == 'application/json'
+    assert 'Accept-Encoding' in response['Vary']
+    assert json.loads(gzip.decompress(content)) == expected
+
+    response, content = download(api_client, encoding='identity')
+    assert not response.has_header('Content-Encoding')
+    assert json.loads(content) == expected
+
+
+# повторный запрос с ETag - 304, пересборка подменяет снимок целиком
+@pytest.mark.django_db
+def test_snapshot_rebuild(api_client, shop):
+    build_snapshot()
+    response, _ = download(api_client)
+    assert download(api_client, HTTP_IF_NONE_MATCH=response['ETag'])[0].status_code == HTTP_304_NOT_MODIFIED
+
+    shop.state = False
+    shop.save()
+    version, rows = build_snapshot()
+    build_snapshot()
+    response, content = download(api_client, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    assert rows == 0
+    assert response.status_code == HTTP_200_OK
+    assert json.loads(gzip.decompress(content)) == []
+    # хранятся только текущий и предыдущий снимки
+    assert sorted(name for name in os.listdir(snapshot_root()) if name.isdigit()) == \
+        sorted([version, current_snapshot()[0]])
+
+
+# снимка ещё нет
+@pytest.mark.django_db
+def test_snapshot_not_ready(api_client):
+    response, _ = download(api_client)
+
+    assert response.status_code == HTTP_404_NOT_FOUND
+    assert response.json()['Status'] is False
+
+
+# после загрузки прайса снимок собирается в фоне
+@pytest.mark.django_db(transaction=True)
+def test_snapshot_after_import(api_client, settings, price_list_data):
+    settings.SNAPSHOT_ON_IMPORT = True
+    import_price_list(price_list_data, baker.make('backend.User', type='shop').id)
+    wait_for_snapshot()
+
+    response, content = download(api_client)
+    assert len(json.loads(gzip.decompress(content))) == len(price_list_data['goods'])
+
+    data = copy.deepcopy(price_list_data)
+    data['goods'] = data['goods'][:1]
+    import_price_list(data, Shop.objects.get().user_id)
+    wait_for_snapshot()
+    assert len(json.loads(gzip.decompress(download(api_client)[1]))) == 1
+
+
+# каталоги прерванных сборок удаляются, когда сборка не могла бы идти так долго; идущая сборка не трогается
+@pytest.mark.django_db
+def test_snapshot_removes_interrupted_builds(settings, shop):
+    settings.SNAPSHOT_BUILD_TIMEOUT = 60
+    os.makedirs(snapshot_root())
+    interrupted, running = (f'{time.time_ns() - age * 10 ** 9}.tmp' for age in (120, 10))
+    for name in (interrupted, running):
+        os.makedirs(os.path.join(snapshot_root(), name))
+
+    build_snapshot()
+
+    assert not os.path.exists(os.path.join(snapshot_root(), interrupted))
+    assert os.path.exists(os.path.join(snapshot_root(), running))
+
+
+# сборка запускается, только если снимка текущей версии каталога ещё нет
+@pytest.mark.django_db
+def test_snapshot_schedule_current_version(settings, shop):
+    settings.SNAPSHOT_ON_IMPORT = True
+    build_snapshot()
+    assert snapshot_is_current()
+
+    schedule_snapshot()
+    assert SnapshotBuilder.instance is None
+
+    bump_catalogue_version()
+    assert not snapshot_is_current()
+    schedule_snapshot()
+    wait_for_snapshot()
+    assert snapshot_is_current()
+
+
+# пока снимок собирает другой процесс, своя сборка не начинается
+@pytest.mark.django_db
+def test_snapshot_build_lock(shop):
+    shared_cache().add(BUILD_LOCK_KEY, 1)
+    assert build_if_stale() is False
+    assert current_snapshot() is None
+
+    shared_cache().delete(BUILD_LOCK_KEY)
+    assert build_if_stale() is True
+    version = current_snapshot()[0]
+    assert build_if_stale() is True and current_snapshot()[0] == version
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('gzip, deflate', 'gzip'),
+    ('gzip;q=0, deflate', None),
+    ('', None),
+    ('*', 'gzip'),
+])
+def test_snapshot_choose_encoding(header, expected, monkeypatch):
+    monkeypatch.setattr('backend.snapshots.ENCODINGS', (('gzip', '.gz'),))
+    assert choose_encoding(header)[0] == expected
@@ -0,0 +1,81 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST
+
+from backend.models import CatalogueItem, Order, OrderItem, ProductInfo
+from backend.serializer import CatalogueItemSerializer, OrderSerializer
+
+
+def product_list(client, params):
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(reverse('backend:product-view-list'), params)
+    assert response.status_code == HTTP_200_OK
+    return response.json(), ' '.join(query['sql'] for query in context.captured_queries)
+
+
+# узкий список: только запрошенные поля в прежнем порядке и без лишних колонок в запросе
+@pytest.mark.django_db
+def test_product_list_fields(api_client, shop):
+    data, sql = product_list(api_client, {'fields': 'quantity,price,id'})
+    expected = CatalogueItemSerializer(CatalogueItem.objects.order_by('pk'), many=True).data
+
+    assert data['results'] == [{'id': row['id'], 'price': row['price'], 'quantity': row['quantity']}
+                               for row in expected]
+    assert [list(row) for row in data['results']][0] == ['id', 'quantity', 'price']
+    assert '"parameters"' not in sql and '"product_name"' not in sql
+
+    data, sql = product_list(api_client, {'fields': 'product,product_parameters'})
+    assert data['results'] == [{'product': row['product'], 'product_parameters': row['product_parameters']}
+                               for row in expected]
+
+
+# курсор сортировки по цене работает, даже если цена не запрошена
+@pytest.mark.django_db
+def test_product_list_fields_cursor(api_client, shop):
+    data, _ = product_list(api_client, {'fields': 'id', 'ordering': '-price', 'page_size': 2})
+    response = api_client.get(data['next'])
+
+    assert [row['id'] for row in data['results'] + response.json()['results']] == \
+        list(ProductInfo.objects.order_by('-price', '-id').values_list('id', flat=True)[:4])
+
+
+# детальный просмотр с подмножеством полей
+@pytest.mark.django_db
+def test_product_retrieve_fields(api_client, shop):
+    item = CatalogueItem.objects.order_by('pk').first()
+    response = api_client.get(reverse('backend:product-view-detail', args=[item.pk]), {'fields': 'id,model'})
+
+    assert response.json() == {'id': item.pk, 'model': item.model}
+
+
+# неизвестное поле
+@pytest.mark.django_db
+def test_product_list_unknown_field(api_client, shop):
+    response = api_client.get(reverse('backend:product-view-list'), {'fields': 'id,password'})
+
+    assert response.status_code == HTTP_400_BAD_REQUEST
+    assert 'password' in response.json()['detail']
+
+
+# заказы без позиций читаются одним запросом
+@pytest.mark.django_db
+def test_order_list_fields(api_client):
+    user = baker.make('backend.User')
+    api_client.force_authenticate(user=user)
+    product = baker.make('backend.Product', category=baker.make('backend.Category'))
+    product_info = baker.make(ProductInfo, product=product, shop=baker.make('backend.Shop'))
+    for state in ('new', 'confirmed'):
+        baker.make(OrderItem, order=baker.make(Order, user=user, state=state), product_info=product_info, quantity=2)
+    url = reverse('backend:user-orders')
+
+    full = api_client.get(url).json()
+    with CaptureQueriesContext(connection) as context:
+        narrow = api_client.get(url, {'fields': 'id,state'}).json()
+
+    assert full == OrderSerializer(Order.objects.filter(user=user), many=True).data
+    assert narrow == [{'id': row['id'], 'state': row['state']} for row in full]
+    assert len(context.captured_queries) == 1
+    assert api_client.get(url, {'fields': 'total'}).json()['Status'] is False
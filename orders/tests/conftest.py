@@ -1,7 +1,16 @@
+import os
+
 import pytest
+import yaml
+from django.conf import settings
+from django.core.cache import caches
 from rest_framework.test import APIClient
 from model_bakery import baker
 
+from backend.cache import local_counts
+from backend.importer import import_price_list
+from backend.models import Shop
+
 
 @pytest.fixture
 def api_client():
@@ -113,3 +122,57 @@ def contact_edit_correct():
         "building" : "test",
         "apartment" : "test"
     }
+
+
+@pytest.fixture
+def shop_client(api_client):
+    user = baker.make('backend.User', email='shop@test.com', type='shop')
+    api_client.force_authenticate(user=user)
+    api_client.user = user
+    return api_client
+
+
+@pytest.fixture
+def price_list():
+    path = os.path.join(settings.BASE_DIR, '..', 'data', 'shop1.yaml')
+    with open(path, encoding='utf-8') as file:
+        return file.read()
+
+
+@pytest.fixture
+def price_list_data(price_list):
+    return yaml.safe_load(price_list)
+
+
+@pytest.fixture
+def shop(price_list_data):
+    # магазин с загруженным тестовым прайсом
+    import_price_list(price_list_data, baker.make('backend.User', type='shop').id)
+    return Shop.objects.get(name=price_list_data['shop'])
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path / 'media')
+    return settings.MEDIA_ROOT
+
+
+@pytest.fixture(autouse=True)
+def snapshot_on_import(settings):
+    # фоновая сборка снимка после каждой загрузки включается в тестах снимков явно
+    settings.SNAPSHOT_ON_IMPORT = False
+
+
+LOCAL_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'default'},
+    'catalogue': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'catalogue'},
+}
+
+
+@pytest.fixture(autouse=True)
+def clear_cache(settings):
+    # в тестах оба кеша локальные; они живут весь прогон, а база между тестами откатывается
+    settings.CACHES = LOCAL_CACHES
+    for alias in LOCAL_CACHES:
+        caches[alias].clear()
+    local_counts.clear()
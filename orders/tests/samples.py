@@ -0,0 +1,95 @@
+# синтетические прайсы по образцу data/shop1.yaml: для тестов и для бенчмарков (benchmarks/)
+import copy
+import csv
+import json
+import os
+
+import yaml
+
+from backend.parsers import CSV_COLUMNS
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_PATH = os.path.join(BASE_DIR, '..', 'data', 'shop1.yaml')
+
+
+def load_sample():
+    with open(SAMPLE_PATH, encoding='utf-8') as file:
+        return yaml.safe_load(file)
+
+
+def iter_goods(count, sample=None, revision=0, start=0):
+    # синтетические товары по образцу data/shop1.yaml начиная с номера start; revision меняет цену
+    # каждого десятого товара
+    sample = sample or load_sample()
+    goods = sample['goods']
+    for index in range(start, start + count):
+        item = copy.deepcopy(goods[index % len(goods)])
+        item['id'] = 1000000 + index
+        item['name'] = f"{item['name']} #{index}"
+        if revision and index % 10 == 0:
+            item['price'] += revision
+        yield item
+
+
+def scale_price_list(count, sample=None, start=0):
+    # прайс из count синтетических товаров
+    sample = sample or load_sample()
+    return dict(sample, goods=list(iter_goods(count, sample, start=start)))
+
+
+def write_yaml(path, count, sample=None, revision=0):
+    # запись прайса по одному товару, чтобы генерация больших файлов не упиралась в память
+    sample = sample or load_sample()
+    with open(path, 'w', encoding='utf-8') as file:
+        yaml.safe_dump({'shop': sample['shop'], 'categories': sample['categories']}, file,
+                       allow_unicode=True, sort_keys=False)
+        file.write('goods:\n')
+        for item in iter_goods(count, sample, revision):
+            yaml.safe_dump([item], file, allow_unicode=True, sort_keys=False)
+
+
+def write_csv(path, count, sample=None, revision=0):
+    sample = sample or load_sample()
+    categories = {category['id']: category['name'] for category in sample['categories']}
+    parameters = sorted({name for item in sample['goods'] for name in item['parameters']})
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(CSV_COLUMNS + tuple(parameters))
+        for item in iter_goods(count, sample, revision):
+            writer.writerow([sample['shop'], item['category'], categories[item['category']]]
+                            + [item[column] for column in CSV_COLUMNS[3:]]
+                            + [item['parameters'].get(name, '') for name in parameters])
+
+
+def write_ndjson(path, count, sample=None, revision=0):
+    sample = sample or load_sample()
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(json.dumps({'shop': sample['shop'], 'categories': sample['categories']}, ensure_ascii=False))
+        file.write('\n')
+        for item in iter_goods(count, sample, revision):
+            file.write(json.dumps(item, ensure_ascii=False))
+            file.write('\n')
+
+
+def write_msgpack(path, count, sample=None, revision=0):
+    sample = sample or load_sample()
+    packer = msgpack.Packer()
+    with open(path, 'wb') as file:
+        file.write(packer.pack({'shop': sample['shop'], 'categories': sample['categories']}))
+        for item in iter_goods(count, sample, revision):
+            file.write(packer.pack(item))
+
+
+WRITERS = {
+    'yaml': write_yaml,
+    'csv': write_csv,
+    'ndjson': write_ndjson,
+}
+
+if msgpack is not None:
+    WRITERS['msgpack'] = write_msgpack